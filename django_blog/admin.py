@@ -2,9 +2,13 @@ from typing import Any
 from django.contrib import admin
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
-from django.utils.timezone import now
+from django.contrib import messages
+from django.db.models import Count
+from django.template.response import TemplateResponse
 
-from .models import Tag, Post
+from .models import Tag, Post, clean_tag_name
+from .bulk import apply_bulk_operation, PUBLISH, OK
+from .tagmerge import apply_mapping, TagMappingError
 
 # Register your models here.
 
@@ -18,9 +22,55 @@ class PostAdmin(admin.ModelAdmin):
 
     @admin.action(description="Pubblica i post selezionati")
     def publish(self, request, queryset):
-        queryset.update(pub_date = now())
+        # Go through the bulk service, so that the same permission rules
+        # of the blog views are applied
+        report = apply_bulk_operation(
+            request.user,
+            queryset.values_list('pk', flat=True),
+            PUBLISH
+        )
+        published = sum(outcome == OK for outcome in report.values())
+        self.message_user(request, f"Post pubblicati: {published} su {len(report)}", messages.SUCCESS)
 
 
+class TagAdmin(admin.ModelAdmin):
+    model = Tag
 
-admin.site.register(Tag)
+    list_display = ["name", "slug"]
+    search_fields = ["name"]
+    actions = ["merge_tags"]
+
+    @admin.action(description="Unisci i tag selezionati")
+    def merge_tags(self, request, queryset):
+        tags = list(queryset.annotate(num_posts=Count('post')).order_by('-num_posts', 'name'))
+        if 'apply' in request.POST:
+            target = clean_tag_name(request.POST.get('target', ''))
+            if not target:
+                self.message_user(request, "Indica il nome del tag risultante", messages.ERROR)
+                return None
+            try:
+                report = apply_mapping([(tag.name, target) for tag in tags])
+            except TagMappingError as e:
+                self.message_user(request, str(e), messages.ERROR)
+                return None
+            self.message_user(
+                request,
+                f"Tag uniti in «{target}»: {report['merged']}, post modificati: {report['posts']}",
+                messages.SUCCESS
+            )
+            return None
+
+        # Intermediate page to choose the name of the resulting tag,
+        # the most used one by default
+        return TemplateResponse(request, "admin/blog/tag/merge_tags.html", {
+            **self.admin_site.each_context(request),
+            'title': "Unisci i tag",
+            'opts': self.model._meta,
+            'tags': tags,
+            'target': tags[0].name if tags else '',
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+admin.site.register(Tag, TagAdmin)
 admin.site.register(Post, PostAdmin)
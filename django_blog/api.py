@@ -0,0 +1,256 @@
+"""
+Read-only JSON API over the published posts and their tags.
+
+Lists are paginated with an opaque cursor over (pub_date, id) and serialized
+by streaming rows from ``.values()`` querysets, without building ``Post``
+instances. Clients can choose the returned fields with ``fields=`` and sync
+incrementally with ``updated_since=``.
+"""
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django import forms
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import http_date, quote_etag
+from django.views.generic import View
+
+from . models import Post, Tag
+
+
+# Fields that can be requested with ``fields=``, mapped to the columns to read
+POST_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'subtitle': 'subtitle',
+    'body': 'body',
+    'pub_date': 'pub_date',
+    'update_date': 'update_date',
+    'author': 'author__username',
+    'url': None,
+    'tags': None,
+}
+
+try:
+    PAGE_SIZE = settings.DJANGO_BLOG_API_PAGE_SIZE
+except AttributeError:
+    PAGE_SIZE = 20
+
+MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    """Invalid request parameters: rendered as a 400 response"""
+
+
+def encode_cursor(pub_date, pk) -> str:
+    raw = json.dumps([pub_date.isoformat(), pk]).encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        pub_date, pk = json.loads(raw)
+        return forms.DateTimeField().clean(pub_date), int(pk)
+    except (ValueError, TypeError, forms.ValidationError):
+        raise ApiError("Cursore non valido")
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return quote_etag(digest)
+
+
+def dumps(data) -> str:
+    return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+class ApiView(View):
+    """Base class for API views: parses the common parameters"""
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+
+    def get_fields(self) -> list:
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return list(POST_FIELDS)
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = set(fields) - set(POST_FIELDS)
+        if unknown:
+            raise ApiError(f"Campi sconosciuti: {', '.join(sorted(unknown))}")
+        return fields
+
+    def not_modified(self, etag) -> bool:
+        return etag in self.request.headers.get('If-None-Match', '')
+
+    def serialize_posts(self, rows, fields, tags_by_post):
+        """Yield the JSON of each row, keeping only the requested fields"""
+        for row in rows:
+            item = {}
+            for field in fields:
+                if field == 'url':
+                    item['url'] = reverse('blog:detail', kwargs={'pk': row['id']})
+                elif field == 'tags':
+                    item['tags'] = tags_by_post.get(row['id'], [])
+                else:
+                    item[field] = row[POST_FIELDS[field]]
+            yield dumps(item)
+
+
+def get_tags_by_post(post_ids) -> dict:
+    """Return the tag names of the given posts, with a single query"""
+    tags_by_post = {}
+    relations = (Post.tags.through.objects
+                 .filter(post_id__in=post_ids)
+                 .order_by('tag__name')
+                 .values_list('post_id', 'tag__name'))
+    for post_id, name in relations:
+        tags_by_post.setdefault(post_id, []).append(name)
+    return tags_by_post
+
+
+def get_columns(fields) -> list:
+    # id and update_date are always needed for urls, tags and etags
+    columns = {'id', 'update_date'}
+    columns.update(POST_FIELDS[field] for field in fields if POST_FIELDS[field])
+    return list(columns)
+
+
+class ApiPostListView(ApiView):
+    """
+    List published posts, most recent first.
+
+    Parameters: ``fields``, ``limit``, ``cursor`` (as returned in ``next``)
+    and ``updated_since`` (ISO 8601 datetime).
+    """
+
+    def get_queryset(self):
+        return Post.published_objects.all()
+
+    def get_limit(self) -> int:
+        try:
+            limit = int(self.request.GET.get('limit', PAGE_SIZE))
+        except ValueError:
+            raise ApiError("Limite non valido")
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    def filter_queryset(self, queryset):
+        updated_since = self.request.GET.get('updated_since')
+        if updated_since:
+            try:
+                updated_since = forms.DateTimeField().clean(updated_since)
+            except forms.ValidationError:
+                raise ApiError("Data non valida per updated_since")
+            queryset = queryset.filter(update_date__gte=updated_since)
+
+        cursor = self.request.GET.get('cursor')
+        if cursor:
+            pub_date, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        return queryset.order_by('-pub_date', '-pk')
+
+    def get(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        limit = self.get_limit()
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Read only the keys of the page first: enough to compute the etag
+        # and the next cursor
+        keys = list(queryset.values_list('pk', 'pub_date', 'update_date')[:limit + 1])
+        has_next = len(keys) > limit
+        keys = keys[:limit]
+
+        etag = make_etag(fields, keys)
+        if self.not_modified(etag):
+            return HttpResponse(status=304, headers={'ETag': etag})
+
+        next_url = None
+        if has_next:
+            params = request.GET.copy()
+            params['cursor'] = encode_cursor(keys[-1][1], keys[-1][0])
+            next_url = f"{request.path}?{params.urlencode()}"
+
+        post_ids = [key[0] for key in keys]
+        rows = (Post.objects
+                .filter(pk__in=post_ids)
+                .order_by('-pub_date', '-pk')
+                .values(*get_columns(fields)))
+        tags_by_post = get_tags_by_post(post_ids) if 'tags' in fields and post_ids else {}
+
+        def stream():
+            yield '{"results": ['
+            for index, item in enumerate(self.serialize_posts(rows.iterator(), fields, tags_by_post)):
+                yield item if index == 0 else ', ' + item
+            yield f'], "next": {dumps(next_url)}}}'
+
+        response = StreamingHttpResponse(stream(), content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+class ApiPostListByTagView(ApiPostListView):
+    def get_queryset(self):
+        if not Tag.objects.filter(pk=self.kwargs['pk']).exists():
+            raise Http404
+        return Post.published_objects.filter(tags__pk=self.kwargs['pk'])
+
+
+class ApiSearchView(ApiPostListView):
+    """Search published posts by title, subtitle and body with ``q=``"""
+
+    def get_queryset(self):
+        query = self.request.GET.get('q', '').strip()
+        if not query:
+            raise ApiError("Parametro q mancante")
+        return Post.published_objects.filter(
+            Q(title__icontains=query) | Q(subtitle__icontains=query) | Q(body__icontains=query)
+        )
+
+
+class ApiPostDetailView(ApiView):
+    def get(self, request, pk, *args, **kwargs):
+        fields = self.get_fields()
+        try:
+            row = Post.published_objects.values(*get_columns(fields)).get(pk=pk)
+        except Post.DoesNotExist:
+            raise Http404
+
+        etag = make_etag(fields, pk, row['update_date'])
+        headers = {'ETag': etag, 'Last-Modified': http_date(row['update_date'].timestamp())}
+        if self.not_modified(etag):
+            return HttpResponse(status=304, headers=headers)
+
+        tags_by_post = get_tags_by_post([pk]) if 'tags' in fields else {}
+        body = next(self.serialize_posts([row], fields, tags_by_post))
+        return HttpResponse(body, content_type='application/json', headers=headers)
+
+
+class ApiTagListView(ApiView):
+    """List the tags used by at least one published post"""
+
+    def get(self, request, *args, **kwargs):
+        tags = (Tag.objects
+                .filter(post__in=Post.published_objects.all())
+                .distinct()
+                .order_by('name')
+                .values('id', 'name'))
+
+        def stream():
+            yield '{"results": ['
+            for index, tag in enumerate(tags.iterator()):
+                tag['url'] = reverse('blog:api_list_by_tag', kwargs={'pk': tag['id']})
+                yield dumps(tag) if index == 0 else ', ' + dumps(tag)
+            yield ']}'
+
+        return StreamingHttpResponse(stream(), content_type='application/json')
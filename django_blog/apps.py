@@ -5,3 +5,7 @@ class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'django_blog'
     label = 'blog'
+
+    def ready(self):
+        # Connect signal receivers
+        from . import signals, cache, tagindex, revisions, authorstats, tasks, checks  # noqa: F401
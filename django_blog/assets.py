@@ -0,0 +1,67 @@
+"""
+Front-end libraries shipped with the blog as static files.
+
+The pages of the blog load Bootstrap from the app static files, in
+``static/blog/vendor``, so that they depend on no third-party origin. The
+files are pinned here, with the integrity hash published by the library
+for the release: the ``django_blog.E001`` and ``django_blog.E002`` system
+checks report a missing file or one that does not match its hash.
+Upgrading a library means replacing its files and changing their entries.
+"""
+import base64
+import hashlib
+import os
+
+
+VENDOR_DIR = os.path.join(os.path.dirname(__file__), 'static', 'blog', 'vendor')
+
+
+class Asset:
+    def __init__(self, path, integrity=None):
+        # Path in static/blog/vendor/
+        self.path = path
+        # Subresource integrity hash, when the library publishes one
+        self.integrity = integrity
+
+    def check(self, content) -> bool:
+        if self.integrity is None:
+            return True
+        algorithm, digest = self.integrity.split('-', 1)
+        return base64.b64encode(hashlib.new(algorithm, content).digest()).decode() == digest
+
+
+# Bootstrap 5.3.3, from the dist directory of the release
+ASSETS = [
+    Asset('bootstrap/css/bootstrap.min.css',
+          'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH'),
+    # Referenced by the files above: the manifest storage needs them
+    Asset('bootstrap/css/bootstrap.min.css.map'),
+    Asset('bootstrap/js/bootstrap.bundle.min.js',
+          'sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz'),
+    Asset('bootstrap/js/bootstrap.bundle.min.js.map'),
+]
+
+
+def get_path(asset) -> str:
+    return os.path.join(VENDOR_DIR, *asset.path.split('/'))
+
+
+def missing() -> list:
+    """Assets missing from the static files"""
+    return [asset for asset in ASSETS if not os.path.exists(get_path(asset))]
+
+
+def corrupted() -> list:
+    """Assets whose content does not match their integrity hash"""
+    result = []
+    for asset in ASSETS:
+        if asset.integrity is None:
+            continue
+        try:
+            with open(get_path(asset), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            continue
+        if not asset.check(content):
+            result.append(asset)
+    return result
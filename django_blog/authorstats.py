@@ -0,0 +1,128 @@
+"""
+Per-author counts of the published posts.
+
+``AuthorStats`` keeps, for every author, the number of published posts
+and the date of the latest, so that the author index reads one small
+table instead of aggregating the posts. When ``posts_changed`` is sent,
+the rows of the authors of the changed posts are computed again from the
+(author, pub_date) index, and so are the rows of the previous authors of
+reassigned or deleted posts.
+
+The authors of the posts saved or deleted as instances, before and after
+the change, are remembered by the model signals; the authors of the posts
+changed with bulk updates are looked up with one query. Bulk updates
+never change the author: posts changing author are saved as instances.
+"""
+from contextvars import ContextVar
+
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from . models import AuthorStats, Post
+from . signals import in_batch, posts_changed
+
+
+BATCH_SIZE = 500
+
+# Posts whose authors are known, and the authors, until the next
+# posts_changed
+_pending = ContextVar('django_blog_pending_authors', default=None)
+
+
+def remember_authors(post, *author_ids):
+    pending = _pending.get()
+    if pending is None:
+        pending = {'posts': set(), 'authors': set()}
+        _pending.set(pending)
+    # A post loaded without its author is looked up later
+    if post.pk is not None and 'author_id' in post.__dict__:
+        pending['posts'].add(post.pk)
+    pending['authors'].update(pk for pk in author_ids if pk is not None)
+
+
+def update_authors(author_ids):
+    """Bring the counts of the given authors up to date"""
+    author_ids = sorted(author_ids)
+    with transaction.atomic():
+        # Lock a row of every author, creating the missing ones, so that
+        # concurrent updates of an author count one after the other and
+        # the last sees the changes of the others
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(author_id=pk, post_count=0, last_pub_date=now()) for pk in author_ids],
+            ignore_conflicts=True,
+        )
+        list(AuthorStats.objects
+             .select_for_update()
+             .filter(author_id__in=author_ids)
+             .order_by('author_id')
+             .values_list('pk', flat=True))
+        counts = (Post.published_objects
+                  .filter(author_id__in=author_ids)
+                  .values('author_id')
+                  .annotate(post_count=Count('pk'), last_pub_date=Max('pub_date'))
+                  .order_by())
+        rows = [AuthorStats(author_id=row['author_id'], post_count=row['post_count'],
+                            last_pub_date=row['last_pub_date'])
+                for row in counts]
+        AuthorStats.objects.bulk_update(rows, ['post_count', 'last_pub_date'])
+        (AuthorStats.objects
+         .filter(author_id__in=author_ids)
+         .exclude(author_id__in=[row.author_id for row in rows])
+         .delete())
+
+
+def rebuild(batch_size=BATCH_SIZE) -> int:
+    """Compute again the counts of all the authors. Return their number."""
+    author_ids = list(Post.objects
+                      .filter(author__isnull=False)
+                      .values_list('author_id', flat=True)
+                      .distinct()
+                      .order_by('author_id'))
+    with transaction.atomic():
+        AuthorStats.objects.exclude(author_id__in=author_ids).delete()
+        for start in range(0, len(author_ids), batch_size):
+            update_authors(author_ids[start:start + batch_size])
+    return AuthorStats.objects.count()
+
+
+@receiver(pre_save, sender=Post)
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created=False, **kwargs):
+    # Before saving for existing posts, as posts_changed may be sent by
+    # an earlier post_save receiver; after saving for new ones, which
+    # have no id before, only when posts_changed is sent later
+    if instance.pk is None or (kwargs['signal'] is post_save and not (created and in_batch())):
+        return
+    author_id = instance.__dict__.get('author_id')
+    remember_authors(instance, instance.__dict__.get('_loaded_author_id'), author_id)
+    instance._loaded_author_id = author_id
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    remember_authors(instance, instance.__dict__.get('author_id'))
+
+
+@receiver(request_started)
+def forget_authors(sender, **kwargs):
+    # Left behind by saves that failed before posts_changed
+    _pending.set(None)
+
+
+@receiver(posts_changed)
+def posts_changed_update_author_stats(sender, post_ids, **kwargs):
+    pending = _pending.get() or {'posts': set(), 'authors': set()}
+    _pending.set(None)
+    author_ids = pending['authors']
+    unknown = set(post_ids) - pending['posts']
+    if unknown:
+        author_ids.update(Post.objects
+                          .filter(pk__in=unknown, author__isnull=False)
+                          .values_list('author_id', flat=True)
+                          .distinct())
+    if author_ids:
+        update_authors(author_ids)
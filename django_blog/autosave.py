@@ -0,0 +1,141 @@
+"""
+Draft autosave with low write amplification.
+
+Editors send only the fields that changed since the last save, with the
+version of the post they are editing. A save:
+
+* is rejected with a conflict if the post was edited meanwhile (the
+  version does not match), instead of overwriting the other edit;
+* is skipped when the content did not change since the last autosave;
+* is deferred when the previous autosave of the same post is more recent
+  than ``DJANGO_BLOG_AUTOSAVE_INTERVAL`` seconds, collapsing rapid saves:
+  the editor sends its latest content again later;
+* writes only the changed columns and touches the tags only if they changed.
+
+Only drafts are autosaved in place. The changes of published and scheduled
+posts are merged into a ``PostAutosave`` row instead, which leaves the
+post, its update date and the caches alone: the editing form starts from
+them, and they reach the post when an editor saves it.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from . cache import get_cache
+from . models import Post, PostAutosave, Tag, normalize_tag_name
+from . signals import batch_changes, notify_posts_changed
+
+
+AUTOSAVE_FIELDS = ('title', 'subtitle', 'body')
+
+try:
+    AUTOSAVE_INTERVAL = settings.DJANGO_BLOG_AUTOSAVE_INTERVAL
+except AttributeError:
+    AUTOSAVE_INTERVAL = 5
+
+SAVED = 'saved'
+UNCHANGED = 'unchanged'
+DEFERRED = 'deferred'
+CONFLICT = 'conflict'
+
+
+def clean_fields(post, fields) -> dict:
+    """Validate the submitted fields, raise ``ValidationError`` if invalid"""
+    unknown = set(fields) - set(AUTOSAVE_FIELDS)
+    if unknown:
+        raise ValidationError(f"Campi non validi: {', '.join(sorted(unknown))}")
+    return {
+        name: Post._meta.get_field(name).clean(value, post)
+        for name, value in fields.items()
+    }
+
+
+def content_hash(fields, tags) -> str:
+    content = json.dumps([sorted(fields.items()), sorted(tags) if tags is not None else None])
+    return hashlib.sha1(content.encode(), usedforsecurity=False).hexdigest()
+
+
+def get_pending(post):
+    """Autosaved changes of a published or scheduled post not saved yet, if any"""
+    return PostAutosave.objects.filter(post=post, version=post.version).first()
+
+
+def save_pending(post, version, fields, tags) -> None:
+    """Merge the changes into the autosave of the post, kept out of the post"""
+    with transaction.atomic():
+        pending = (PostAutosave.objects
+                   .select_for_update()
+                   .filter(post=post, version=version)
+                   .first())
+        merged = {**(pending.fields if pending else {}), **fields}
+        # A field changed back needs nothing to be saved
+        merged = {name: value for name, value in merged.items() if getattr(post, name) != value}
+        if tags is None:
+            tags = pending.tags if pending else None
+        elif ({normalize_tag_name(name) for name in tags if name.strip()} ==
+              set(post.tags.values_list('key', flat=True))):
+            tags = None
+        if not merged and tags is None:
+            PostAutosave.objects.filter(post=post).delete()
+            return
+        PostAutosave.objects.update_or_create(
+            post=post,
+            defaults={'version': version, 'fields': merged, 'tags': tags, 'saved': now()},
+        )
+
+
+def autosave(post, version, fields, tags=None) -> tuple:
+    """
+    Save the changed ``fields`` (a dictionary) and, if not ``None``, the
+    ``tags`` names of ``post``, provided it is still at ``version``.
+    Return the outcome and the current version of the post.
+    """
+    if version != post.version:
+        return CONFLICT, post.version
+
+    fields = clean_fields(post, fields)
+    cache = get_cache()
+    state_key = f"django_blog:autosave:{post.pk}"
+    digest = content_hash(fields, tags)
+    if cache.get(state_key) == (version, digest):
+        return UNCHANGED, version
+
+    if not post.is_draft():
+        # Readers must not see the changes before an editor saves them
+        if not cache.add(f"django_blog:autosave_lock:{post.pk}", True, AUTOSAVE_INTERVAL):
+            return DEFERRED, version
+        save_pending(post, version, fields, tags)
+        cache.set(state_key, (version, digest), None)
+        return SAVED, version
+
+    changed = {name: value for name, value in fields.items() if getattr(post, name) != value}
+    tags_changed = False
+    if tags is not None:
+        keys = {normalize_tag_name(name) for name in tags if name.strip()}
+        tags_changed = keys != set(post.tags.values_list('key', flat=True))
+
+    if not changed and not tags_changed:
+        cache.set(state_key, (version, digest), None)
+        return UNCHANGED, version
+
+    # Only one autosave per post in each interval
+    if not cache.add(f"django_blog:autosave_lock:{post.pk}", True, AUTOSAVE_INTERVAL):
+        return DEFERRED, version
+
+    with batch_changes(), transaction.atomic():
+        updated = (Post.objects
+                   .filter(pk=post.pk, version=version)
+                   .update(**changed, version=F('version') + 1, update_date=now()))
+        if not updated:
+            return CONFLICT, Post.objects.values_list('version', flat=True).get(pk=post.pk)
+        if tags_changed:
+            post.tags.set(Tag.objects.get_or_create_many(tags))
+        notify_posts_changed([post.pk])
+
+    cache.set(state_key, (version + 1, digest), None)
+    return SAVED, version + 1
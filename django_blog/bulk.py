@@ -0,0 +1,158 @@
+"""
+Bulk editorial operations on posts.
+
+Every operation checks ``Post.can_be_modified_by`` for all the posts with a
+single query and applies the change with set-based statements inside one
+transaction. ``posts_changed`` is sent once for the whole batch. The
+version of the changed posts is incremented, so that the pending
+autosaves of their editors conflict.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from . models import Post, Tag
+from . signals import batch_changes, notify_posts_changed
+
+
+PUBLISH = 'publish'
+SCHEDULE = 'schedule'
+UNPUBLISH = 'unpublish'
+ADD_TAGS = 'add_tags'
+REMOVE_TAGS = 'remove_tags'
+SET_TAGS = 'set_tags'
+DELETE = 'delete'
+
+OPERATIONS = (PUBLISH, SCHEDULE, UNPUBLISH, ADD_TAGS, REMOVE_TAGS, SET_TAGS, DELETE)
+
+# Per-post outcome of an operation
+OK = 'ok'
+SKIPPED = 'skipped'
+FORBIDDEN = 'forbidden'
+NOT_FOUND = 'not_found'
+
+
+def apply_bulk_operation(user, post_ids, operation, pub_date=None, tags=()) -> dict:
+    """
+    Apply ``operation`` to the posts with the given ids on behalf of ``user``
+    and return a dictionary mapping every requested id to its outcome.
+
+    ``pub_date`` is required by the ``schedule`` operation, ``tags`` (a list
+    of tag names) by the operations on tags.
+    Publishing and scheduling are skipped for posts already published,
+    like in the single post views.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation}")
+    if operation == SCHEDULE and pub_date is None:
+        raise ValueError("A publication date is required to schedule posts")
+
+    report = dict.fromkeys(set(post_ids), NOT_FOUND)
+
+    with batch_changes(), transaction.atomic():
+        # Permissions for all the posts are checked with a single query
+        posts = (Post.objects
+                 .filter(pk__in=report.keys())
+                 .only('pk', 'author', 'pub_date', 'is_live')
+                 .select_for_update())
+        allowed = []
+        for post in posts:
+            if not post.can_be_modified_by(user):
+                report[post.pk] = FORBIDDEN
+            elif operation in (PUBLISH, SCHEDULE) and post.is_published():
+                report[post.pk] = SKIPPED
+            else:
+                report[post.pk] = OK
+                allowed.append(post.pk)
+
+        if allowed:
+            _OPERATION_HANDLERS[operation](allowed, pub_date=pub_date, tags=tags)
+            notify_posts_changed(allowed)
+
+    return report
+
+
+def _publish(post_ids, **kwargs):
+    current_time = now()
+    Post.objects.filter(pk__in=post_ids).update(
+        pub_date=current_time,
+        is_live=True,
+        update_date=current_time,
+        version=F('version') + 1
+    )
+
+
+def _schedule(post_ids, pub_date, **kwargs):
+    current_time = now()
+    Post.objects.filter(pk__in=post_ids).update(
+        pub_date=pub_date,
+        is_live=pub_date <= current_time,
+        update_date=current_time,
+        version=F('version') + 1
+    )
+
+
+def _unpublish(post_ids, **kwargs):
+    Post.objects.filter(pk__in=post_ids).update(
+        pub_date=None,
+        is_live=False,
+        update_date=now(),
+        version=F('version') + 1
+    )
+
+
+def _add_tags(post_ids, tags, **kwargs):
+    Through = Post.tags.through
+    # Existing (post, tag) pairs are ignored by the database
+    Through.objects.bulk_create(
+        [Through(post_id=post_id, tag_id=tag.pk)
+         for tag in Tag.objects.get_or_create_many(tags)
+         for post_id in post_ids],
+        ignore_conflicts=True
+    )
+    Post.objects.filter(pk__in=post_ids).update(update_date=now(), version=F('version') + 1)
+
+
+def _remove_tags(post_ids, tags, **kwargs):
+    Post.tags.through.objects.filter(
+        post_id__in=post_ids,
+        tag__in=Tag.objects.filter_by_names(tags)
+    ).delete()
+    Post.objects.filter(pk__in=post_ids).update(update_date=now(), version=F('version') + 1)
+
+
+def _set_tags(post_ids, tags, **kwargs):
+    Post.tags.through.objects.filter(post_id__in=post_ids).delete()
+    _add_tags(post_ids, tags)
+
+
+def _delete(post_ids, **kwargs):
+    Post.tags.through.objects.filter(post_id__in=post_ids).delete()
+    Post.objects.filter(pk__in=post_ids).delete()
+
+
+_OPERATION_HANDLERS = {
+    PUBLISH: _publish,
+    SCHEDULE: _schedule,
+    UNPUBLISH: _unpublish,
+    ADD_TAGS: _add_tags,
+    REMOVE_TAGS: _remove_tags,
+    SET_TAGS: _set_tags,
+    DELETE: _delete,
+}
+
+
+def publish_scheduled_posts() -> list:
+    """
+    Mark as live the scheduled posts whose publication date has passed.
+    Return their ids.
+    """
+    with batch_changes(), transaction.atomic():
+        post_ids = list(Post.objects
+                        .filter(is_live=False, pub_date__lte=now())
+                        .select_for_update()
+                        .values_list('pk', flat=True))
+        if post_ids:
+            Post.objects.filter(pk__in=post_ids).update(is_live=True)
+            notify_posts_changed(post_ids)
+    return post_ids
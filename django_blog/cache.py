@@ -0,0 +1,178 @@
+"""
+Caching helpers shared by the blog.
+
+Cached values derived from the posts (such as listing counts) include a
+version number in their key: the version is bumped every time posts are
+published, modified or deleted, so stale entries are never read again and
+simply expire.
+
+Expensive computations are cached with ``get_or_compute``, which protects
+them from stampedes when a popular key expires: the value is refreshed a
+little before its expiry with a probability growing as the expiry gets
+closer, only the worker holding a short lock recomputes it and the others
+keep serving the stale value meanwhile.
+"""
+import math
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import receiver
+
+from . signals import posts_changed, posts_changed_deferred
+
+
+LISTINGS_VERSION_KEY = 'django_blog:listings:version'
+
+
+try:
+    FRAGMENT_CACHE_TIMEOUT = settings.DJANGO_BLOG_FRAGMENT_CACHE_TIMEOUT
+except AttributeError:
+    # Fragments are invalidated by the listings version: the timeout only
+    # bounds how long the entries of the old versions stay in the cache
+    FRAGMENT_CACHE_TIMEOUT = 600
+
+try:
+    STALE_TIMEOUT = settings.DJANGO_BLOG_STALE_TIMEOUT
+except AttributeError:
+    # How long an expired value can still be served while it is recomputed
+    STALE_TIMEOUT = 300
+
+# Only one worker recomputes a value: the lock expires by itself if it dies
+LOCK_TIMEOUT = 10
+# How long to wait for the value computed by another worker, without a stale one
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+# Higher values refresh earlier
+EARLY_REFRESH_BETA = 1.0
+
+
+def get_cache_alias() -> str:
+    """Return the alias of the cache used by the blog (``DJANGO_BLOG_CACHE``)"""
+    try:
+        return settings.DJANGO_BLOG_CACHE
+    except AttributeError:
+        return 'default'
+
+
+def get_cache():
+    return caches[get_cache_alias()]
+
+
+def get_listings_version() -> int:
+    cache = get_cache()
+    version = cache.get(LISTINGS_VERSION_KEY)
+    if version is None:
+        # Start from the current time, so that a version lost by the cache
+        # never collides with one used before
+        cache.add(LISTINGS_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(LISTINGS_VERSION_KEY, 0)
+    return version
+
+
+def invalidate_listings():
+    cache = get_cache()
+    try:
+        cache.incr(LISTINGS_VERSION_KEY)
+    except ValueError:
+        cache.set(LISTINGS_VERSION_KEY, time.time_ns(), None)
+
+
+def listing_key(*parts) -> str:
+    """Build a cache key that is invalidated when posts change"""
+    return ':'.join(['django_blog', str(get_listings_version()), *map(str, parts)])
+
+
+_metrics = defaultdict(Counter)
+_metrics_lock = threading.Lock()
+
+
+def record(name, event, amount=1):
+    with _metrics_lock:
+        _metrics[name][event] += amount
+
+
+def get_metrics() -> dict:
+    """
+    Counters of ``get_or_compute`` in this process, by name: ``hit``,
+    ``miss``, ``early`` (early refreshes), ``stale`` (stale values served),
+    ``wait`` (values computed by another worker), ``compute`` and
+    ``compute_time`` (in seconds)
+    """
+    with _metrics_lock:
+        return {name: dict(counter) for name, counter in _metrics.items()}
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def get_or_compute(key, compute, timeout, version=None, name=None):
+    """
+    Return the value cached under ``key``, calling ``compute()`` when it is
+    missing, expired or has a different ``version``.
+
+    The value is stored with the time it took to compute, to refresh it
+    early, and is kept ``STALE_TIMEOUT`` seconds after its expiry to be
+    served while another worker recomputes it. Metrics are recorded under
+    ``name`` (by default the key).
+    """
+    cache = get_cache()
+    name = name or key
+    lock_key = f"{key}:lock"
+    entry = cache.get(key)
+
+    if entry is not None:
+        value, entry_version, delta, expiry = entry
+        if entry_version == version:
+            # Refresh early with a probability growing near the expiry
+            # and with the cost of the computation
+            early = time.time() - delta * EARLY_REFRESH_BETA * math.log(1 - random.random())
+            if early < expiry:
+                record(name, 'hit')
+                return value
+            if time.time() < expiry:
+                record(name, 'early')
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            record(name, 'stale')
+            return value
+    else:
+        record(name, 'miss')
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = cache.get(key)
+                if entry is not None and entry[1] == version:
+                    record(name, 'wait')
+                    return entry[0]
+            # The other worker is too slow: compute without the lock
+            lock_key = None
+
+    try:
+        start = time.perf_counter()
+        value = compute()
+        delta = time.perf_counter() - start
+        cache.set(key, (value, version, delta, time.time() + timeout), timeout + STALE_TIMEOUT)
+        record(name, 'compute')
+        record(name, 'compute_time', delta)
+    finally:
+        if lock_key is not None:
+            cache.delete(lock_key)
+    return value
+
+
+@receiver(posts_changed)
+def posts_changed_invalidate_listings(sender, **kwargs):
+    invalidate_listings()
+
+
+@receiver(posts_changed_deferred)
+def queued_posts_invalidate_listings(sender, queued, **kwargs):
+    # Listings cached before a worker updated the derived data
+    if queued:
+        invalidate_listings()
@@ -0,0 +1,27 @@
+from django.core.checks import Error, Tags, register
+
+from . import assets
+
+
+@register(Tags.staticfiles)
+def check_vendored_assets(app_configs, **kwargs) -> list:
+    """The front-end libraries loaded by the pages are in the static files"""
+    errors = [
+        Error(
+            f"Missing static file blog/vendor/{asset.path}",
+            hint="Copy it from the release of the library pinned in django_blog/assets.py",
+            obj='django_blog.assets',
+            id='django_blog.E001',
+        )
+        for asset in assets.missing()
+    ]
+    errors += [
+        Error(
+            f"Static file blog/vendor/{asset.path} does not match its integrity hash",
+            hint="Replace it with the file of the release pinned in django_blog/assets.py",
+            obj='django_blog.assets',
+            id='django_blog.E002',
+        )
+        for asset in assets.corrupted()
+    ]
+    return errors
@@ -0,0 +1,368 @@
+"""
+Export of the public blog to static files, to be served by a plain web
+server or a CDN.
+
+Every page is rendered through the normal middleware and views, as an
+anonymous user, and written to ``<output>/<url path>/index.<ext>``
+together with a gzip copy (and a brotli copy, when the ``brotli``
+package is installed).
+Pages after the first of a listing are written to ``.../page/<n>/``.
+Files are written to a temporary file and renamed, so that the server
+never reads a half-written page, and are left untouched when their
+content did not change.
+
+The state of the published posts (update date, publication date, author
+and tags) is saved in the output directory: the next export compares it
+with the database and renders only the pages affected by the changes.
+A page that fails (an error status, or an exception while rendering it)
+is reported and the export goes on with the others; the state is not
+saved, so that the next export renders the failed pages again.
+"""
+import gzip
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+
+from . models import Post, Tag
+from . public_views import AuthorListView, PostListView, PostListByAuthorView, PostListByTagView
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+STATE_FILE = '.export-state.json'
+STATE_VERSION = 1
+
+FEED_FORMATS = ('rss', 'atom', 'json')
+
+EXTENSIONS = {
+    'text/html': 'html',
+    'application/rss+xml': 'xml',
+    'application/atom+xml': 'xml',
+    'application/xml': 'xml',
+    'application/feed+json': 'json',
+    'application/json': 'json',
+}
+
+try:
+    EXPORT_HOST = settings.DJANGO_BLOG_EXPORT_HOST
+except AttributeError:
+    EXPORT_HOST = 'localhost'
+
+logger = logging.getLogger(__name__)
+
+
+def load_state(output_dir) -> dict:
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def save_state(output_dir, state):
+    write_file(os.path.join(output_dir, STATE_FILE), json.dumps(state).encode())
+
+
+def current_state(host) -> dict:
+    """Snapshot of what the exported pages depend on"""
+    posts = {}
+    published = Post.published_objects.order_by('pk').values_list(
+        'pk', 'update_date', 'pub_date', 'author_id'
+    )
+    for pk, update_date, pub_date, author_id in published:
+        posts[str(pk)] = {
+            'updated': update_date.timestamp(),
+            'published': pub_date.timestamp(),
+            'author': author_id,
+            'tags': [],
+        }
+    relations = (Post.tags.through.objects
+                 .filter(post__in=Post.published_objects.all())
+                 .order_by('post_id', 'tag_id')
+                 .values_list('post_id', 'tag_id'))
+    for post_id, tag_id in relations:
+        posts[str(post_id)]['tags'].append(tag_id)
+
+    used = {tag_id for post in posts.values() for tag_id in post['tags']}
+    tags = {
+        str(pk): [slug, name]
+        for pk, slug, name in Tag.objects.filter(pk__in=used).values_list('pk', 'slug', 'name')
+    }
+    return {'version': STATE_VERSION, 'host': host, 'posts': posts, 'tags': tags}
+
+
+def neighbours(posts: dict, ids) -> set:
+    """Previous and next post, in publication order, of each of the given posts"""
+    order = sorted(posts, key=lambda pk: (posts[pk]['published'], int(pk)))
+    position = {pk: index for index, pk in enumerate(order)}
+    result = set()
+    for pk in ids:
+        if pk in position:
+            index = position[pk]
+            result.update(order[max(index - 1, 0):index + 2])
+    return result
+
+
+class ExportPlan:
+    """Posts, tags and authors whose pages must be rendered or removed"""
+
+    def __init__(self, old, new):
+        self.full = old is None or old['host'] != new['host']
+        old = old or {'posts': {}, 'tags': {}}
+        old_posts, new_posts = old['posts'], new['posts']
+
+        if self.full:
+            self.changed = set(new_posts)
+        else:
+            self.changed = {pk for pk in old_posts.keys() | new_posts.keys()
+                            if old_posts.get(pk) != new_posts.get(pk)}
+            # A renamed tag is shown in the detail page of all its posts
+            renamed = {pk for pk in old['tags'].keys() & new['tags'].keys()
+                       if old['tags'][pk] != new['tags'][pk]}
+            self.changed |= {pk for pk, post in new_posts.items()
+                             if renamed.intersection(map(str, post['tags']))}
+
+        self.removed_posts = set(old_posts) - set(new_posts)
+        self.removed_tags = {pk: old['tags'][pk] for pk in old['tags']
+                             if old['tags'][pk] != new['tags'].get(pk)}
+        self.removed_authors = {post['author'] for post in old_posts.values()} - \
+            {post['author'] for post in new_posts.values()}
+
+        self.details = (self.changed | neighbours(old_posts, self.changed)
+                        | neighbours(new_posts, self.changed)) & set(new_posts)
+        self.tags = set()
+        self.authors = set()
+        for pk in self.changed:
+            for posts in (old_posts, new_posts):
+                if pk in posts:
+                    self.tags.update(map(str, posts[pk]['tags']))
+                    self.authors.add(posts[pk]['author'])
+        self.tags &= set(new['tags'])
+        self.authors -= self.removed_authors
+        self.authors.discard(None)
+
+    def __bool__(self):
+        return bool(self.full or self.changed or self.removed_tags)
+
+
+def page_count(count, per_page) -> int:
+    return max(1, math.ceil(count / per_page))
+
+
+def listing_urls(url, count, per_page) -> list:
+    return [url] + [f"{url}?page={number}" for number in range(2, page_count(count, per_page) + 1)]
+
+
+def get_authors(state) -> set:
+    """Authors with published posts, listed in the index of the authors"""
+    return {post['author'] for post in state['posts'].values()} - {None}
+
+
+def get_urls(plan, state) -> list:
+    """URLs of the pages to render"""
+    posts, tags = state['posts'], state['tags']
+    urls = []
+    if plan:
+        urls += listing_urls(reverse('blog:list'), len(posts), PostListView.paginate_by)
+        urls += listing_urls(reverse('blog:author_list'), len(get_authors(state)), AuthorListView.paginate_by)
+        urls += [reverse(f'blog:feed_{fmt}') for fmt in FEED_FORMATS]
+        urls.append(reverse('blog:sitemap'))
+    for pk in sorted(plan.details, key=int):
+        urls.append(reverse('blog:detail', args=[pk]))
+    for pk in sorted(plan.tags, key=int):
+        slug = tags[pk][0]
+        count = sum(int(pk) in post['tags'] for post in posts.values())
+        urls += listing_urls(reverse('blog:list_by_tag_slug', args=[slug]),
+                             count, PostListByTagView.paginate_by)
+        urls += [reverse(f'blog:tag_feed_{fmt}', args=[slug]) for fmt in FEED_FORMATS]
+    for pk in sorted(plan.authors):
+        count = sum(post['author'] == pk for post in posts.values())
+        urls += listing_urls(reverse('blog:list_by_author', args=[pk]),
+                             count, PostListByAuthorView.paginate_by)
+        urls += [reverse(f'blog:author_feed_{fmt}', args=[pk]) for fmt in FEED_FORMATS]
+    return urls
+
+
+def get_path(url, content_type) -> str:
+    """Relative path of the file of a URL"""
+    path, _, query = url.partition('?')
+    if query:
+        path += f"page/{query.removeprefix('page=')}/"
+    path = path.lstrip('/')
+    if not path.endswith('/'):
+        # Already a file name, like sitemap.xml
+        return path
+    extension = EXTENSIONS.get(content_type.split(';')[0].strip(), 'html')
+    return f"{path}index.{extension}"
+
+
+def write_file(path, content: bytes) -> bool:
+    """Atomically replace the file, if its content changed"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def write_page(path, content: bytes) -> bool:
+    """Write a page with its precompressed copies"""
+    if not write_file(path, content):
+        return False
+    write_file(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_file(path + '.br', brotli.compress(content))
+    return True
+
+
+class ExportHandler(BaseHandler):
+    """
+    Request handler running the middleware and the views, like the one of
+    the web server: exceptions of the views become error responses
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.load_middleware()
+
+
+def render_page(handler, request_factory, output_dir, url, secure) -> tuple:
+    """Render and write a page. Return its URL, status and whether it was written."""
+    response = handler.get_response(request_factory.get(url, secure=secure))
+    if response.status_code != 200:
+        return url, response.status_code, False
+    if response.streaming:
+        content = b''.join(response.streaming_content)
+    else:
+        content = response.content
+    path = os.path.join(output_dir, get_path(url, response.get('Content-Type', '')))
+    return url, response.status_code, write_page(path, content)
+
+
+def render_pages(output_dir, host, secure, urls) -> list:
+    """
+    Render and write a list of pages.
+    Return a (url, status, written) tuple for every page.
+    """
+    handler = ExportHandler()
+    request_factory = RequestFactory(HTTP_HOST=host)
+    results = []
+    for url in urls:
+        try:
+            results.append(render_page(handler, request_factory, output_dir, url, secure))
+        except Exception:
+            # Raised while streaming or writing the page: the others are
+            # rendered anyway
+            logger.exception("Export of %s failed", url)
+            results.append((url, 500, False))
+    return results
+
+
+def _init_worker():
+    django.setup()
+
+
+def remove_path(output_dir, url):
+    path = os.path.join(output_dir, url.lstrip('/'))
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def remove_stale_pages(output_dir, url, count, per_page):
+    """Remove the pages of a listing beyond the last one"""
+    pages_dir = os.path.join(output_dir, url.lstrip('/'), 'page')
+    if not os.path.isdir(pages_dir):
+        return
+    last = page_count(count, per_page)
+    for name in os.listdir(pages_dir):
+        if not name.isdigit() or int(name) > last:
+            shutil.rmtree(os.path.join(pages_dir, name), ignore_errors=True)
+
+
+def export(output_dir, host=EXPORT_HOST, secure=False, full=False, workers=1, chunk_size=50):
+    """
+    Export the blog to a directory.
+    Return the results of the rendered pages and the number of removed pages.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = current_state(host)
+    plan = ExportPlan(None if full else load_state(output_dir), state)
+    urls = get_urls(plan, state)
+
+    results = []
+    if workers > 1 and len(urls) > chunk_size:
+        chunks = [urls[i:i + chunk_size] for i in range(0, len(urls), chunk_size)]
+        # Forked workers must not share the connections of the parent process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(render_pages, output_dir, host, secure, chunk)
+                       for chunk in chunks]
+            for future in futures:
+                results += future.result()
+    else:
+        results = render_pages(output_dir, host, secure, urls)
+
+    # Remove the pages of unpublished posts, unused tags and missing authors
+    removed = []
+    for pk in plan.removed_posts:
+        removed.append(reverse('blog:detail', args=[pk]))
+    for pk, (slug, _) in plan.removed_tags.items():
+        if state['tags'].get(pk, [None])[0] != slug:
+            removed.append(reverse('blog:list_by_tag_slug', args=[slug]))
+    for pk in plan.removed_authors:
+        if pk is not None:
+            removed.append(reverse('blog:list_by_author', args=[pk]))
+    for url in removed:
+        remove_path(output_dir, url)
+
+    if plan:
+        remove_stale_pages(output_dir, reverse('blog:list'),
+                           len(state['posts']), PostListView.paginate_by)
+        remove_stale_pages(output_dir, reverse('blog:author_list'),
+                           len(get_authors(state)), AuthorListView.paginate_by)
+    for pk in plan.tags:
+        count = sum(int(pk) in post['tags'] for post in state['posts'].values())
+        remove_stale_pages(output_dir, reverse('blog:list_by_tag_slug', args=[state['tags'][pk][0]]),
+                           count, PostListByTagView.paginate_by)
+    for pk in plan.authors:
+        count = sum(post['author'] == pk for post in state['posts'].values())
+        remove_stale_pages(output_dir, reverse('blog:list_by_author', args=[pk]),
+                           count, PostListByAuthorView.paginate_by)
+
+    # On errors keep the old state: the next run will try again
+    if all(status == 200 for _, status, _ in results):
+        save_state(output_dir, state)
+    return results, len(removed)
@@ -1,33 +1,342 @@
-from django.contrib.syndication.views import Feed
-from django.urls import reverse
+"""
+Feeds of the published posts: global, per tag and per author, in RSS,
+Atom and JSON Feed formats.
+
+Every item is rendered once and cached, keyed by the post id and its
+``update_date`` (set also by every change of the tags of a post: the
+editing views, autosave, bulk operations, tag merge and restore): a feed
+request runs a single query for the ids of its posts, reads the cached
+fragments and renders only the missing ones.
+The feed is streamed, without building the whole document in memory.
+"""
+import json
+from io import StringIO
+
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import feedgenerator
+from django.utils.xmlutils import SimplerXMLGenerator
+from django.views.generic import View
+
+from . cache import FRAGMENT_CACHE_TIMEOUT, get_cache, get_listings_version, get_or_compute
+from . models import Post, Tag
+
+
+try:
+    FEED_ITEMS = settings.DJANGO_BLOG_FEED_ITEMS
+except AttributeError:
+    FEED_ITEMS = 100
+
+# Rendered items are invalidated by the update date in their key
+ITEM_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class LatestDateMixin:
+    """Use a precomputed latest date: items are not kept in the generator"""
+    latest_date = None
+
+    def latest_post_date(self):
+        return self.latest_date or super().latest_post_date()
+
+
+class RssFeedGenerator(LatestDateMixin, feedgenerator.Rss201rev2Feed):
+    pass
+
+
+class AtomFeedGenerator(LatestDateMixin, feedgenerator.Atom1Feed):
+    pass
+
+
+class FeedFormat:
+    """Serialization of a feed: header, items and footer"""
+    name = None
+    content_type = None
+
+    def __init__(self, title, link, feed_url, description, latest_date):
+        self.title = title
+        self.link = link
+        self.feed_url = feed_url
+        self.description = description
+        self.latest_date = latest_date
+
+    def header(self) -> str:
+        raise NotImplementedError
+
+    def item(self, item: dict) -> str:
+        raise NotImplementedError
+
+    def footer(self) -> str:
+        raise NotImplementedError
+
+    def join(self, fragments):
+        """Join the item fragments in the body of the feed"""
+        return fragments
+
+
+class XmlFeedFormat(FeedFormat):
+    generator_class = None
+    root_element = None
+    item_element = None
+
+    def get_generator(self):
+        generator = self.generator_class(
+            title=self.title,
+            link=self.link,
+            feed_url=self.feed_url,
+            description=self.description,
+        )
+        generator.latest_date = self.latest_date
+        return generator
+
+    def header(self) -> str:
+        generator = self.get_generator()
+        out = StringIO()
+        handler = SimplerXMLGenerator(out, 'utf-8', short_empty_elements=True)
+        handler.startDocument()
+        self.start_root(generator, handler)
+        generator.add_root_elements(handler)
+        return out.getvalue()
+
+    def start_root(self, generator, handler):
+        handler.startElement(self.root_element, generator.root_attributes())
+
+    def item(self, item: dict) -> str:
+        generator = self.get_generator()
+        generator.add_item(**item)
+        item = generator.items.pop()
+        out = StringIO()
+        handler = SimplerXMLGenerator(out, 'utf-8', short_empty_elements=True)
+        handler.startElement(self.item_element, generator.item_attributes(item))
+        generator.add_item_elements(handler, item)
+        handler.endElement(self.item_element)
+        return out.getvalue()
+
+
+class RssFeedFormat(XmlFeedFormat):
+    name = 'rss'
+    content_type = 'application/rss+xml; charset=utf-8'
+    generator_class = RssFeedGenerator
+    root_element = 'channel'
+    item_element = 'item'
+
+    def start_root(self, generator, handler):
+        handler.startElement('rss', generator.rss_attributes())
+        super().start_root(generator, handler)
+
+    def footer(self) -> str:
+        return '</channel></rss>'
+
+
+class AtomFeedFormat(XmlFeedFormat):
+    name = 'atom'
+    content_type = 'application/atom+xml; charset=utf-8'
+    generator_class = AtomFeedGenerator
+    root_element = 'feed'
+    item_element = 'entry'
 
-from . models import Post
+    def footer(self) -> str:
+        return '</feed>'
 
 
-class RssPostsFeed(Feed):
+class JsonFeedFormat(FeedFormat):
+    name = 'json'
+    content_type = 'application/feed+json; charset=utf-8'
+
+    def header(self) -> str:
+        data = json.dumps({
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': self.title,
+            'home_page_url': self.link,
+            'feed_url': self.feed_url,
+            'description': self.description,
+        })
+        # Leave the object open for the items
+        return data[:-1] + ', "items": ['
+
+    def item(self, item: dict) -> str:
+        data = {
+            'id': item['unique_id'],
+            'url': item['link'],
+            'title': item['title'],
+            'content_html': item['description'],
+            'date_published': item['pubdate'].isoformat(),
+            'date_modified': item['updateddate'].isoformat(),
+            'tags': item['categories'],
+        }
+        if item['author_name']:
+            data['authors'] = [{'name': item['author_name']}]
+        return json.dumps(data)
+
+    def footer(self) -> str:
+        return ']}'
+
+    def join(self, fragments):
+        for index, fragment in enumerate(fragments):
+            yield fragment if index == 0 else ', ' + fragment
+
+
+FEED_FORMATS = {
+    feed_format.name: feed_format
+    for feed_format in (RssFeedFormat, AtomFeedFormat, JsonFeedFormat)
+}
+
+
+class FeedItemRenderer:
+    """
+    Render feed items and cache them by post id and update date,
+    so that an item is rendered again only when its post changes.
+    """
     description_template = "blog/feeds_description.html"
 
-    def title(self):
+    def __init__(self, request, feed_format):
+        self.request = request
+        self.feed_format = feed_format
+
+    def get_cache_key(self, pk, update_date) -> str:
+        return (f"django_blog:feed_item:{self.feed_format.name}:{self.request.get_host()}"
+                f":{pk}:{update_date.timestamp()}")
+
+    def get_item(self, post) -> dict:
+        link = self.request.build_absolute_uri(post.get_absolute_url())
+        return {
+            'title': post.title,
+            'link': link,
+            'unique_id': link,
+            'description': render_to_string(self.description_template, {'obj': post}),
+            'pubdate': post.pub_date,
+            'updateddate': post.update_date,
+            'author_name': post.author.get_username() if post.author else None,
+            'categories': [tag.name for tag in post.tags.all()],
+        }
+
+    def render(self, keys) -> list:
+        """
+        Return the rendered items for a list of (id, update_date) pairs,
+        in the same order
+        """
+        cache = get_cache()
+        cache_keys = [self.get_cache_key(pk, update_date) for pk, update_date in keys]
+        fragments = cache.get_many(cache_keys)
+
+        missing = [pk for (pk, _), key in zip(keys, cache_keys) if key not in fragments]
+        if missing:
+            posts = (Post.objects
+                     .filter(pk__in=missing)
+                     .select_related('author')
+                     .prefetch_related('tags'))
+            rendered = {}
+            for post in posts:
+                key = self.get_cache_key(post.pk, post.update_date)
+                rendered[key] = self.feed_format.item(self.get_item(post))
+            cache.set_many(rendered, ITEM_CACHE_TIMEOUT)
+            fragments.update(rendered)
+
+        return [fragments[key] for key in cache_keys if key in fragments]
+
+
+class PostsFeed(View):
+    """Feed of the last published posts, optionally filtered by tag or author"""
+    feed_format = RssFeedFormat
+
+    def title(self) -> str:
         try:
             return settings.DJANGO_BLOG_FEED_TITLE
         except AttributeError:
             return "Generic title"
 
-    def description(self):
+    def description(self) -> str:
         try:
             return settings.DJANGO_BLOG_FEED_DESCRIPTION
         except AttributeError:
             return "Generic description"
 
-    def link(self):
+    def link(self) -> str:
         return reverse("blog:list")
 
-    def items(self):
-        return Post.published_objects.order_by("-pub_date")[:100]
+    def get_queryset(self):
+        return Post.published_objects.all()
+
+    def get_cache_name(self) -> str:
+        return "feed"
+
+    def get_item_keys(self) -> list:
+        """The (id, update_date) pairs of the posts in the feed"""
+        name = self.get_cache_name()
+        return get_or_compute(
+            f"django_blog:{name}:items",
+            lambda: list(self.get_queryset()
+                         .order_by('-pub_date')
+                         .values_list('pk', 'update_date')[:FEED_ITEMS]),
+            FRAGMENT_CACHE_TIMEOUT,
+            version=get_listings_version(),
+            name=name,
+        )
+
+    def get(self, request, *args, **kwargs):
+        keys = self.get_item_keys()
+        feed_format = self.feed_format(
+            title=self.title(),
+            link=request.build_absolute_uri(self.link()),
+            feed_url=request.build_absolute_uri(),
+            description=self.description(),
+            latest_date=max((update_date for _, update_date in keys), default=None),
+        )
+        renderer = FeedItemRenderer(request, feed_format)
+
+        def stream():
+            yield feed_format.header()
+            yield from feed_format.join(renderer.render(keys))
+            yield feed_format.footer()
+
+        return StreamingHttpResponse(stream(), content_type=feed_format.content_type)
+
+
+class TagPostsFeed(PostsFeed):
+    def get_tag(self) -> Tag:
+        if not hasattr(self, 'tag'):
+            self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
+        return self.tag
+
+    def title(self) -> str:
+        return f"{super().title()} - {self.get_tag()}"
+
+    def link(self) -> str:
+        return self.get_tag().get_absolute_url()
+
+    def get_cache_name(self) -> str:
+        return f"tag_feed:{self.get_tag().pk}"
+
+    def get_queryset(self):
+        return Post.published_objects.filter(tags=self.get_tag())
+
+
+class AuthorPostsFeed(PostsFeed):
+    def get_author(self):
+        if not hasattr(self, 'author'):
+            self.author = get_object_or_404(get_user_model(), pk=self.kwargs['pk'])
+        return self.author
+
+    def title(self) -> str:
+        return f"{super().title()} - {self.get_author().get_username()}"
+
+    def get_cache_name(self) -> str:
+        return f"author_feed:{self.get_author().pk}"
+
+    def get_queryset(self):
+        return Post.published_objects.filter(author=self.get_author())
+
 
-    def item_title(self, item):
-        return item.title
+class RssPostsFeed(PostsFeed):
+    """
+    The RSS feed of the last published posts, with the interface of the
+    syndication feed it replaces: URLconfs with ``RssPostsFeed()`` keep
+    working.
+    """
+    feed_format = RssFeedFormat
 
-    def item_pubdate(self, item):
-        return item.pub_date
+    def __call__(self, request, *args, **kwargs):
+        return type(self).as_view()(request, *args, **kwargs)
@@ -1,12 +1,51 @@
 from django import forms
+from django.template import Template
+from django.template.loader import render_to_string
+from django.utils.functional import cached_property
 from .models import Post
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Field, Div, HTML, Submit
 from crispy_forms.bootstrap import InlineCheckboxes, StrictButton, FormActions
+from crispy_forms.utils import TEMPLATE_PACK
 from crispy_bootstrap5.bootstrap5 import Switch
 from tinymce.widgets import TinyMCE
 from django.utils.timezone import localtime
 
+
+# The helpers of the forms are built once per process and shared by all
+# the instances: values that change with the request (the post, the
+# user) must come from the template context, never from the form.
+
+class StaticHTML(HTML):
+    """HTML compiled once and rendered with the template context"""
+
+    @cached_property
+    def compiled(self):
+        return Template(str(self.html))
+
+    def render(self, form, context, template_pack=TEMPLATE_PACK, **kwargs):
+        return self.compiled.render(context)
+
+
+class StaticButton(StrictButton):
+    """
+    Button with a fixed content. ``StrictButton`` renders its content as a
+    template and stores the result, which is not safe in a shared layout.
+    """
+
+    def render(self, form, context, template_pack=TEMPLATE_PACK, **kwargs):
+        context.update({"button": self})
+        return render_to_string(self.get_template_name(template_pack), context.flatten())
+
+
+class StaticSubmit(Submit):
+    """Submit input with a fixed value, for the same reason of ``StaticButton``"""
+
+    def render(self, form, context, template_pack=TEMPLATE_PACK, **kwargs):
+        context.update({"input": self})
+        return render_to_string(self.get_template_name(template_pack), context.flatten())
+
+
 class PostCommonLayout(Layout):
     """Layout common for create and update form for posts"""
     def __init__(self, *args, **kwargs):
@@ -16,6 +55,68 @@ class PostCommonLayout(Layout):
             Field("body"),
         )
 
+
+def make_tags_layout() -> Div:
+    return Div(
+        StaticHTML('<label for="tag" class="form-label">Tag (<span id="tag-count">0</span>):</label>'
+            '<ul id="tag-list" class="post-meta mb-3"></ul>'
+            '<input type="text" name="tag" id="tag" list="tag-datalist" autocomplete="off" class="text-input form-control"'
+            'placeholder="Cerca o aggiungi un tag">'
+            '<datalist id="tag-datalist"></datalist>'),
+            css_class="mb-3"
+    )
+
+
+def make_change_date_helper() -> FormHelper:
+    helper = FormHelper()
+    helper.layout = Layout(
+        "pub_date",
+        StaticHTML('<p class="form-text">Scegli quando vuoi che sia reso pubblico il post “{{ post }}”.</p>'),
+        FormActions(
+            StaticSubmit("submit", "Programma post"),
+            StaticHTML('<a href="{% url "blog:detail" post.pk %}" class="btn btn-outline-danger">Annulla</a>')
+        )
+    )
+    return helper
+
+
+def make_create_helper() -> FormHelper:
+    helper = FormHelper()
+    helper.form_id = 'post-form'
+    helper.layout = Layout(
+        Div(
+            Switch("author"),
+            StaticHTML("<p class='form-text'>Puoi decidere di pubblicare il post a tuo nome. In questo caso solo tu potrai modificarlo o eliminarlo</p>")
+        ),
+        make_tags_layout(),
+        PostCommonLayout(),
+        FormActions(
+            StaticButton("Pubblica", name="submit", value="publish", type="submit", css_class="btn-success"),
+            StaticButton("Salva Bozza", name="submit", value="draft", type="submit", css_class="btn-warning"),
+            StaticButton("Programma", name="submit", value="set_date", type="submit", css_class="btn-secondary"),
+            StaticHTML('<a href="{% url "blog:list" %}" class="btn btn-outline-danger">Annulla</a>')
+        ),
+        StaticHTML("<p class='form-text'>Puoi decidere di <strong>pubblicare</strong> il post immediatamente, <strong>salvarlo come bozza</strong>, oppure <strong>programmare la pubblicazione</strong> per una data successiva (che sarà sempre possibile cambiare)</p>")
+    )
+    return helper
+
+
+def make_update_helper() -> FormHelper:
+    helper = FormHelper()
+    helper.form_id = 'post-form'
+    helper.layout = Layout(
+        "version",
+        make_tags_layout(),
+        PostCommonLayout(),
+        FormActions(
+            StaticButton("Salva le modifiche", name="submit", value="save", type="submit", css_class="btn-success"),
+            StaticHTML('<a href="{% url "blog:detail" post.pk %}" class="btn btn-outline-danger">Annulla</a>')
+
+            )
+        )
+    return helper
+
+
 class PostCommonForm(forms.ModelForm):
     """Form for working with posts"""
     class Meta:
@@ -27,6 +128,8 @@ class PostCommonForm(forms.ModelForm):
 
 
 class PostChangeDateForm(forms.ModelForm):
+    helper = make_change_date_helper()
+
     class Meta:
         model = Post
         fields = ["pub_date",]
@@ -44,16 +147,6 @@ class PostChangeDateForm(forms.ModelForm):
         self.fields['pub_date'].widget.attrs['value'] = current_datetime
         self.fields['pub_date'].widget.attrs['min'] = current_datetime
 
-        self.helper = FormHelper()
-        self.helper.layout = Layout(
-            "pub_date",
-            HTML(f'<p class="form-text">Scegli quando vuoi che sia reso pubblico il post “{self.instance}”.</p>'),
-            FormActions(
-                Submit("submit", "Programma post"),
-                HTML('<a href="{% url "blog:detail" post.pk %}" class="btn btn-outline-danger">Annulla</a>')
-            )
-        )
-
 
 
 class PostCreateForm(PostCommonForm):
@@ -61,56 +154,14 @@ class PostCreateForm(PostCommonForm):
 
     author = forms.BooleanField(required=False, label="Pubblica a mio nome")
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-
-        self.helper = FormHelper()
-        self.helper.form_id = 'post-form'
-        self.helper.layout = Layout(
-            Div(
-                Switch("author"),
-                HTML("<p class='form-text'>Puoi decidere di pubblicare il post a tuo nome. In questo caso solo tu potrai modificarlo o eliminarlo</p>")
-            ),
-            Div(
-                HTML('<label for="tag" class="form-label">Tag (<span id="tag-count">0</span>):</label>'
-                    '<ul id="tag-list" class="post-meta mb-3"></ul>'
-                    '<input type="text" name="tag" id="tag" list="tag-datalist" autocomplete="off" class="text-input form-control"'
-                    'placeholder="Cerca o aggiungi un tag">'
-                    '<datalist id="tag-datalist"></datalist>'),
-                    css_class="mb-3"
-            ),
-            PostCommonLayout(),
-            FormActions(
-                StrictButton("Pubblica", name="submit", value="publish", type="submit", css_class="btn-success"),
-                StrictButton("Salva Bozza", name="submit", value="draft", type="submit", css_class="btn-warning"),
-                StrictButton("Programma", name="submit", value="set_date", type="submit", css_class="btn-secondary"),
-                HTML('<a href="{% url "blog:list" %}" class="btn btn-outline-danger">Annulla</a>')
-            ),
-            HTML("<p class='form-text'>Puoi decidere di <strong>pubblicare</strong> il post immediatamente, <strong>salvarlo come bozza</strong>, oppure <strong>programmare la pubblicazione</strong> per una data successiva (che sarà sempre possibile cambiare)</p>")
-        )
+    helper = make_create_helper()
 
 
 class PostUpdateForm(PostCommonForm):
     """Form for the update for posts"""
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_id = 'post-form'
-        self.helper.layout = Layout(
-            Div(
-                HTML('<label for="tag" class="form-label">Tag (<span id="tag-count">0</span>):</label>'
-                    '<ul id="tag-list" class="post-meta mb-3"></ul>'
-                    '<input type="text" name="tag" id="tag" list="tag-datalist" autocomplete="off" class="text-input form-control"'
-                    'placeholder="Cerca o aggiungi un tag">'
-                    '<datalist id="tag-datalist"></datalist>'),
-                    css_class="mb-3"
-            ),
-            PostCommonLayout(),
-            FormActions(
-                StrictButton("Salva le modifiche", name="submit", value="save", type="submit", css_class="btn-success"),
-                HTML('<a href="{% url "blog:detail" post.pk %}" class="btn btn-outline-danger">Annulla</a>')
-
-                )
-            )
+    # Version of the post the form was loaded with: saving over a newer
+    # version is a conflict, like for the autosaves
+    version = forms.IntegerField(widget=forms.HiddenInput)
 
+    helper = make_update_helper()
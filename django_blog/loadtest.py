@@ -0,0 +1,227 @@
+"""
+In-process load test of the blog, with concurrent readers and editors.
+
+Every worker is a thread with its own test client, so requests go through
+the whole Django request handler (middleware, views, templates) and the
+configured database, without a web server. Readers browse the list, the
+posts, the tags and the feeds; writers, each logged in as its own user,
+create, update (changing the tags), publish and schedule their posts.
+
+Writers use users, tags and posts whose names start with ``PREFIX``: the
+ones created by the run are deleted at the end, unless asked otherwise,
+while the ones that already existed are left alone.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import Client
+from django.urls import resolve, reverse
+from django.utils.timezone import localtime, now
+
+from . models import Post, Tag
+
+
+PREFIX = 'loadtest-'
+DATEFORMAT = "%Y-%m-%dT%H:%M"
+
+# Relative frequency of the requests
+READS = {'list': 4, 'detail': 6, 'tag': 3, 'feed': 1}
+WRITES = {'create': 2, 'update': 5, 'publish': 1, 'change_date': 1}
+
+# Tags used by the writers: few, to have contention on the same rows
+WRITER_TAGS = 10
+
+
+def percentile(values, fraction) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = defaultdict(int)
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    def summary(self, elapsed) -> dict:
+        latencies = sorted(self.latencies)
+        errors = sum(self.errors.values())
+        return {
+            'requests': self.requests,
+            'throughput': self.requests / elapsed if elapsed else 0,
+            'errors': errors,
+            'error_rate': errors / self.requests if self.requests else 0,
+            'error_kinds': dict(self.errors),
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0,
+        }
+
+
+class LoadTest:
+    def __init__(self, readers=8, writers=2, host='localhost', seed=None):
+        self.readers = readers
+        self.writers = writers
+        self.host = host
+        self.random = random.Random(seed)
+        self.stats = defaultdict(EndpointStats)
+        self.lock = threading.Lock()
+        self.elapsed = 0
+        self.created_users = []
+        self.created_posts = []
+        self.existing_tags = set()
+
+    def setup(self):
+        """Users of the writers and the targets of the readers"""
+        User = get_user_model()
+        self.users = []
+        for index in range(self.writers):
+            user, created = User.objects.get_or_create(username=f"{PREFIX}{index}")
+            self.users.append(user)
+            if created:
+                self.created_users.append(user.pk)
+        self.tag_names = [f"{PREFIX}{index}" for index in range(WRITER_TAGS)]
+        self.existing_tags = set(Tag.objects.filter(name__startswith=PREFIX).values_list('pk', flat=True))
+        self.post_ids = list(Post.published_objects.values_list('pk', flat=True)[:1000])
+        self.tag_slugs = list(Tag.objects.filter(post__in=Post.published_objects.all())
+                              .distinct().values_list('slug', flat=True)[:200])
+
+    def cleanup(self):
+        """Delete what the run created: its posts, its users, and its tags left without posts"""
+        Post.objects.filter(pk__in=self.created_posts).delete()
+        (Tag.objects.filter(name__startswith=PREFIX, post__isnull=True)
+         .exclude(pk__in=self.existing_tags).delete())
+        get_user_model().objects.filter(pk__in=self.created_users).delete()
+
+    def request(self, endpoint, client, method, url, data=None, expected=200):
+        """Make a request, timing it and recording its outcome"""
+        start = time.perf_counter()
+        error = None
+        try:
+            response = getattr(client, method)(url, data or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+            if response.status_code != expected:
+                error = str(response.status_code)
+        except Exception as e:
+            response = None
+            error = type(e).__name__
+        latency = time.perf_counter() - start
+        with self.lock:
+            stats = self.stats[endpoint]
+            stats.latencies.append(latency)
+            if error:
+                stats.errors[error] += 1
+        return response if error is None else None
+
+    def choose(self, weights) -> str:
+        return self.random.choices(list(weights), list(weights.values()))[0]
+
+    def read(self, client):
+        endpoint = self.choose(READS)
+        if endpoint == 'detail' and self.post_ids:
+            url = reverse('blog:detail', args=[self.random.choice(self.post_ids)])
+        elif endpoint == 'tag' and self.tag_slugs:
+            url = reverse('blog:list_by_tag_slug', args=[self.random.choice(self.tag_slugs)])
+        elif endpoint == 'feed':
+            url = reverse('blog:feed_rss')
+        else:
+            endpoint, url = 'list', reverse('blog:list')
+        self.request(endpoint, client, 'get', url)
+
+    def write(self, client, posts):
+        """Make a request of a writer, whose posts are in ``posts``"""
+        endpoint = self.choose(WRITES) if posts else 'create'
+        tags = self.random.sample(self.tag_names, self.random.randint(0, 3))
+        if endpoint == 'create':
+            response = self.request(endpoint, client, 'post', reverse('blog:create'), {
+                'title': f"{PREFIX}post",
+                'body': "Load test",
+                # Signed by the writer, to be cleaned up later
+                'author': 'on',
+                'tags': tags,
+                'submit': self.random.choice(['publish', 'draft']),
+            }, expected=302)
+            if response is not None:
+                pk = resolve(urlparse(response['Location']).path).kwargs['pk']
+                posts.append(pk)
+                with self.lock:
+                    self.created_posts.append(pk)
+            return
+
+        pk = self.random.choice(posts)
+        if endpoint == 'update':
+            # As loaded by the form, which is not timed
+            version = Post.objects.values_list('version', flat=True).get(pk=pk)
+            self.request(endpoint, client, 'post', reverse('blog:update', args=[pk]), {
+                'title': f"{PREFIX}post",
+                'body': f"Load test {self.random.random()}",
+                'tags': tags,
+                'version': version,
+            }, expected=302)
+        elif endpoint == 'publish':
+            self.request(endpoint, client, 'post', reverse('blog:publish', args=[pk]), expected=302)
+            self.post_ids.append(pk)
+        else:
+            pub_date = localtime(now() + timedelta(days=self.random.randint(1, 30)))
+            self.request(endpoint, client, 'post', reverse('blog:change_date', args=[pk]), {
+                'pub_date': pub_date.strftime(DATEFORMAT),
+            }, expected=302)
+
+    def run_worker(self, index, deadline=None, requests=None):
+        """Run a reader (or a writer, for indexes after the readers)"""
+        client = Client(HTTP_HOST=self.host)
+        writer = index >= self.readers
+        if writer:
+            client.force_login(self.users[index - self.readers])
+        posts = []
+        count = 0
+        while (deadline is None or time.monotonic() < deadline) and (requests is None or count < requests):
+            if writer:
+                self.write(client, posts)
+            else:
+                self.read(client)
+            count += 1
+
+    def run_thread(self, index, deadline, requests):
+        try:
+            self.run_worker(index, deadline, requests)
+        finally:
+            connections.close_all()
+
+    def run(self, duration=None, requests=None):
+        """Run all the workers for ``duration`` seconds or ``requests`` requests each"""
+        deadline = time.monotonic() + duration if duration is not None else None
+        threads = [
+            threading.Thread(target=self.run_thread, args=(index, deadline, requests))
+            for index in range(self.readers + self.writers)
+        ]
+        # Errors are counted in the report, not logged one by one
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            request_logger.disabled = False
+        self.elapsed = time.perf_counter() - start
+
+    def report(self) -> dict:
+        return {endpoint: stats.summary(self.elapsed) for endpoint, stats in sorted(self.stats.items())}
@@ -0,0 +1,119 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Apps and modules needed only by the editing views
+EDITING_APPS = ['crispy_forms', 'crispy_bootstrap5', 'tinymce']
+EDITING_MODULES = ['django_blog.forms', 'django_blog.views', 'crispy_forms', 'crispy_bootstrap5', 'tinymce']
+
+# Run in a fresh interpreter: set up Django, load the URLconf and report
+# the elapsed time, the peak RSS and the editing modules that were imported
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+from django.conf import settings
+if sys.argv[1] == 'read-only':
+    settings.DJANGO_BLOG_READ_ONLY = True
+    settings.INSTALLED_APPS = [app for app in settings.INSTALLED_APPS if app not in %(apps)r]
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+try:
+    # Peak RSS of this process: on Linux ru_maxrss survives exec and may
+    # report the peak of the parent
+    with open('/proc/self/status') as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+print(json.dumps({
+    'time': elapsed,
+    'rss': rss,
+    'modules': [name for name in %(modules)r if name in sys.modules],
+}))
+"""
+
+STARTUP_MODES = ['full', 'read-only']
+
+# Renders of every form in each repetition of the forms benchmark
+FORM_RENDERS = 50
+
+
+class Command(BaseCommand):
+    help = "Measure the performance of parts of the blog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['startup', 'forms'])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+        getattr(self, f"benchmark_{options['target']}")(options['repeat'])
+
+    def run_startup(self, mode) -> dict:
+        script = STARTUP_SCRIPT % {'apps': EDITING_APPS, 'modules': EDITING_MODULES}
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join(path for path in sys.path if path)}
+        result = subprocess.run(
+            [sys.executable, '-c', script, mode],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Startup in {mode} mode failed:\n{result.stderr}")
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def benchmark_startup(self, repeat):
+        """Import time and memory of a new worker, with and without the editing views"""
+        self.stdout.write(f"{'mode':<10} {'time (ms)':>10} {'RSS (KiB)':>10}  editing modules")
+        for mode in STARTUP_MODES:
+            runs = [self.run_startup(mode) for _ in range(repeat)]
+            time = statistics.median(run['time'] for run in runs) * 1000
+            rss = statistics.median(run['rss'] for run in runs)
+            modules = ', '.join(runs[0]['modules']) or '-'
+            self.stdout.write(f"{mode:<10} {time:>10.1f} {rss:>10.0f}  {modules}")
+
+    def time_form_renders(self, form_class, make_helper, post) -> float:
+        """Seconds to instantiate and render a form, building its helper each time if given"""
+        from django.template import Context, Template
+        template = Template("{% load crispy_forms_tags %}{% crispy form %}")
+        start = time.perf_counter()
+        for _ in range(FORM_RENDERS):
+            form = form_class(instance=post)
+            if make_helper is not None:
+                # As before the helpers were shared: a new layout for every form
+                form.helper = make_helper()
+            template.render(Context({'form': form, 'post': post, 'csrf_token': 'benchmark'}))
+        return time.perf_counter() - start
+
+    def benchmark_forms(self, repeat):
+        """Render time of the editing forms, with a layout per form and with the shared one"""
+        from django_blog import forms
+        from django_blog.models import Post
+
+        # Not saved: rendering needs no queries
+        post = Post(pk=1, title="Benchmark", body="<p>Benchmark</p>")
+        benchmarks = [
+            ('create', forms.PostCreateForm, forms.make_create_helper),
+            ('update', forms.PostUpdateForm, forms.make_update_helper),
+            ('change date', forms.PostChangeDateForm, forms.make_change_date_helper),
+        ]
+        self.stdout.write(f"{'form':<12} {'per form (ms)':>14} {'shared (ms)':>12} {'speedup':>8}")
+        for name, form_class, make_helper in benchmarks:
+            # Warm up the template loaders
+            self.time_form_renders(form_class, None, post)
+            before = statistics.median(
+                self.time_form_renders(form_class, make_helper, post) for _ in range(repeat)
+            ) / FORM_RENDERS * 1000
+            after = statistics.median(
+                self.time_form_renders(form_class, None, post) for _ in range(repeat)
+            ) / FORM_RENDERS * 1000
+            self.stdout.write(f"{name:<12} {before:>14.2f} {after:>12.2f} {before / after:>7.2f}x")
@@ -0,0 +1,51 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_blog import export
+
+
+class Command(BaseCommand):
+    help = ("Render the public pages, feeds and sitemap of the blog to a directory, "
+            "rebuilding only the pages changed since the last export")
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir')
+        parser.add_argument('--host', default=export.EXPORT_HOST,
+                            help="Host name used in the absolute links")
+        parser.add_argument('--secure', action='store_true',
+                            help="Render the links with https")
+        parser.add_argument('--full', action='store_true',
+                            help="Ignore the previous export and render every page")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Number of worker processes")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        start = time.perf_counter()
+        results, removed = export.export(
+            options['output_dir'],
+            host=options['host'],
+            secure=options['secure'],
+            full=options['full'],
+            workers=options['workers'],
+        )
+        elapsed = time.perf_counter() - start
+
+        errors = [(url, status) for url, status, _ in results if status != 200]
+        for url, status in errors:
+            self.stderr.write(f"{url}: {status}")
+        written = sum(written for _, _, written in results)
+        self.stdout.write(
+            f"Rendered {len(results)} pages ({written} changed, {removed} removed) "
+            f"in {elapsed:.2f}s"
+        )
+        if errors:
+            raise CommandError(f"{len(errors)} pages could not be rendered")
+        if export.brotli is None:
+            self.stdout.write(self.style.WARNING(
+                "The brotli package is not installed: only gzip copies were written"
+            ))
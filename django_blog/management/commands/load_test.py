@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_blog.loadtest import LoadTest
+
+
+class Command(BaseCommand):
+    help = ("Load test the blog in-process, with concurrent readers and writers, "
+            "and report throughput, latency and errors per endpoint")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=30, help="Seconds")
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the users, tags and posts created by the writers")
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or not (options['readers'] + options['writers']):
+            raise CommandError("At least one reader or writer is needed")
+
+        test = LoadTest(options['readers'], options['writers'], options['host'], options['seed'])
+        test.setup()
+        try:
+            test.run(duration=options['duration'])
+        finally:
+            if not options['keep']:
+                test.cleanup()
+
+        self.stdout.write(
+            f"{'endpoint':<12} {'requests':>8} {'req/s':>8} {'errors':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        total = 0
+        for endpoint, summary in test.report().items():
+            total += summary['requests']
+            self.stdout.write(
+                f"{endpoint:<12} {summary['requests']:>8} {summary['throughput']:>8.1f} "
+                f"{summary['error_rate']:>7.1%} {summary['p50'] * 1000:>8.1f} {summary['p95'] * 1000:>8.1f} "
+                f"{summary['p99'] * 1000:>8.1f} {summary['max'] * 1000:>8.1f}"
+            )
+            if summary['error_kinds']:
+                kinds = ', '.join(f"{kind}: {count}" for kind, count in summary['error_kinds'].items())
+                self.stdout.write(self.style.ERROR(f"{'':<12} {kinds}"))
+        self.stdout.write(f"Total: {total} requests in {test.elapsed:.1f}s ({total / test.elapsed:.1f} req/s)")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_blog import tagmerge
+
+
+class Command(BaseCommand):
+    help = ("Merge and rename tags from a CSV file of source,target names: "
+            "sources are merged into existing targets, renamed otherwise")
+
+    def add_arguments(self, parser):
+        parser.add_argument('mapping', help="CSV file with two columns: source and target tag name")
+        parser.add_argument('--batch-size', type=int, default=tagmerge.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report what would be changed")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['mapping'], newline='', encoding='utf-8') as f:
+                mapping = tagmerge.read_mapping(f)
+            report = tagmerge.apply_mapping(
+                mapping,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+        except (OSError, tagmerge.TagMappingError) as e:
+            raise CommandError(e)
+
+        prefix = "Would change" if options['dry_run'] else "Changed"
+        self.stdout.write(
+            f"{prefix} {report['posts']} posts: {report['merged']} tags merged, "
+            f"{report['renamed']} renamed"
+        )
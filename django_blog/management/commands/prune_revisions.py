@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from django_blog import revisions
+
+
+class Command(BaseCommand):
+    help = "Delete the post revisions past the retention period, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=revisions.KEEP,
+                            help="Revisions of each post always kept")
+        parser.add_argument('--days', type=int, default=revisions.RETENTION_DAYS,
+                            help="Keep the revisions newer than this many days")
+        parser.add_argument('--batch-size', type=int, default=revisions.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report how many revisions would be deleted")
+
+    def handle(self, *args, **options):
+        deleted = revisions.prune(
+            keep=options['keep'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        prefix = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {deleted} revisions"))
+
+        sizes = revisions.get_sizes()
+        ratio = sizes['revisions'] / sizes['posts'] if sizes['posts'] else 0
+        self.stdout.write(
+            f"History: {sizes['revisions'] / 1024:.1f} KiB, "
+            f"{ratio:.0%} of the content of the posts ({sizes['posts'] / 1024:.1f} KiB)"
+        )
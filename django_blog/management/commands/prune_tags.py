@@ -0,0 +1,33 @@
+from argparse import BooleanOptionalAction
+
+from django.core.management.base import BaseCommand
+
+from django_blog import tagprune
+
+
+class Command(BaseCommand):
+    help = "Delete the tags not used by any post, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--include-drafts', action=BooleanOptionalAction, default=tagprune.PRUNE_DRAFT_TAGS,
+                            help="Also delete the tags used only by drafts")
+        parser.add_argument('--grace-period', type=int, default=tagprune.GRACE_PERIOD,
+                            help="Keep the tags created less than this many seconds ago")
+        parser.add_argument('--batch-size', type=int, default=tagprune.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report the tags that would be deleted")
+
+    def handle(self, *args, **options):
+        report = tagprune.prune(
+            include_drafts=options['include_drafts'],
+            grace_period=options['grace_period'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['verbosity'] > 1:
+            for name in report['tags']:
+                self.stdout.write(name)
+        prefix = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {len(report['tags'])} tags, used by {report['posts']} drafts"
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from django_blog.bulk import publish_scheduled_posts
+
+
+class Command(BaseCommand):
+    help = ("Mark as published the scheduled posts whose publication date has passed. "
+            "Run it periodically (e.g. every minute from cron).")
+
+    def handle(self, *args, **options):
+        post_ids = publish_scheduled_posts()
+        self.stdout.write(f"Published {len(post_ids)} scheduled posts")
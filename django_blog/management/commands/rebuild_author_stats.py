@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from django_blog import authorstats
+
+
+class Command(BaseCommand):
+    help = "Compute again from scratch the published post counts of the authors"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=authorstats.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = authorstats.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated the counts of {total} authors"))
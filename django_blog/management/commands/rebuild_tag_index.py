@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from django_blog import tagindex
+
+
+class Command(BaseCommand):
+    help = "Rebuild from scratch the materialized per-tag lists of posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=tagindex.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = tagindex.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} tag relations"))
+        if not tagindex.is_enabled():
+            self.stdout.write(self.style.WARNING(
+                "DJANGO_BLOG_TAG_INDEX is not enabled: the index will not be kept up to date"
+            ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from django_blog import tasks
+
+
+class Command(BaseCommand):
+    help = "Work on the queue of the changed posts (DJANGO_BLOG_TASKS = 'worker')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when the queue is empty")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty")
+        parser.add_argument('--batch-size', type=int, default=tasks.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    processed = tasks.run_pending(batch_size=options['batch_size'])
+                except Exception:
+                    # The posts are taken again when their lease expires
+                    tasks.logger.exception("Deferred work on the changed posts failed")
+                    processed = 0
+                total += processed
+                if processed and options['verbosity'] >= 2:
+                    self.stdout.write(f"Processed {processed} posts")
+                if options['once']:
+                    break
+                if not processed:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} posts"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from django_blog import slowqueries
+
+
+class Command(BaseCommand):
+    help = "Print the slow queries of the blog views, grouped by view and shape"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help="Only the queries of this view (e.g. blog:list)")
+        parser.add_argument('--limit', type=int, default=10,
+                            help="Number of groups per view")
+        parser.add_argument('--no-plan', action='store_true', help="Do not print the plans")
+        parser.add_argument('--reset', action='store_true', help="Delete the collected queries")
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            slowqueries.reset()
+            self.stdout.write("Slow queries deleted")
+            return
+
+        by_view = {}
+        for group in slowqueries.get_groups():
+            if options['view'] in (None, group['view']):
+                by_view.setdefault(group['view'], []).append(group)
+
+        if not by_view:
+            self.stdout.write("No slow queries")
+        # Views with more time spent in slow queries first
+        for view, groups in sorted(by_view.items(), key=lambda item: -sum(g['total'] for g in item[1])):
+            self.stdout.write(self.style.MIGRATE_HEADING(view))
+            for group in groups[:options['limit']]:
+                self.stdout.write(
+                    f"  {group['count']} times, total {group['total'] * 1000:.1f} ms, "
+                    f"max {group['max'] * 1000:.1f} ms"
+                )
+                self.stdout.write(f"  {group['sql']}")
+                self.stdout.write(f"  Params: {group['params']}")
+                if group['plan'] and not options['no_plan']:
+                    for line in group['plan'].splitlines():
+                        self.stdout.write(f"    {line}")
+                self.stdout.write("")
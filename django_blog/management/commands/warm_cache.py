@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_blog import warmup
+
+
+class Command(BaseCommand):
+    help = ("Render the most requested pages of the blog to fill the caches, "
+            "after a deploy or a cache flush")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list-pages', type=int, default=3,
+                            help="Number of pages of the post list")
+        parser.add_argument('--tags', type=int, default=10,
+                            help="Number of tags, the ones with more posts first")
+        parser.add_argument('--posts', type=int, default=20,
+                            help="Number of the latest posts")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Number of pages rendered concurrently")
+        parser.add_argument('--budget', type=float, default=None,
+                            help="Time budget in seconds: later pages are skipped")
+        parser.add_argument('--host', default=warmup.EXPORT_HOST,
+                            help="Host name of the requests")
+        parser.add_argument('--secure', action='store_true',
+                            help="Make the requests with https")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        start = time.perf_counter()
+        urls = warmup.get_urls(options['list_pages'], options['tags'], options['posts'])
+        results = warmup.warm(
+            urls,
+            host=options['host'],
+            secure=options['secure'],
+            workers=options['workers'],
+            budget=options['budget'],
+        )
+        elapsed = time.perf_counter() - start
+
+        for url, status, seconds in results:
+            if status is warmup.SKIPPED:
+                self.stdout.write(f"skip {'':>10}  {url}")
+            else:
+                line = f"{status:<4} {seconds * 1000:>7.1f} ms  {url}"
+                self.stdout.write(line if status == 200 else self.style.ERROR(line))
+
+        warmed = sum(status == 200 for _, status, _ in results)
+        skipped = sum(status is warmup.SKIPPED for _, status, _ in results)
+        failed = len(results) - warmed - skipped
+        self.stdout.write(
+            f"Warmed {warmed} pages in {elapsed:.2f}s ({skipped} skipped, {failed} failed)"
+        )
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_update_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='key',
+            field=models.CharField(editable=False, max_length=60, null=True, verbose_name='chiave'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(editable=False, max_length=60, null=True),
+        ),
+    ]
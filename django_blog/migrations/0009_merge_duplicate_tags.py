@@ -0,0 +1,97 @@
+"""
+Merge the tags whose names differ only by case or whitespace and fill in
+the normalized key and the slug of every tag.
+
+The tag with the lowest primary key of every group is kept: the posts of
+the duplicates are moved to it, rewriting the through table in batches.
+"""
+import hashlib
+
+from django.db import migrations
+from django.utils.text import slugify
+
+
+BATCH_SIZE = 1000
+
+
+def clean_tag_name(name):
+    return ' '.join(name.split())
+
+
+def normalize_tag_name(name):
+    return clean_tag_name(name).casefold()
+
+
+def slugify_tag_key(key):
+    slug = slugify(key)[:50]
+    if not slug or slug.isdigit():
+        slug = f"tag-{slug}" if slug else "tag"
+    return slug
+
+
+def merge_tags(Through, kept, duplicate):
+    """Move the posts of ``duplicate`` to ``kept``, without duplicating pairs"""
+    moved = 0
+    while True:
+        post_ids = list(Through.objects
+                        .filter(tag_id=duplicate.pk)
+                        .values_list('post_id', flat=True)[:BATCH_SIZE])
+        if not post_ids:
+            return moved
+        already_tagged = set(Through.objects
+                             .filter(tag_id=kept.pk, post_id__in=post_ids)
+                             .values_list('post_id', flat=True))
+        Through.objects.bulk_create([
+            Through(post_id=post_id, tag_id=kept.pk)
+            for post_id in post_ids if post_id not in already_tagged
+        ])
+        Through.objects.filter(tag_id=duplicate.pk, post_id__in=post_ids).delete()
+        moved += len(post_ids)
+
+
+def normalize_tags(apps, schema_editor):
+    Tag = apps.get_model('blog', 'Tag')
+    Through = apps.get_model('blog', 'Post').tags.through
+
+    kept_by_key = {}
+    duplicates = []
+    for tag in Tag.objects.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        key = normalize_tag_name(tag.name)
+        if key in kept_by_key:
+            duplicates.append(tag)
+        else:
+            kept_by_key[key] = tag
+
+    for duplicate in duplicates:
+        kept = kept_by_key[normalize_tag_name(duplicate.name)]
+        moved = merge_tags(Through, kept, duplicate)
+        duplicate.delete()
+        print(f"\n  Merged tag {duplicate.name!r} into {kept.name!r} ({moved} posts)", end='')
+
+    used_slugs = set()
+    tags = []
+    for key, tag in kept_by_key.items():
+        slug = slugify_tag_key(key)
+        if slug in used_slugs:
+            digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()[:8]
+            slug = f"{slug[:50]}-{digest}"
+        used_slugs.add(slug)
+        tag.name = clean_tag_name(tag.name)
+        tag.key = key
+        tag.slug = slug
+        tags.append(tag)
+    Tag.objects.bulk_update(tags, ['name', 'key', 'slug'], batch_size=BATCH_SIZE)
+
+    if duplicates:
+        print(f"\n  Merged {len(duplicates)} duplicate tags", end='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_tag_key_tag_slug'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_tags, migrations.RunPython.noop),
+    ]
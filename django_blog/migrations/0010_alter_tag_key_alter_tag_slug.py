@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_merge_duplicate_tags'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='key',
+            field=models.CharField(editable=False, max_length=60, unique=True, verbose_name='chiave'),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(editable=False, max_length=60, unique=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_alter_tag_key_alter_tag_slug'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagPostIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='blog.post')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', '-pub_date', '-post'], name='blog_tagpostindex_order')],
+                'constraints': [models.UniqueConstraint(fields=('tag', 'post'), name='blog_tagpostindex_unique')],
+            },
+        ),
+    ]
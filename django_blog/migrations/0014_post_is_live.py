@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.timezone import now
+
+
+def set_is_live(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.filter(pub_date__lte=now()).update(is_live=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_post_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_live',
+            field=models.BooleanField(default=False, editable=False, verbose_name='pubblicato'),
+        ),
+        migrations.RunPython(set_is_live, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_live', True)), fields=['-pub_date'], name='blog_post_live'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_live', False), ('pub_date__isnull', False)), fields=['pub_date'], name='blog_post_scheduled'),
+        ),
+    ]
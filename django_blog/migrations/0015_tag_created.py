@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_post_is_live'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='data di creazione'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_tag_created'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='numero')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='data')),
+                ('data', models.BinaryField()),
+                ('digest', models.CharField(max_length=40)),
+                ('post', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='revisions', to='blog.post')),
+                ('snapshot', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='deltas', to='blog.postrevision')),
+            ],
+            options={
+                'verbose_name': 'revisione',
+                'verbose_name_plural': 'revisioni',
+                'constraints': [models.UniqueConstraint(fields=('post', 'number'), name='blog_postrevision_unique')],
+            },
+        ),
+    ]
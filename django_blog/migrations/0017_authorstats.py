@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.timezone import now
+
+
+def fill_author_stats(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    AuthorStats = apps.get_model('blog', 'AuthorStats')
+    counts = (Post.objects
+              .filter(models.Q(is_live=True) | models.Q(pub_date__lte=now()), author__isnull=False)
+              .values('author_id')
+              .annotate(post_count=models.Count('pk'), last_pub_date=models.Max('pub_date'))
+              .order_by())
+    AuthorStats.objects.bulk_create([AuthorStats(**row) for row in counts], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_postrevision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='autore')),
+                ('post_count', models.PositiveIntegerField(verbose_name='post pubblicati')),
+                ('last_pub_date', models.DateTimeField(verbose_name='ultima pubblicazione')),
+            ],
+            options={
+                'verbose_name_plural': 'statistiche degli autori',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date'], name='blog_post_author_pub_date'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(fields=['-last_pub_date'], name='blog_authorstats_last'),
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
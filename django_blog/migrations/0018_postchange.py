@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_authorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostChange',
+            fields=[
+                ('post', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='blog.post')),
+                ('queued', models.DateTimeField(default=django.utils.timezone.now, verbose_name='data')),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'modifica in coda',
+                'verbose_name_plural': 'modifiche in coda',
+                'indexes': [models.Index(fields=['queued'], name='blog_postchange_queued')],
+            },
+        ),
+    ]
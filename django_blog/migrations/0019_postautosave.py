@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_postchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostAutosave',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='autosave', serialize=False, to='blog.post')),
+                ('version', models.PositiveIntegerField(verbose_name='versione')),
+                ('fields', models.JSONField(default=dict, verbose_name='campi')),
+                ('tags', models.JSONField(null=True, verbose_name='tag')),
+                ('saved', models.DateTimeField(default=django.utils.timezone.now, verbose_name='data')),
+            ],
+            options={
+                'verbose_name': 'salvataggio automatico',
+                'verbose_name_plural': 'salvataggi automatici',
+            },
+        ),
+    ]
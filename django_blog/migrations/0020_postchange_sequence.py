@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_postautosave'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postchange',
+            name='sequence',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
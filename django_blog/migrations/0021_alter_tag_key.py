@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_postchange_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='key',
+            field=models.CharField(editable=False, max_length=240, unique=True, verbose_name='chiave'),
+        ),
+    ]
@@ -1,6 +1,10 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils.text import slugify
 from django.utils.timezone import now
 
 
@@ -12,7 +16,90 @@ class PublishedPostManager(models.Manager):
     """
 
     def get_queryset(self) -> models.QuerySet:
-        return super().get_queryset().filter(pub_date__lte=now())
+        # Live posts are found with the partial index on is_live; the
+        # second condition covers scheduled posts whose publication date
+        # passed but that publish_scheduled has not flipped yet
+        return super().get_queryset().filter(
+            models.Q(is_live=True) | models.Q(is_live=False, pub_date__lte=now())
+        )
+
+
+def clean_tag_name(name: str) -> str:
+    """Remove leading, trailing and repeated whitespace from a tag name"""
+    return ' '.join(name.split())
+
+
+def normalize_tag_name(name: str) -> str:
+    """
+    Return the key identifying a tag: tags whose names differ only
+    by case or whitespace are the same tag
+    """
+    return clean_tag_name(name).casefold()
+
+
+def slugify_tag_key(key: str) -> str:
+    slug = slugify(key)[:50]
+    # Numeric slugs would be taken for primary keys in the URLs
+    if not slug or slug.isdigit():
+        slug = f"tag-{slug}" if slug else "tag"
+    return slug
+
+
+class TagManager(models.Manager):
+    def get_by_name(self, name: str) -> "Tag":
+        return self.get(key=normalize_tag_name(name))
+
+    def filter_by_names(self, names) -> models.QuerySet:
+        return self.filter(key__in={normalize_tag_name(name) for name in names})
+
+    def get_or_create_many(self, names) -> list:
+        """
+        Return the tags with the given names, creating the missing ones.
+        Names are matched by their normalized key and the number of queries
+        does not depend on the number of names.
+
+        The tags are locked (``SELECT ... FOR UPDATE``), so that the pruning
+        of the orphan tags waits for them to be added to posts: call it in
+        the transaction that adds them.
+        """
+        names_by_key = {}
+        for name in names:
+            name = clean_tag_name(name)
+            if name:
+                names_by_key.setdefault(normalize_tag_name(name), name)
+        if not names_by_key:
+            return []
+
+        # Ordered, so that concurrent callers lock the tags in the same order
+        tags = list(self.select_for_update().filter(key__in=names_by_key).order_by('pk'))
+        # Tags deleted while waiting for the lock are missing, and created again
+        missing = names_by_key.keys() - {tag.key for tag in tags}
+        if not missing:
+            return tags
+
+        slugs = self.unique_slugs(missing)
+        # Ignore conflicts: the tag may have been created concurrently
+        self.bulk_create(
+            [self.model(name=names_by_key[key], key=key, slug=slugs[key]) for key in missing],
+            ignore_conflicts=True
+        )
+        return list(self.select_for_update().filter(key__in=names_by_key).order_by('pk'))
+
+    def unique_slugs(self, keys, exclude_pk=None) -> dict:
+        """Return a slug not used by other tags for each of the given keys"""
+        slugs = {key: slugify_tag_key(key) for key in keys}
+        taken = set(self.filter(slug__in=slugs.values())
+                    .exclude(pk=exclude_pk)
+                    .values_list('slug', flat=True))
+        seen = set()
+        for key, slug in slugs.items():
+            if slug in taken or slug in seen:
+                # Disambiguate with a digest of the key, stable across calls
+                digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()[:8]
+                slug = f"{slug[:50]}-{digest}"
+                slugs[key] = slug
+            seen.add(slug)
+        return slugs
 
 
 class Tag(models.Model):
@@ -22,10 +109,38 @@ class Tag(models.Model):
                             null=False,
                             blank=False,
                             unique=True)
+    # Normalized name: tags are identified by it regardless of case and
+    # spaces. Casefolding makes some characters longer ("ß" is "ss", some
+    # ligatures are three characters): four times the length of the name
+    key = models.CharField("chiave", max_length=240, unique=True, editable=False)
+    slug = models.SlugField(max_length=60, unique=True, editable=False)
+    # Recently created tags are not pruned even if no post uses them yet
+    created = models.DateTimeField("data di creazione", default=now, editable=False)
+
+    objects = TagManager()
 
     def __str__(self) -> str:
         return self.name
 
+    def clean(self):
+        duplicate = (Tag.objects
+                     .filter(key=normalize_tag_name(self.name))
+                     .exclude(pk=self.pk)
+                     .exists())
+        if duplicate:
+            raise ValidationError({'name': "Esiste già un tag con questo nome"})
+
+    def save(self, *args, **kwargs):
+        self.name = clean_tag_name(self.name)
+        key = normalize_tag_name(self.name)
+        if key != self.key or not self.slug:
+            self.key = key
+            self.slug = Tag.objects.unique_slugs([key], exclude_pk=self.pk)[key]
+        super().save(*args, **kwargs)
+
+    def get_absolute_url(self):
+        return reverse('blog:list_by_tag_slug', kwargs={'slug': self.slug})
+
     class Meta:
         verbose_name_plural = 'tag'
 
@@ -55,20 +170,44 @@ class Post(models.Model):
         Tag,
         blank=True
     )
+    # Incremented every time the content is edited: used to detect
+    # concurrent edits
+    version = models.PositiveIntegerField("versione", default=0, editable=False)
+    # Stored visibility: set on save when the publication date has passed,
+    # and by the publish_scheduled command for scheduled posts
+    is_live = models.BooleanField("pubblicato", default=False, editable=False)
 
     objects = models.Manager()
     published_objects = PublishedPostManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Author when loaded: the counts of the previous author of a
+        # reassigned post are updated too
+        instance._loaded_author_id = instance.__dict__.get('author_id')
+        return instance
+
     def publish(self):
         self.pub_date = now()
         self.save()
 
+    def save(self, *args, **kwargs):
+        self.is_live = self.pub_date is not None and self.pub_date <= now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'pub_date' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'is_live'}
+        super().save(*args, **kwargs)
+
     def can_be_modified_by(self, user):
-        return not self.author or self.author == user
+        # Compare the foreign key value, so that no query is needed
+        # to load the author
+        return self.author_id is None or self.author_id == user.pk
 
     def is_published(self):
-        datetime = now()
-        return (not self.is_draft()) and (self.pub_date <= datetime)
+        if self.is_live:
+            return True
+        return (not self.is_draft()) and (self.pub_date <= now())
 
     def get_days_from_publication_to_update(self):
         """
@@ -84,6 +223,26 @@ class Post(models.Model):
     def is_draft(self):
         return self.pub_date is None
 
+    def get_adjacent_published(self, newer, tag=None):
+        """
+        Return the published post that immediately follows (``newer``) or
+        precedes this one, optionally among the posts with ``tag``.
+        Uses a seek query on the (pub_date, id) index.
+        """
+        if self.is_draft():
+            return None
+        if newer:
+            seek = models.Q(pub_date__gt=self.pub_date) | models.Q(pub_date=self.pub_date, pk__gt=self.pk)
+            ordering = ('pub_date', 'pk')
+        else:
+            seek = models.Q(pub_date__lt=self.pub_date) | models.Q(pub_date=self.pub_date, pk__lt=self.pk)
+            ordering = ('-pub_date', '-pk')
+
+        queryset = Post.published_objects.filter(seek)
+        if tag is not None:
+            queryset = queryset.filter(tags=tag)
+        return queryset.order_by(*ordering).only('pk', 'title', 'pub_date').first()
+
     def __str__(self) -> str:
         return self.title
 
@@ -92,3 +251,149 @@ class Post(models.Model):
 
     class Meta:
         verbose_name_plural = 'post'
+        indexes = [
+            models.Index(fields=['pub_date', 'id'], name='blog_post_pub_date_id'),
+            models.Index(
+                fields=['-pub_date'],
+                condition=models.Q(is_live=True),
+                name='blog_post_live'
+            ),
+            models.Index(
+                fields=['pub_date'],
+                condition=models.Q(is_live=False, pub_date__isnull=False),
+                name='blog_post_scheduled'
+            ),
+            # Author listings
+            models.Index(fields=['author', '-pub_date'], name='blog_post_author_pub_date'),
+        ]
+
+
+class TagPostIndex(models.Model):
+    """
+    Posts with a publication date (published or scheduled) of each tag,
+    with their publication date: a materialized copy of ``Post.tags``
+    that serves the tag listings with an index range scan, without joins
+    and sorts. Maintained by ``tagindex`` when ``DJANGO_BLOG_TAG_INDEX``
+    is enabled.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='+')
+    # Rows of deleted posts are removed by the index update, so that deleting
+    # posts does not cost an extra query when the index is disabled
+    post = models.ForeignKey(Post, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'post'], name='blog_tagpostindex_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-pub_date', '-post'], name='blog_tagpostindex_order'),
+        ]
+
+
+class PostRevision(models.Model):
+    """
+    A past state of a post: title, subtitle, body, tags and publication
+    date. Snapshots store the whole state; the other revisions store the
+    difference from their snapshot. Both are compressed. Written by
+    ``revisions`` when ``DJANGO_BLOG_REVISIONS`` is enabled.
+    """
+    # Revisions of deleted posts are removed by ``revisions``, as for
+    # ``TagPostIndex``
+    post = models.ForeignKey(Post, on_delete=models.DO_NOTHING, db_constraint=False, related_name='revisions')
+    # Increasing for each post
+    number = models.PositiveIntegerField("numero")
+    created = models.DateTimeField("data", default=now)
+    # The snapshot this revision is a difference from, or none for
+    # snapshots. Snapshots are pruned together with their revisions.
+    snapshot = models.ForeignKey('self', null=True, on_delete=models.DO_NOTHING, related_name='deltas')
+    data = models.BinaryField()
+    # Of the whole state, to skip saves that changed nothing
+    digest = models.CharField(max_length=40)
+
+    def is_snapshot(self) -> bool:
+        return self.snapshot_id is None
+
+    def __str__(self) -> str:
+        return f"{self.post_id} #{self.number}"
+
+    class Meta:
+        verbose_name = 'revisione'
+        verbose_name_plural = 'revisioni'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'number'], name='blog_postrevision_unique'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """
+    Number of published posts of each author and date of the latest, read
+    by the author index instead of aggregating the posts. Maintained by
+    ``authorstats``; authors with no published posts have no row.
+    """
+    author = models.OneToOneField(
+        get_user_model(),
+        verbose_name="autore",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    post_count = models.PositiveIntegerField("post pubblicati")
+    last_pub_date = models.DateTimeField("ultima pubblicazione")
+
+    def get_absolute_url(self):
+        return reverse('blog:list_by_author', kwargs={'pk': self.author_id})
+
+    class Meta:
+        verbose_name_plural = 'statistiche degli autori'
+        indexes = [
+            models.Index(fields=['-last_pub_date'], name='blog_authorstats_last'),
+        ]
+
+
+class PostChange(models.Model):
+    """
+    A post changed and waiting for the deferred work, queued by ``tasks``.
+    One row per post: changes made before a worker takes the post are
+    merged into one.
+    """
+    # Deleted posts are queued too, to remove their derived data
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    # Of the latest change, to take the oldest first
+    queued = models.DateTimeField("data", default=now)
+    # Incremented by every change: changes queued while a worker runs are kept
+    sequence = models.PositiveBigIntegerField(default=0)
+    # Taken by a worker until then
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'modifica in coda'
+        verbose_name_plural = 'modifiche in coda'
+        indexes = [
+            models.Index(fields=['queued'], name='blog_postchange_queued'),
+        ]
+
+
+class PostAutosave(models.Model):
+    """
+    Autosaved changes of a published or scheduled post, kept out of the
+    post until an editor saves it. Drafts are autosaved in place.
+    """
+    post = models.OneToOneField(Post, primary_key=True, on_delete=models.CASCADE, related_name='autosave')
+    # Version of the post the changes apply to: stale once the post is saved
+    version = models.PositiveIntegerField("versione")
+    # Only the fields that differ from the post
+    fields = models.JSONField("campi", default=dict)
+    # Tag names, or none if the tags did not change
+    tags = models.JSONField("tag", null=True)
+    saved = models.DateTimeField("data", default=now)
+
+    class Meta:
+        verbose_name = 'salvataggio automatico'
+        verbose_name_plural = 'salvataggi automatici'
@@ -0,0 +1,161 @@
+"""
+Paginators that avoid an exact ``COUNT(*)`` on every listing request.
+
+The way the total number of objects is obtained is chosen by ``count_mode``:
+
+``exact``
+    a ``COUNT(*)`` query on every request (Django's default);
+``cached``
+    the exact count is cached per listing and invalidated when posts
+    are published, modified or deleted;
+``estimated``
+    the count is estimated from the database statistics, on backends
+    that expose them (PostgreSQL); elsewhere it behaves like ``none``;
+``none``
+    no count at all: pages only know whether a next page exists, and the
+    last page is not found.
+
+Without an exact count the page reads one object more than it shows,
+to know if there is a next page.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from . cache import get_listings_version, get_or_compute
+
+
+EXACT = 'exact'
+CACHED = 'cached'
+ESTIMATED = 'estimated'
+NONE = 'none'
+
+COUNT_MODES = (EXACT, CACHED, ESTIMATED, NONE)
+
+try:
+    COUNT_CACHE_TIMEOUT = settings.DJANGO_BLOG_COUNT_CACHE_TIMEOUT
+except AttributeError:
+    COUNT_CACHE_TIMEOUT = 300
+
+
+def get_count_mode(listing) -> str:
+    """
+    Return the count mode configured for a listing, by the
+    ``DJANGO_BLOG_PAGINATE_COUNT`` setting: either a mode for all the
+    listings or a dictionary mapping URL names to modes.
+    """
+    try:
+        mode = settings.DJANGO_BLOG_PAGINATE_COUNT
+    except AttributeError:
+        return EXACT
+    if isinstance(mode, dict):
+        mode = mode.get(listing, EXACT)
+    if mode not in COUNT_MODES:
+        raise ValueError(f"Invalid DJANGO_BLOG_PAGINATE_COUNT: {mode}")
+    return mode
+
+
+def estimate_count(queryset) -> int | None:
+    """Estimate the rows of a queryset from the planner statistics, if available"""
+    if not hasattr(queryset, 'query'):
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class LookAheadPage(Page):
+    """A page that knows whether there is a next page without a total count"""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class BlogPaginator(Paginator):
+    def __init__(self, object_list, per_page, count_mode=EXACT, cache_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count_mode not in COUNT_MODES:
+            raise ValueError(f"Invalid count mode: {count_mode}")
+        self.count_mode = count_mode
+        self.cache_key = cache_key
+
+    @property
+    def exact_count(self) -> bool:
+        return self.count_mode in (EXACT, CACHED)
+
+    @cached_property
+    def count(self) -> int | None:
+        if self.count_mode == EXACT:
+            return super().count
+        if self.count_mode == ESTIMATED:
+            return estimate_count(self.object_list)
+        if self.count_mode == NONE:
+            return None
+
+        return get_or_compute(
+            f"django_blog:count:{self.cache_key}",
+            lambda: super(BlogPaginator, self).count,
+            COUNT_CACHE_TIMEOUT,
+            version=get_listings_version(),
+            name=f"count:{self.cache_key}",
+        )
+
+    @cached_property
+    def num_pages(self) -> int | None:
+        # Unknown without a count: the last page (``?page=last``) is not found
+        if self.count is None:
+            return None
+        return super().num_pages
+
+    @property
+    def page_range(self) -> range:
+        if self.num_pages is None:
+            return range(1, 1)
+        return super().page_range
+
+    def validate_number(self, number):
+        if self.exact_count:
+            return super().validate_number(number)
+        if number is None:
+            raise PageNotAnInteger("The number of pages is unknown")
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if self.exact_count:
+            return super().page(number)
+
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        # Read one more object to know if there is a next page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage("That page contains no results")
+        return LookAheadPage(
+            object_list[:self.per_page],
+            number,
+            self,
+            has_next=len(object_list) > self.per_page
+        )
@@ -0,0 +1,340 @@
+"""
+On-demand profiling of the blog views.
+
+Add ``django_blog.profiling.ProfilingMiddleware`` to ``MIDDLEWARE``, after
+the authentication middleware. A request to a view of the blog is
+profiled when:
+
+* it is made by a staff user and carries the user's signed token in the
+  ``_profile`` query parameter or in the ``X-Blog-Profile`` header (the
+  token is shown in the list of reports);
+* or it is sampled, with probability ``DJANGO_BLOG_PROFILE_SAMPLE_RATE``.
+
+The report contains the Python call profile, the SQL queries with their
+timings and the render time of every template. It is stored in the blog
+cache, or as JSON files in ``DJANGO_BLOG_PROFILE_DIR`` when set, and
+listed to staff users by ``ProfileListView``. Streamed responses, such as
+the feeds, are profiled until their last chunk.
+
+Requests not selected only pay for two dictionary lookups (and a random
+number when sampling is enabled).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.core import signing
+from django.http import Http404
+from django.template.base import Template
+from django.urls import Resolver404, resolve
+from django.utils.timezone import now
+from django.views.generic import TemplateView
+
+from . cache import get_cache
+from . querywrappers import install_execute_wrapper, uninstall_execute_wrapper
+
+
+try:
+    SAMPLE_RATE = settings.DJANGO_BLOG_PROFILE_SAMPLE_RATE
+except AttributeError:
+    SAMPLE_RATE = 0
+
+try:
+    PROFILE_DIR = settings.DJANGO_BLOG_PROFILE_DIR
+except AttributeError:
+    PROFILE_DIR = None
+
+QUERY_PARAMETER = '_profile'
+HEADER = 'X-Blog-Profile'
+TOKEN_SALT = 'django_blog.profiling'
+TOKEN_MAX_AGE = 60 * 60 * 24
+
+# Reports kept, the oldest are dropped
+MAX_REPORTS = 50
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+REPORTS_KEY = 'django_blog:profiles'
+# Lines of the call profile in the report
+PROFILE_LINES = 60
+
+_session = ContextVar('django_blog_profiling_session', default=None)
+
+
+def make_token(user) -> str:
+    """Signed token that enables profiling for the requests of a staff user"""
+    return signing.dumps(user.pk, salt=TOKEN_SALT)
+
+
+def has_valid_token(request) -> bool:
+    token = request.GET.get(QUERY_PARAMETER) or request.headers.get(HEADER)
+    if not token:
+        return False
+    try:
+        pk = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    user = request.user
+    return user.is_authenticated and user.is_staff and user.pk == pk
+
+
+def is_blog_view(request) -> bool:
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return 'blog' in match.app_names
+
+
+_template_render = None
+_install_lock = threading.Lock()
+
+
+def install_template_timing():
+    """
+    Time the rendering of templates, for the profiled requests only.
+    Installed the first time a request is profiled.
+    """
+    global _template_render
+    with _install_lock:
+        if _template_render is not None:
+            return
+        _template_render = original = Template.render
+
+        def render(self, context):
+            session = _session.get()
+            if session is None:
+                return original(self, context)
+            return session.time_template(original, self, context)
+
+        Template.render = render
+
+
+class ProfilingSession:
+    """Collect the profile, the queries and the templates of a request"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:16]
+        self.profiler = cProfile.Profile()
+        self.queries = []
+        self.templates = []
+        self.depth = 0
+        self.elapsed = 0
+        self.connections = []
+        self.token = None
+
+    def resume(self):
+        # Raises ValueError, with nothing installed, when another profiler
+        # is active: on Python 3.12+, in any thread of the process
+        self.profiler.enable()
+        self.start = time.perf_counter()
+        self.token = _session.set(self)
+        self.connections = install_execute_wrapper(self.execute)
+
+    def pause(self):
+        self.profiler.disable()
+        self.elapsed += time.perf_counter() - self.start
+        uninstall_execute_wrapper(self.execute, self.connections)
+        _session.reset(self.token)
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params)[:200],
+                'many': many,
+                'time': time.perf_counter() - start,
+                'alias': context['connection'].alias,
+            })
+
+    def time_template(self, render, template, context):
+        entry = {
+            'name': template.origin.template_name or template.origin.name,
+            'depth': self.depth,
+        }
+        self.templates.append(entry)
+        start = time.perf_counter()
+        self.depth += 1
+        try:
+            return render(template, context)
+        finally:
+            self.depth -= 1
+            entry['time'] = time.perf_counter() - start
+
+    def get_report(self, request, response) -> dict:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+        user = getattr(request, 'user', None)
+        return {
+            'id': self.id,
+            'created': now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': request.resolver_match.view_name if request.resolver_match else None,
+            'user': user.get_username() if user and user.is_authenticated else None,
+            'status': response.status_code,
+            'time': self.elapsed,
+            'sql_time': sum(query['time'] for query in self.queries),
+            'queries': self.queries,
+            'templates': self.templates,
+            'profile': stream.getvalue(),
+        }
+
+
+class CacheReportStorage:
+    def save(self, report):
+        cache = get_cache()
+        cache.set(f"{REPORTS_KEY}:{report['id']}", report, REPORT_CACHE_TIMEOUT)
+        ids = [report['id']] + cache.get(REPORTS_KEY, [])
+        cache.set(REPORTS_KEY, ids[:MAX_REPORTS], REPORT_CACHE_TIMEOUT)
+
+    def list(self) -> list:
+        cache = get_cache()
+        ids = cache.get(REPORTS_KEY, [])
+        reports = cache.get_many([f"{REPORTS_KEY}:{pk}" for pk in ids])
+        return [reports[key] for key in (f"{REPORTS_KEY}:{pk}" for pk in ids) if key in reports]
+
+    def get(self, pk) -> dict | None:
+        return get_cache().get(f"{REPORTS_KEY}:{pk}")
+
+
+class FileReportStorage:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, pk) -> str:
+        return os.path.join(self.directory, f"{pk}.json")
+
+    def files(self) -> list:
+        """Report files, the latest first"""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except FileNotFoundError:
+            return []
+        paths = [os.path.join(self.directory, name) for name in names]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def save(self, report):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(report['id']), 'w') as f:
+            json.dump(report, f)
+        for path in self.files()[MAX_REPORTS:]:
+            os.remove(path)
+
+    def read(self, path) -> dict | None:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> list:
+        return [report for report in map(self.read, self.files()) if report is not None]
+
+    def get(self, pk) -> dict | None:
+        if not pk.isalnum():
+            return None
+        return self.read(self.path(pk))
+
+
+def get_storage():
+    if PROFILE_DIR:
+        return FileReportStorage(PROFILE_DIR)
+    return CacheReportStorage()
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request) -> bool:
+        flagged = QUERY_PARAMETER in request.GET or HEADER in request.headers
+        sampled = not flagged and SAMPLE_RATE and random.random() < SAMPLE_RATE
+        if not (flagged or sampled):
+            return False
+        if flagged and not has_valid_token(request):
+            return False
+        return is_blog_view(request)
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        install_template_timing()
+        session = ProfilingSession()
+        try:
+            session.resume()
+        except ValueError:
+            # Another request is being profiled: serve this one unprofiled
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            session.pause()
+
+        response[f'{HEADER}-Id'] = session.id
+        if response.streaming:
+            response.streaming_content = self.profile_stream(
+                session, request, response, response.streaming_content
+            )
+        else:
+            get_storage().save(session.get_report(request, response))
+        return response
+
+    def profile_stream(self, session, request, response, content):
+        iterator = iter(content)
+        while True:
+            try:
+                session.resume()
+            except ValueError:
+                # Another request is being profiled: this chunk is not
+                chunk = next(iterator, None)
+            else:
+                try:
+                    chunk = next(iterator, None)
+                finally:
+                    session.pause()
+            if chunk is None:
+                break
+            yield chunk
+        get_storage().save(session.get_report(request, response))
+
+
+class StaffRequiredMixin(UserPassesTestMixin):
+    def test_func(self) -> bool:
+        return self.request.user.is_staff
+
+
+class ProfileListView(StaffRequiredMixin, TemplateView):
+    template_name = "blog/profile_list.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['reports'] = get_storage().list()
+        context['token'] = make_token(self.request.user)
+        context['query_parameter'] = QUERY_PARAMETER
+        context['header'] = HEADER
+        return context
+
+
+class ProfileDetailView(StaffRequiredMixin, TemplateView):
+    template_name = "blog/profile_detail.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        report = get_storage().get(self.kwargs['pk'])
+        if report is None:
+            raise Http404("Report non trovato")
+        context['report'] = report
+        return context
@@ -0,0 +1,236 @@
+"""
+Public views of the blog: listings and post detail.
+
+They do not depend on the editing stack (forms, crispy forms, TinyMCE), so
+that read-only deployments can route them without importing it.
+"""
+from typing import Any
+from django.db.models import F
+from django.db.models.query import QuerySet
+from django.views.generic import ListView, DetailView
+from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from . models import AuthorStats, Post, Tag
+from . paginators import BlogPaginator, get_count_mode
+from . import tagindex
+from . cache import FRAGMENT_CACHE_TIMEOUT, get_cache, get_cache_alias, get_listings_version, get_or_compute, listing_key
+
+
+class FragmentCacheMixin:
+    """
+    Pass to the template what is needed to cache the public fragments
+    of the page, shared between anonymous and authenticated users
+    """
+
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['fragment_cache'] = get_cache_alias()
+        context['fragment_timeout'] = FRAGMENT_CACHE_TIMEOUT
+        context['listings_version'] = get_listings_version()
+        return context
+
+
+class BlogPaginationMixin:
+    """
+    Paginate listings with ``BlogPaginator``: the way the total count is
+    obtained is configured per listing with ``DJANGO_BLOG_PAGINATE_COUNT``.
+    """
+    paginator_class = BlogPaginator
+    # URL name of the listing, used for the configuration
+    listing_name = None
+
+    def get_count_cache_key(self) -> str:
+        return self.listing_name
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return self.paginator_class(
+            queryset,
+            per_page,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            count_mode=get_count_mode(self.listing_name),
+            cache_key=self.get_count_cache_key(),
+            **kwargs
+        )
+
+
+def get_sidebar_tags() -> list:
+    """Tags used in at least one published post"""
+    return get_or_compute(
+        'django_blog:sidebar_tags',
+        lambda: list(Tag.objects.filter(post__in=Post.published_objects.all()).distinct().order_by('name')),
+        FRAGMENT_CACHE_TIMEOUT,
+        version=get_listings_version(),
+        name='sidebar_tags',
+    )
+
+
+class PostListView(FragmentCacheMixin, BlogPaginationMixin, ListView):
+    model = Post
+    template_name = "blog/post_list.html"
+    context_object_name = "posts"
+    listing_name = "list"
+    paginate_by = 4
+    try:
+        paginate_by = settings.DJANGO_BLOG_PAGINATE_BY
+    except AttributeError:
+        pass
+
+    def get_count_cache_key(self) -> str:
+        # Authenticated users see drafts and scheduled posts too
+        return f"list:{self.request.user.is_authenticated}"
+
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['title'] = "Blog"
+        # Evaluated by the template only when the sidebar fragment is not cached
+        context['tags'] = SimpleLazyObject(get_sidebar_tags)
+        return context
+
+    def get_queryset(self) -> QuerySet[Any]:
+        # Solo gli utenti autenticati possono vedere post
+        # non pubblicati
+        if self.request.user.is_authenticated:
+            queryset = super().get_queryset()
+        else:
+            queryset = self.model.published_objects.all()
+
+        # Posts are orderd by descendig publication date with drafts first
+        return queryset.order_by(F('pub_date').desc(nulls_first=True))
+
+
+class PostDetailView(FragmentCacheMixin, DetailView):
+    model = Post
+    template_name = "blog/post_detail.html"
+
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['title'] = self.object.title
+        # Permissions for the action bar, rendered outside the cached content
+        user = self.request.user
+        context['can_modify'] = user.is_authenticated and self.object.can_be_modified_by(user)
+        tag = self.get_navigation_tag() if self.object.is_published() else None
+        # Only an existing tag is passed on to the adjacent posts
+        context['navigation_tag'] = tag.slug if tag is not None else ''
+        context['previous_post'], context['next_post'] = self.get_adjacent_posts(tag)
+        return context
+
+    def get_navigation_tag(self) -> Tag | None:
+        """Return the tag of the ``tag`` parameter, if there is one with that slug"""
+        slug = self.request.GET.get('tag', '')
+        if not slug or len(slug) > Tag._meta.get_field('slug').max_length:
+            return None
+        return Tag.objects.filter(slug=slug).first()
+
+    def get_adjacent_posts(self, tag) -> tuple:
+        """
+        Return the previous and the next published post, globally or
+        among the posts of ``tag``.
+        They are cached until posts are published, modified or deleted.
+        """
+        if not self.object.is_published():
+            return None, None
+
+        cache = get_cache()
+        key = listing_key('adjacent', self.object.pk, tag.pk if tag is not None else '')
+        adjacent = cache.get(key)
+        if adjacent is None:
+            adjacent = tuple(self.find_adjacent_post(newer, tag) for newer in (False, True))
+            cache.set(key, adjacent, FRAGMENT_CACHE_TIMEOUT)
+        return adjacent
+
+    def find_adjacent_post(self, newer, tag) -> dict | None:
+        if tag is not None and tagindex.is_enabled():
+            pk = tagindex.get_adjacent_post_id(tag.pk, self.object, newer)
+            post = Post.objects.only('pk', 'title').filter(pk=pk).first() if pk else None
+        else:
+            post = self.object.get_adjacent_published(newer, tag)
+        if post is None:
+            return None
+        return {'url': post.get_absolute_url(), 'title': post.title}
+
+    def get_queryset(self) -> QuerySet[Any]:
+        # Solo gli utenti autenticati possono vedere i post
+        # non pubblicati
+        if self.request.user.is_authenticated:
+            queryset = super().get_queryset()
+        else:
+            queryset = self.model.published_objects.all()
+        return queryset.select_related('author')
+
+
+class PostListByTagView(FragmentCacheMixin, BlogPaginationMixin, ListView):
+    model = Post
+    template_name = "blog/post_list_by_tag.html"
+    context_object_name = "posts"
+    listing_name = "list_by_tag"
+    paginate_by = 4
+    try:
+        paginate_by = settings.DJANGO_BLOG_PAGINATE_BY
+    except AttributeError:
+        pass
+
+    def get_tag(self) -> Tag:
+        """Return the tag, looked up by primary key or by slug"""
+        if not hasattr(self, 'tag'):
+            if 'slug' in self.kwargs:
+                self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
+            else:
+                self.tag = get_object_or_404(Tag, pk=self.kwargs['pk'])
+        return self.tag
+
+    def get_count_cache_key(self) -> str:
+        return f"list_by_tag:{self.get_tag().pk}"
+
+    def get_queryset(self, **kwargs):
+        if tagindex.is_enabled():
+            # Read the ordered posts of the tag from the materialized index
+            return tagindex.TagPostList(self.get_tag().pk)
+        return self.model.published_objects.filter(tags__pk=self.get_tag().pk).order_by('-pub_date')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tag'] = self.get_tag()
+        return context
+
+
+class PostListByAuthorView(FragmentCacheMixin, BlogPaginationMixin, ListView):
+    model = Post
+    template_name = "blog/post_list_by_author.html"
+    context_object_name = "posts"
+    listing_name = "list_by_author"
+    paginate_by = 4
+    try:
+        paginate_by = settings.DJANGO_BLOG_PAGINATE_BY
+    except AttributeError:
+        pass
+
+    def get_author(self):
+        if not hasattr(self, 'author'):
+            self.author = get_object_or_404(get_user_model(), pk=self.kwargs['pk'])
+        return self.author
+
+    def get_count_cache_key(self) -> str:
+        return f"list_by_author:{self.get_author().pk}"
+
+    def get_queryset(self) -> QuerySet[Any]:
+        # Served by the (author, pub_date) index
+        return self.model.published_objects.filter(author=self.get_author()).order_by('-pub_date')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['author'] = self.get_author()
+        return context
+
+
+class AuthorListView(FragmentCacheMixin, ListView):
+    """Authors with published posts, the most recently active first"""
+    template_name = "blog/author_list.html"
+    context_object_name = "authors"
+    paginate_by = 50
+
+    def get_queryset(self) -> QuerySet[Any]:
+        # Counts are read from the denormalized table, never aggregated here
+        return AuthorStats.objects.select_related('author').order_by('-last_pub_date', 'author')
@@ -0,0 +1,24 @@
+"""
+Database execute wrappers installed for the length of a request.
+
+Django installs execute wrappers with a context manager, around a block
+of code; the profiler and the slow query log need to install theirs when
+a view starts and to remove them when the response (or a chunk of a
+streamed response) is done. The wrappers are added to the connections of
+the current thread and removed from the same connections.
+"""
+from django.db import connections
+
+
+def install_execute_wrapper(wrapper) -> list:
+    """Add ``wrapper`` to every connection. Return the connections."""
+    installed = list(connections.all())
+    for connection in installed:
+        connection.execute_wrappers.append(wrapper)
+    return installed
+
+
+def uninstall_execute_wrapper(wrapper, installed) -> None:
+    """Remove ``wrapper`` from the connections returned by ``install_execute_wrapper``"""
+    for connection in installed:
+        connection.execute_wrappers.remove(wrapper)
@@ -0,0 +1,292 @@
+"""
+Revision history of the posts.
+
+When ``DJANGO_BLOG_REVISIONS`` is enabled, a revision with the title,
+subtitle, body, tags and publication date of a post is recorded every
+time ``posts_changed`` is sent for it and its state changed, whichever
+view, command or admin action saved it. Revisions are recorded as
+deferred work (see ``tasks``): when queued, the changes of a post made
+before a worker takes it make one revision. The posts of a batch of changes
+are recorded with a few queries and one insert; revisions whose number
+was taken by a concurrent save are numbered again after it.
+
+Revisions are compressed with zlib. A snapshot with the whole state is
+stored every ``SNAPSHOT_INTERVAL`` revisions, or sooner when the
+difference grows past half of the snapshot; the other revisions store the
+difference from their snapshot: the changed fields and, for the body, the
+ranges copied from the body of the snapshot and the inserted text. Any
+revision is rebuilt from two rows with one pass over the body, however
+long the history.
+
+Revisions older than ``DJANGO_BLOG_REVISION_DAYS`` days are deleted by
+the ``prune_revisions`` command, except the latest
+``DJANGO_BLOG_REVISION_KEEP`` of every post and the snapshots they need.
+"""
+import difflib
+import hashlib
+import json
+import re
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Length
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from . models import Post, PostRevision, Tag
+from . signals import batch_changes, posts_changed_deferred
+
+
+try:
+    KEEP = settings.DJANGO_BLOG_REVISION_KEEP
+except AttributeError:
+    KEEP = 10
+
+try:
+    RETENTION_DAYS = settings.DJANGO_BLOG_REVISION_DAYS
+except AttributeError:
+    RETENTION_DAYS = 90
+
+FIELDS = ('title', 'subtitle', 'body', 'pub_date')
+SNAPSHOT_INTERVAL = 20
+BATCH_SIZE = 500
+
+# The body is compared in pieces ending with a tag or a line
+_pieces = re.compile(r'(?<=[>\n])')
+
+
+def is_enabled() -> bool:
+    try:
+        return settings.DJANGO_BLOG_REVISIONS
+    except AttributeError:
+        return False
+
+
+def split_body(body) -> list:
+    return _pieces.split(body)
+
+
+def diff_body(base, body) -> list:
+    """
+    Difference of ``body`` from ``base``: [start, end] ranges of pieces
+    copied from ``base`` and inserted strings
+    """
+    base_pieces = split_body(base)
+    pieces = split_body(body)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_pieces, pieces).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j1 < j2:
+            ops.append(''.join(pieces[j1:j2]))
+    return ops
+
+
+def patch_body(base, ops) -> str:
+    base_pieces = split_body(base)
+    return ''.join(
+        ''.join(base_pieces[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in ops
+    )
+
+
+def make_delta(snapshot, state) -> dict:
+    delta = {name: value for name, value in state.items()
+             if name != 'body' and snapshot.get(name) != value}
+    if state['body'] != snapshot['body']:
+        delta['body'] = diff_body(snapshot['body'], state['body'])
+    return delta
+
+
+def apply_delta(snapshot, delta) -> dict:
+    state = {**snapshot, **delta}
+    if 'body' in delta:
+        state['body'] = patch_body(snapshot['body'], delta['body'])
+    return state
+
+
+def encode(data) -> bytes:
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode(), 9)
+
+
+def decode(data) -> dict:
+    # memoryview on some backends
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def get_digest(state) -> str:
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode(), usedforsecurity=False).hexdigest()
+
+
+def get_states(post_ids) -> dict:
+    """Current state of the posts, by id"""
+    states = {}
+    for pk, *values in Post.objects.filter(pk__in=post_ids).values_list('pk', *FIELDS):
+        state = dict(zip(FIELDS, values))
+        state['pub_date'] = state['pub_date'] and state['pub_date'].isoformat()
+        state['tags'] = []
+        states[pk] = state
+    tags = (Post.tags.through.objects
+            .filter(post_id__in=states)
+            .order_by('tag__name')
+            .values_list('post_id', 'tag__name'))
+    for pk, name in tags:
+        states[pk]['tags'].append(name)
+    return states
+
+
+def get_state(revision) -> dict:
+    """State of the post at a revision"""
+    data = decode(revision.data)
+    if revision.is_snapshot():
+        return data
+    return apply_delta(decode(revision.snapshot.data), data)
+
+
+def prepare_revisions(post_ids) -> list:
+    """
+    The revisions to record for the posts whose state changed, numbered
+    after their latest one. The revisions of deleted posts are deleted.
+    """
+    states = get_states(post_ids)
+    deleted = set(post_ids) - states.keys()
+    if deleted:
+        PostRevision.objects.filter(post_id__in=deleted).delete()
+
+    latest_ids = (Post.objects
+                  .filter(pk__in=states)
+                  .annotate(latest=Subquery(PostRevision.objects
+                                            .filter(post=OuterRef('pk'))
+                                            .order_by('-number')
+                                            .values('pk')[:1]))
+                  .values('latest'))
+    latest = {revision.post_id: revision
+              for revision in PostRevision.objects.filter(pk__in=latest_ids).select_related('snapshot')}
+
+    revisions = []
+    for pk, state in states.items():
+        digest = get_digest(state)
+        previous = latest.get(pk)
+        if previous is not None and previous.digest == digest:
+            continue
+        revision = PostRevision(post_id=pk, digest=digest,
+                                number=previous.number + 1 if previous else 1)
+        snapshot = None
+        if previous is not None:
+            snapshot = previous if previous.is_snapshot() else previous.snapshot
+        if snapshot is not None and revision.number - snapshot.number < SNAPSHOT_INTERVAL:
+            data = encode(make_delta(decode(snapshot.data), state))
+            if len(data) * 2 <= len(snapshot.data):
+                revision.snapshot = snapshot
+                revision.data = data
+        if revision.snapshot is None:
+            revision.data = encode(state)
+        revisions.append(revision)
+    return revisions
+
+
+def record(post_ids, batch_size=BATCH_SIZE) -> int:
+    """Record a revision of the posts whose state changed. Return how many."""
+    post_ids = sorted(post_ids)
+    created = 0
+    for start in range(0, len(post_ids), batch_size):
+        pending = post_ids[start:start + batch_size]
+        while pending:
+            revisions = prepare_revisions(pending)
+            if not revisions:
+                break
+            PostRevision.objects.bulk_create(revisions, ignore_conflicts=True)
+            # A concurrent save may have recorded the same number: the
+            # revisions not inserted are prepared again, after its one
+            inserted = set(PostRevision.objects
+                           .filter(post_id__in=[revision.post_id for revision in revisions],
+                                   number__in={revision.number for revision in revisions})
+                           .values_list('post_id', 'number', 'digest'))
+            pending = [revision.post_id for revision in revisions
+                       if (revision.post_id, revision.number, revision.digest) not in inserted]
+            created += len(revisions) - len(pending)
+    return created
+
+
+@receiver(posts_changed_deferred)
+def posts_changed_record_revisions(sender, post_ids, **kwargs):
+    if is_enabled():
+        record(post_ids)
+
+
+def restore(post, revision) -> Post:
+    """
+    Bring title, subtitle, body and tags of the post back to a revision.
+    The publication date is not changed. Recorded as a new revision.
+    """
+    state = get_state(revision)
+    with batch_changes(), transaction.atomic():
+        post.title = state['title']
+        post.subtitle = state['subtitle']
+        post.body = state['body']
+        # Pending autosaves of the editors conflict
+        post.version += 1
+        post.save()
+        post.tags.set(Tag.objects.get_or_create_many(state['tags']))
+    return post
+
+
+def get_prunable(keep=KEEP, days=RETENTION_DAYS):
+    """Revisions older than ``days``, except the latest ``keep`` of each post"""
+    last_number = (PostRevision.objects
+                   .filter(post=OuterRef('post'))
+                   .values('post')
+                   .annotate(last=Max('number'))
+                   .values('last'))
+    return (PostRevision.objects
+            .filter(created__lt=now() - timedelta(days=days))
+            .annotate(last_number=Subquery(last_number))
+            .filter(number__lte=F('last_number') - keep))
+
+
+def prune(keep=KEEP, days=RETENTION_DAYS, batch_size=BATCH_SIZE, dry_run=False) -> int:
+    """
+    Delete the revisions past the retention, in batches. Snapshots still
+    needed by kept revisions are kept. Return the number of revisions
+    deleted (to delete, on a dry run).
+    """
+    deleted = 0
+    last = 0
+    while True:
+        batch = list(get_prunable(keep, days)
+                     .filter(pk__gt=last)
+                     .order_by('pk')
+                     .values_list('pk', 'snapshot_id')[:batch_size])
+        if not batch:
+            break
+        last = batch[-1][0]
+        snapshot_ids = [pk for pk, snapshot_id in batch if snapshot_id is None]
+        needed = set(PostRevision.objects
+                     .filter(snapshot_id__in=snapshot_ids)
+                     .exclude(pk__in=get_prunable(keep, days).values('pk'))
+                     .values_list('snapshot_id', flat=True))
+        ids = [pk for pk, snapshot_id in batch if pk not in needed]
+        if dry_run:
+            deleted += len(ids)
+            continue
+        with transaction.atomic():
+            # The revisions of a deleted snapshot may come in a later
+            # batch: they are deleted with it
+            count, _ = (PostRevision.objects.filter(pk__in=ids) |
+                        PostRevision.objects.filter(snapshot_id__in=[pk for pk in snapshot_ids if pk not in needed])
+                        ).delete()
+        deleted += count
+    return deleted
+
+
+def get_sizes() -> dict:
+    """Bytes used by the revisions and by the posts"""
+    return {
+        'revisions': PostRevision.objects.aggregate(size=Sum(Length('data')))['size'] or 0,
+        'posts': Post.objects.aggregate(
+            size=Sum(Length('title') + Coalesce(Length('subtitle'), 0) + Length('body'))
+        )['size'] or 0,
+    }
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+
+from . models import Post
+
+
+# Sent every time one or more posts are created, modified or deleted.
+# Receivers get the ids of the changed posts as ``post_ids``: it is the
+# single hook used to invalidate caches and derived data.
+posts_changed = Signal()
+
+# Sent for the work on changed posts that can wait for the response: by
+# ``tasks``, right after ``posts_changed`` or later from the queue of the
+# changes (then with ``queued=True``). Receivers must be idempotent, as a
+# post may be sent again after a failure, and must read the current state
+# of the posts, as the changes of a post are merged.
+posts_changed_deferred = Signal()
+
+_pending_changes = ContextVar('django_blog_pending_changes', default=None)
+
+
+@contextmanager
+def batch_changes():
+    """
+    Collect the changes made inside the block and send ``posts_changed``
+    only once, when the block exits without errors.
+    Nested blocks are merged into the outermost one.
+
+    Open it outside ``transaction.atomic()``, so that the signal is sent
+    after the commit: caches invalidated before it would be refilled by
+    other connections with the data before the change.
+    """
+    if _pending_changes.get() is not None:
+        yield
+        return
+
+    post_ids = set()
+    token = _pending_changes.set(post_ids)
+    try:
+        yield
+    finally:
+        _pending_changes.reset(token)
+    if post_ids:
+        posts_changed.send(sender=Post, post_ids=sorted(post_ids))
+
+
+def in_batch() -> bool:
+    return _pending_changes.get() is not None
+
+
+def notify_posts_changed(post_ids):
+    """Send ``posts_changed``, or add the posts to the current batch"""
+    pending = _pending_changes.get()
+    if pending is not None:
+        pending.update(post_ids)
+    elif post_ids:
+        posts_changed.send(sender=Post, post_ids=sorted(post_ids))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_saved_or_deleted(sender, instance, **kwargs):
+    notify_posts_changed([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Clearing a tag affects every post that had it: remember them
+        # before the relations are removed
+        instance._cleared_post_ids = list(instance.post_set.values_list('pk', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        notify_posts_changed([instance.pk])
+    elif action == 'post_clear':
+        notify_posts_changed(instance.__dict__.pop('_cleared_post_ids', []))
+    else:
+        notify_posts_changed(pk_set)
@@ -0,0 +1,44 @@
+from django.contrib.sitemaps import Sitemap
+from django.urls import reverse
+
+from . models import Post, Tag
+
+
+class PostSitemap(Sitemap):
+    changefreq = "weekly"
+
+    def items(self):
+        return Post.published_objects.order_by('-pub_date').only('pk', 'update_date')
+
+    def lastmod(self, item):
+        return item.update_date
+
+
+class TagSitemap(Sitemap):
+    changefreq = "daily"
+
+    def items(self):
+        # Only tags used in at least one published post
+        return (Tag.objects
+                .filter(post__in=Post.published_objects.all())
+                .distinct()
+                .order_by('name')
+                .only('pk', 'slug'))
+
+
+class ListSitemap(Sitemap):
+    changefreq = "daily"
+    priority = 1.0
+
+    def items(self):
+        return ['blog:list']
+
+    def location(self, item):
+        return reverse(item)
+
+
+SITEMAPS = {
+    'list': ListSitemap,
+    'posts': PostSitemap,
+    'tags': TagSitemap,
+}
@@ -0,0 +1,180 @@
+"""
+Log of the slow queries run by the blog views.
+
+Add ``django_blog.slowqueries.SlowQueryMiddleware`` to ``MIDDLEWARE``:
+while a view of the blog runs (streamed content included), every query
+is timed by a database execute wrapper. Queries slower than
+``DJANGO_BLOG_SLOW_QUERY_THRESHOLD`` milliseconds are logged to the
+``django_blog.slowqueries`` logger, with their plan (``EXPLAIN``, or
+``EXPLAIN QUERY PLAN`` on SQLite), and grouped in the blog cache by view
+and shape of the query: the SQL with literals and lists of placeholders
+collapsed. The groups are printed by the ``slow_queries`` command.
+"""
+import hashlib
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from . cache import get_cache
+from . querywrappers import install_execute_wrapper, uninstall_execute_wrapper
+
+
+try:
+    THRESHOLD = settings.DJANGO_BLOG_SLOW_QUERY_THRESHOLD
+except AttributeError:
+    THRESHOLD = 100
+
+GROUPS_KEY = 'django_blog:slow_queries'
+GROUP_TIMEOUT = 60 * 60 * 24 * 7
+MAX_GROUPS = 200
+
+logger = logging.getLogger('django_blog.slowqueries')
+
+_whitespace = re.compile(r'\s+')
+_placeholders = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_strings = re.compile(r"'(?:[^']|'')*'")
+_numbers = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def normalize_sql(sql) -> str:
+    """Shape of a query: the same for queries differing only in their values"""
+    sql = _whitespace.sub(' ', sql).strip()
+    sql = _placeholders.sub('(%s, ...)', sql)
+    sql = _strings.sub('?', sql)
+    return _numbers.sub('?', sql)
+
+
+def explain(connection, sql, params) -> str:
+    """Plan of a query, or an empty string if it cannot be explained"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        # In a savepoint, so that a failure does not break the transaction
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}", params)
+                rows = cursor.fetchall()
+    except DatabaseError:
+        return ''
+    if connection.vendor == 'sqlite':
+        # id, parent, notused, detail
+        return '\n'.join(str(row[-1]) for row in rows)
+    return '\n'.join(' '.join(map(str, row)) for row in rows)
+
+
+def record(view_name, sql, params, duration, connection):
+    """Add a slow query to the group of its shape, explaining it when needed"""
+    shape = normalize_sql(sql)
+    digest = hashlib.md5(f"{view_name}:{shape}".encode(), usedforsecurity=False).hexdigest()
+    key = f"{GROUPS_KEY}:{digest}"
+    cache = get_cache()
+    group = cache.get(key) or {
+        'view': view_name,
+        'sql': shape,
+        'count': 0,
+        'total': 0,
+        'max': 0,
+        'params': None,
+        'plan': '',
+    }
+    # The plan of the slowest occurrence is kept
+    if duration > group['max']:
+        group['max'] = duration
+        group['params'] = repr(params)[:500]
+        group['plan'] = explain(connection, sql, params)
+    group['count'] += 1
+    group['total'] += duration
+    cache.set(key, group, GROUP_TIMEOUT)
+
+    digests = cache.get(GROUPS_KEY, [])
+    if digest not in digests:
+        cache.set(GROUPS_KEY, [digest, *digests][:MAX_GROUPS], GROUP_TIMEOUT)
+
+    logger.warning(
+        "Slow query in %s (%.1f ms): %s\nParams: %r\n%s",
+        view_name, duration * 1000, shape, params, group['plan'],
+        extra={'view': view_name, 'duration': duration, 'sql': shape},
+    )
+
+
+def get_groups() -> list:
+    """Groups of slow queries, the ones taking more time first"""
+    cache = get_cache()
+    keys = [f"{GROUPS_KEY}:{digest}" for digest in cache.get(GROUPS_KEY, [])]
+    groups = list(cache.get_many(keys).values())
+    return sorted(groups, key=lambda group: group['total'], reverse=True)
+
+
+def reset():
+    cache = get_cache()
+    cache.delete_many([f"{GROUPS_KEY}:{digest}" for digest in cache.get(GROUPS_KEY, [])])
+    cache.delete(GROUPS_KEY)
+
+
+class QueryTimer:
+    """Execute wrapper timing the queries of a view"""
+
+    def __init__(self, view_name, threshold=None):
+        self.view_name = view_name
+        self.threshold = (THRESHOLD if threshold is None else threshold) / 1000
+        self.explaining = False
+        self.connections = []
+
+    def install(self):
+        self.connections = install_execute_wrapper(self)
+
+    def uninstall(self):
+        uninstall_execute_wrapper(self, self.connections)
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= self.threshold and not many:
+            self.explaining = True
+            try:
+                record(self.view_name, sql, params, duration, context['connection'])
+            finally:
+                self.explaining = False
+        return result
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if 'blog' in match.app_names:
+            request._slow_query_timer = QueryTimer(match.view_name)
+            request._slow_query_timer.install()
+
+    def __call__(self, request):
+        timer = None
+        try:
+            response = self.get_response(request)
+        finally:
+            timer = request.__dict__.pop('_slow_query_timer', None)
+            if timer is not None:
+                timer.uninstall()
+        if timer is not None and response.streaming:
+            response.streaming_content = self.time_stream(timer, response.streaming_content)
+        return response
+
+    def time_stream(self, timer, content):
+        iterator = iter(content)
+        while True:
+            timer.install()
+            try:
+                chunk = next(iterator, None)
+            finally:
+                timer.uninstall()
+            if chunk is None:
+                break
+            yield chunk
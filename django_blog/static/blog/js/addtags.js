@@ -28,6 +28,8 @@ document.addEventListener('DOMContentLoaded', function () {
     function displayTagCount() {
         //  Update tag count to the number of selected tags
         counter.innerHTML = selectedTags.length;
+        // Expose selected tags to other scripts (autosave)
+        document.querySelector('#post-form').dataset.tags = JSON.stringify(selectedTags);
     }
 
     function displayTagList() {
@@ -0,0 +1,121 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const form = document.querySelector('#post-form');
+    const status = document.querySelector('#autosave-status');
+    const config = JSON.parse(document.querySelector('#autosave-config').textContent);
+    const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+
+    let url = config.url;
+    let version = config.version;
+    let saving = false;
+    let stopped = false;
+
+    function currentState() {
+        const editor = window.tinymce && window.tinymce.get('id_body');
+        return {
+            fields: {
+                title: form.querySelector('[name=title]').value,
+                subtitle: form.querySelector('[name=subtitle]').value,
+                body: editor ? editor.getContent() : form.querySelector('[name=body]').value,
+            },
+            tags: form.dataset.tags ? JSON.parse(form.dataset.tags) : [],
+        };
+    }
+
+    // Content as last saved: only the differences are sent
+    let saved = currentState();
+
+    function changes(state) {
+        const fields = {};
+        for (const name in state.fields) {
+            if (state.fields[name] !== saved.fields[name]) {
+                fields[name] = state.fields[name];
+            }
+        }
+        const tagsChanged = JSON.stringify(state.tags) !== JSON.stringify(saved.tags);
+        return {fields: fields, tags: tagsChanged ? state.tags : null};
+    }
+
+    function showStatus(message) {
+        if (status) {
+            status.textContent = message;
+        }
+    }
+
+    async function send(target, body) {
+        const response = await fetch(target, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken},
+            body: JSON.stringify(body),
+        });
+        return {code: response.status, data: await response.json()};
+    }
+
+    async function createDraft(state) {
+        // A draft can be created only when title and body are filled in
+        if (!state.fields.title || !state.fields.body) {
+            return;
+        }
+        const author = form.querySelector('[name=author]');
+        const result = await send(config.create_url, {
+            fields: state.fields,
+            tags: state.tags,
+            author: author ? author.checked : false,
+        });
+        if (result.code === 201) {
+            url = result.data.url;
+            version = result.data.version;
+            saved = state;
+            // The form will save the draft instead of creating a new post
+            const hiddenInput = document.createElement('input');
+            hiddenInput.setAttribute('type', 'hidden');
+            hiddenInput.setAttribute('name', 'autosaved');
+            hiddenInput.value = result.data.pk;
+            form.append(hiddenInput);
+            showStatus('Bozza salvata automaticamente');
+        }
+    }
+
+    async function save() {
+        if (saving || stopped) {
+            return;
+        }
+        const state = currentState();
+        const diff = changes(state);
+        if (Object.keys(diff.fields).length === 0 && diff.tags === null) {
+            return;
+        }
+
+        saving = true;
+        try {
+            if (!url) {
+                await createDraft(state);
+                return;
+            }
+            const result = await send(url, {version: version, fields: diff.fields, tags: diff.tags});
+            if (result.code === 409) {
+                stopped = true;
+                showStatus('Il post è stato modificato da qualcun altro: salvataggio automatico sospeso');
+            } else if (result.code === 200) {
+                version = result.data.version;
+                // The form is saved over the autosaved version
+                const versionInput = form.querySelector('[name=version]');
+                if (versionInput) {
+                    versionInput.value = version;
+                }
+                // Deferred saves are sent again at the next interval
+                if (result.data.status !== 'deferred') {
+                    saved = state;
+                    showStatus('Modifiche salvate automaticamente');
+                }
+            }
+        } catch (error) {
+            showStatus('Salvataggio automatico non riuscito');
+        } finally {
+            saving = false;
+        }
+    }
+
+    setInterval(save, config.interval * 1000);
+    // Stop autosaving when the form is submitted
+    form.addEventListener('submit', () => { stopped = true; });
+});
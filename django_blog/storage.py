@@ -0,0 +1,50 @@
+"""
+Static files storage for the blog.
+
+``CompressedManifestStaticFilesStorage`` stores the files under names
+containing a hash of their content, like ``ManifestStaticFilesStorage``,
+so that they can be cached forever, and writes a gzip copy of the text
+files next to them (and a brotli copy, when the ``brotli`` package is
+installed), to be served by the web server without compressing them on
+every request.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    compressed_extensions = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.html')
+    # Smaller files are not worth a compressed copy
+    min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Only the final names, after all the passes of the manifest storage
+        for name in set(self.hashed_files.values()):
+            if name.endswith(self.compressed_extensions):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < self.min_size:
+            return
+        self.save_compressed(name + '.gz', gzip.compress(content, compresslevel=9, mtime=0), content)
+        if brotli is not None:
+            self.save_compressed(name + '.br', brotli.compress(content), content)
+
+    def save_compressed(self, name, compressed, content):
+        if len(compressed) >= len(content):
+            return
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(compressed))
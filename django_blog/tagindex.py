@@ -0,0 +1,120 @@
+"""
+Materialized per-tag lists of posts for the tag listings.
+
+``TagPostIndex`` keeps, for each tag, the posts with a publication date and
+the date itself. A tag page is then a range scan of the index on
+(tag, pub_date, post) followed by one primary key ``IN`` query, instead of
+joining the through table and sorting by a column of the posts table.
+
+The index is optional (``DJANGO_BLOG_TAG_INDEX = True``) and is updated
+incrementally every time posts change, as deferred work (see ``tasks``).
+Build it from scratch with the ``rebuild_tag_index`` management command.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from . models import Post, TagPostIndex
+from . signals import posts_changed_deferred
+
+
+BATCH_SIZE = 1000
+
+
+def is_enabled() -> bool:
+    try:
+        return settings.DJANGO_BLOG_TAG_INDEX
+    except AttributeError:
+        return False
+
+
+def _index_rows(relations):
+    return [
+        TagPostIndex(tag_id=tag_id, post_id=post_id, pub_date=pub_date)
+        for tag_id, post_id, pub_date in relations
+    ]
+
+
+def update_posts(post_ids):
+    """Bring the index up to date for the given posts"""
+    post_ids = list(post_ids)
+    relations = (Post.tags.through.objects
+                 .filter(post_id__in=post_ids, post__pub_date__isnull=False)
+                 .values_list('tag_id', 'post_id', 'post__pub_date'))
+    with transaction.atomic():
+        TagPostIndex.objects.filter(post_id__in=post_ids).delete()
+        TagPostIndex.objects.bulk_create(_index_rows(relations), batch_size=BATCH_SIZE)
+
+
+def rebuild(batch_size=BATCH_SIZE) -> int:
+    """Rebuild the whole index, return the number of rows"""
+    relations = (Post.tags.through.objects
+                 .filter(post__pub_date__isnull=False)
+                 .order_by('pk')
+                 .values_list('tag_id', 'post_id', 'post__pub_date'))
+    total = 0
+    with transaction.atomic():
+        TagPostIndex.objects.all().delete()
+        batch = []
+        for relation in relations.iterator(chunk_size=batch_size):
+            batch.append(relation)
+            if len(batch) == batch_size:
+                total += len(TagPostIndex.objects.bulk_create(_index_rows(batch)))
+                batch = []
+        total += len(TagPostIndex.objects.bulk_create(_index_rows(batch)))
+    return total
+
+
+def get_adjacent_post_id(tag_id, post, newer):
+    """
+    Return the id of the published post that immediately follows (``newer``)
+    or precedes ``post`` among the posts of a tag, seeking in the index
+    """
+    entries = TagPostIndex.objects.filter(tag_id=tag_id, pub_date__lte=now())
+    if newer:
+        entries = entries.filter(
+            Q(pub_date__gt=post.pub_date) | Q(pub_date=post.pub_date, post_id__gt=post.pk)
+        ).order_by('pub_date', 'post_id')
+    else:
+        entries = entries.filter(
+            Q(pub_date__lt=post.pub_date) | Q(pub_date=post.pub_date, post_id__lt=post.pk)
+        ).order_by('-pub_date', '-post_id')
+    return entries.values_list('post_id', flat=True).first()
+
+
+class TagPostList:
+    """
+    The published posts of a tag, most recent first, read from the index.
+    Supports ``count()`` and slicing, so it can be paginated.
+    """
+
+    def __init__(self, tag_id):
+        self.tag_id = tag_id
+        # Fix the current time, so that count and pages agree
+        self.now = now()
+
+    def get_entries(self):
+        return (TagPostIndex.objects
+                .filter(tag_id=self.tag_id, pub_date__lte=self.now)
+                .order_by('-pub_date', '-post_id'))
+
+    def count(self) -> int:
+        return self.get_entries().count()
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        post_ids = list(self.get_entries().values_list('post_id', flat=True)[index])
+        posts = Post.objects.in_bulk(post_ids)
+        return [posts[pk] for pk in post_ids if pk in posts]
+
+
+@receiver(posts_changed_deferred)
+def posts_changed_update_tag_index(sender, post_ids, **kwargs):
+    if is_enabled():
+        update_posts(post_ids)
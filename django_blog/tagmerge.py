@@ -0,0 +1,181 @@
+"""
+Bulk merge and rename of tags.
+
+A mapping pairs source tag names with target names. When the target tag
+exists, the posts of the source are moved to it and the source is
+deleted; otherwise the source is renamed. Chains (``a -> b``, ``b -> c``)
+are followed to the last target.
+
+Posts are moved with one ``INSERT ... SELECT`` and one ``DELETE`` per
+source tag, skipping the posts that already have the target, so that no
+pair is duplicated. Source tags are processed in batches, each in its own
+transaction, to keep locks short. Posts whose tags changed get a new
+update date and ``posts_changed`` is sent at the end, once per batch of
+them, so that the receivers never get more ids than a batch.
+"""
+import csv
+
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from . models import Post, Tag, clean_tag_name, normalize_tag_name
+from . signals import notify_posts_changed
+
+
+BATCH_SIZE = 500
+
+
+class TagMappingError(ValueError):
+    pass
+
+
+def read_mapping(lines) -> list:
+    """Read (source, target) pairs from CSV lines, with an optional header"""
+    mapping = []
+    for index, row in enumerate(csv.reader(lines)):
+        if not row or not ''.join(row).strip():
+            continue
+        if len(row) != 2:
+            raise TagMappingError(f"Riga {index + 1}: attese due colonne, trovate {len(row)}")
+        source, target = (clean_tag_name(value) for value in row)
+        if index == 0 and (source.casefold(), target.casefold()) == ('source', 'target'):
+            continue
+        if not source or not target:
+            raise TagMappingError(f"Riga {index + 1}: nome del tag mancante")
+        mapping.append((source, target))
+    return mapping
+
+
+def resolve_mapping(mapping) -> dict:
+    """
+    Return the final target name for the key of every source,
+    following chains and rejecting cycles
+    """
+    targets = {}
+    for source, target in mapping:
+        key = normalize_tag_name(source)
+        if key in targets and normalize_tag_name(targets[key]) != normalize_tag_name(target):
+            raise TagMappingError(f"Il tag {source!r} ha più destinazioni")
+        targets[key] = target
+
+    resolved = {}
+    for key, target in targets.items():
+        seen = {key}
+        while True:
+            target_key = normalize_tag_name(target)
+            if target_key not in targets:
+                break
+            if normalize_tag_name(targets[target_key]) == target_key:
+                # A tag mapped to itself is only respelled
+                target = targets[target_key]
+                break
+            if target_key in seen:
+                raise TagMappingError(f"Ciclo nella mappatura del tag {target!r}")
+            seen.add(target_key)
+            target = targets[target_key]
+        resolved[key] = target
+    return resolved
+
+
+def plan(mapping) -> tuple:
+    """
+    Return the renames, as (tag, new name), and the merges, as
+    (source tag, target key), of a mapping
+    """
+    resolved = resolve_mapping(mapping)
+    sources = {}
+    for start in range(0, len(resolved), BATCH_SIZE):
+        keys = list(resolved)[start:start + BATCH_SIZE]
+        sources.update((tag.key, tag) for tag in Tag.objects.filter(key__in=keys))
+    target_keys = {normalize_tag_name(name) for name in resolved.values()}
+    existing = set()
+    for start in range(0, len(target_keys), BATCH_SIZE):
+        keys = list(target_keys)[start:start + BATCH_SIZE]
+        existing.update(Tag.objects.filter(key__in=keys).values_list('key', flat=True))
+
+    renames = []
+    merges = []
+    for key, target in resolved.items():
+        source = sources.get(key)
+        if source is None:
+            continue
+        target_key = normalize_tag_name(target)
+        if target_key == key:
+            # Same tag: only the spelling of the name changes
+            if source.name != target:
+                renames.append((source, target))
+        elif target_key in existing:
+            merges.append((source, target_key))
+        else:
+            # The first source takes the new name, the others merge into it
+            renames.append((source, target))
+            existing.add(target_key)
+    return renames, merges
+
+
+def move_posts(source_id, target_id) -> None:
+    """Move the posts of a tag to another, without duplicating pairs"""
+    through = Post.tags.through._meta
+    table = connection.ops.quote_name(through.db_table)
+    post_column = connection.ops.quote_name(through.get_field('post').column)
+    tag_column = connection.ops.quote_name(through.get_field('tag').column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({post_column}, {tag_column}) "
+            f"SELECT source.{post_column}, %s FROM {table} source "
+            f"WHERE source.{tag_column} = %s AND NOT EXISTS ("
+            f"SELECT 1 FROM {table} target "
+            f"WHERE target.{post_column} = source.{post_column} AND target.{tag_column} = %s)",
+            [target_id, source_id, target_id]
+        )
+        cursor.execute(f"DELETE FROM {table} WHERE {tag_column} = %s", [source_id])
+
+
+def apply_mapping(mapping, batch_size=BATCH_SIZE, dry_run=False) -> dict:
+    """
+    Merge and rename the tags of a mapping.
+    Return the number of renamed and merged tags and of changed posts.
+    """
+    renames, merges = plan(mapping)
+    Through = Post.tags.through
+    source_ids = [source.pk for source, _ in renames] + [source.pk for source, _ in merges]
+    report = {
+        'renamed': len(renames),
+        'merged': len(merges),
+        'posts': (Through.objects.filter(tag_id__in=source_ids)
+                  .values('post_id').distinct().count()),
+    }
+    if dry_run:
+        return report
+
+    changed = set()
+    for start in range(0, len(renames), batch_size):
+        batch = renames[start:start + batch_size]
+        with transaction.atomic():
+            for tag, name in batch:
+                tag.name = name
+                # Updates the key and the slug too
+                tag.save()
+            batch_ids = [tag.pk for tag, _ in batch]
+            changed.update(Through.objects.filter(tag_id__in=batch_ids).values_list('post_id', flat=True))
+
+    target_ids = dict(Tag.objects
+                      .filter(key__in={key for _, key in merges})
+                      .values_list('key', 'pk'))
+    for start in range(0, len(merges), batch_size):
+        batch = merges[start:start + batch_size]
+        with transaction.atomic():
+            batch_ids = [source.pk for source, _ in batch]
+            changed.update(Through.objects.filter(tag_id__in=batch_ids).values_list('post_id', flat=True))
+            for source, target_key in batch:
+                move_posts(source.pk, target_ids[target_key])
+            Tag.objects.filter(pk__in=batch_ids).delete()
+
+    # Refresh the posts once: update dates (used in cached fragments and
+    # feed items), tag index and cached listings
+    changed = sorted(changed)
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        Post.objects.filter(pk__in=batch).update(update_date=now())
+        notify_posts_changed(batch)
+    return report
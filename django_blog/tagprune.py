@@ -0,0 +1,92 @@
+"""
+Pruning of the tags no post uses.
+
+Tags are created on the fly by the editing views and left behind when
+posts lose them. A tag is an orphan when no post uses it or, when drafts
+are included, when only drafts use it. Tags created less than the grace
+period ago are kept: an editor may be about to save a post with them.
+
+Orphans are found in batches, walking the tags by primary key. Every
+batch is deleted in its own short transaction: the tags are locked
+first (``SELECT ... FOR UPDATE``, waiting for editors saving posts with
+them) and checked again, so that a tag added to a post in the meantime
+is not deleted. Editors lock the tags they add in turn, in
+``TagManager.get_or_create_many``: a tag deleted while they wait is
+created again.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.timezone import now
+
+from . models import Post, Tag
+from . signals import notify_posts_changed
+
+
+try:
+    GRACE_PERIOD = settings.DJANGO_BLOG_TAG_GRACE_PERIOD
+except AttributeError:
+    GRACE_PERIOD = 60 * 60 * 24
+
+try:
+    PRUNE_DRAFT_TAGS = settings.DJANGO_BLOG_PRUNE_DRAFT_TAGS
+except AttributeError:
+    PRUNE_DRAFT_TAGS = False
+
+BATCH_SIZE = 500
+
+
+def get_orphans(include_drafts=PRUNE_DRAFT_TAGS, grace_period=GRACE_PERIOD):
+    """Tags not used by any post (or only by drafts) older than the grace period"""
+    relations = Post.tags.through.objects.filter(tag_id=OuterRef('pk'))
+    if include_drafts:
+        relations = relations.filter(post__pub_date__isnull=False)
+    return (Tag.objects
+            .filter(created__lt=now() - timedelta(seconds=grace_period))
+            .filter(~Exists(relations)))
+
+
+def prune(include_drafts=PRUNE_DRAFT_TAGS, grace_period=GRACE_PERIOD,
+          batch_size=BATCH_SIZE, dry_run=False) -> dict:
+    """
+    Delete the orphan tags. Return the names of the deleted tags (of the
+    tags to delete, on a dry run) and the number of drafts that lost them.
+    """
+    Through = Post.tags.through
+    names = []
+    posts = set()
+    last = 0
+    while True:
+        batch = list(get_orphans(include_drafts, grace_period)
+                     .filter(pk__gt=last)
+                     .order_by('pk')
+                     .values_list('pk', 'name')[:batch_size])
+        if not batch:
+            break
+        last = batch[-1][0]
+        if dry_run:
+            names += [name for _, name in batch]
+            posts.update(Through.objects.filter(tag_id__in=[pk for pk, _ in batch])
+                         .values_list('post_id', flat=True))
+            continue
+
+        with transaction.atomic():
+            locked = list(Tag.objects.select_for_update()
+                          .filter(pk__in=[pk for pk, _ in batch])
+                          .values_list('pk', flat=True))
+            # Checked again once locked, in a new query
+            orphans = dict(get_orphans(include_drafts, grace_period)
+                           .filter(pk__in=locked)
+                           .values_list('pk', 'name'))
+            drafts = set(Through.objects.filter(tag_id__in=orphans).values_list('post_id', flat=True))
+            Tag.objects.filter(pk__in=orphans).delete()
+            if drafts:
+                Post.objects.filter(pk__in=drafts).update(update_date=now())
+        names += orphans.values()
+        posts.update(drafts)
+        # Only drafts lose tags: listings are not affected, but the
+        # cached fragments of the drafts are
+        notify_posts_changed(drafts)
+    return {'tags': names, 'posts': len(posts)}
@@ -0,0 +1,169 @@
+"""
+Deferred work on the changed posts.
+
+The receivers of ``posts_changed`` run in the request that saved the
+posts; the work that can wait (the tag index, the revisions) is done by
+the receivers of ``posts_changed_deferred`` instead, so that the time of a
+save does not grow with the derived data. ``DJANGO_BLOG_TASKS`` chooses
+when they run:
+
+``sync`` (default)
+    Right after ``posts_changed``, in the request, as before.
+``thread``
+    The changed posts are queued and a pool of ``DJANGO_BLOG_TASK_THREADS``
+    threads of the web process works on the queue after the commit.
+``worker``
+    The changed posts are queued and the ``run_tasks`` management command,
+    run as a separate process, works on the queue.
+
+The queue is the ``PostChange`` table, written when ``posts_changed`` is
+sent: right after the commit for the batches of changes (see
+``batch_changes``), in the transaction of the change for single saves
+made inside one. A change rolled back is never processed. Each post has one row, so changes made before a worker takes
+the post are merged into one. Workers take batches of posts for
+``LEASE_TIME`` seconds (``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it) and remove them when the receivers are done; posts
+changed again in the meantime are kept for the next run, and the posts of
+a failed batch are taken again when the lease expires. Every change
+increments the ``sequence`` of the row: the one read when the post is
+taken tells whether it changed since, whatever the clocks of the web
+processes and of the workers.
+
+Work that needs the state before the change, like the previous author of
+a post in ``authorstats``, stays on ``posts_changed``.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from . models import Post, PostChange
+from . signals import posts_changed, posts_changed_deferred
+
+
+SYNC = 'sync'
+THREAD = 'thread'
+WORKER = 'worker'
+MODES = (SYNC, THREAD, WORKER)
+
+try:
+    THREADS = settings.DJANGO_BLOG_TASK_THREADS
+except AttributeError:
+    THREADS = 2
+
+BATCH_SIZE = 100
+LEASE_TIME = 300
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_scheduled = False
+_lock = threading.Lock()
+
+
+def get_mode() -> str:
+    try:
+        mode = settings.DJANGO_BLOG_TASKS
+    except AttributeError:
+        return SYNC
+    if mode not in MODES:
+        raise ValueError(f"Invalid task mode: {mode}")
+    return mode
+
+
+def enqueue(post_ids) -> None:
+    """Queue the posts, merging them with the ones already queued"""
+    with transaction.atomic():
+        PostChange.objects.bulk_create([PostChange(post_id=pk) for pk in post_ids], ignore_conflicts=True)
+        PostChange.objects.filter(post_id__in=post_ids).update(queued=now(), sequence=F('sequence') + 1)
+
+
+def claim(batch_size=BATCH_SIZE) -> tuple:
+    """
+    Take the oldest queued posts not taken by other workers.
+    Return the sequence of their changes, by id.
+    """
+    current_time = now()
+    with transaction.atomic():
+        claimed = dict(PostChange.objects
+                       .select_for_update(skip_locked=True)
+                       .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=current_time))
+                       .order_by('queued')
+                       .values_list('post_id', 'sequence')[:batch_size])
+        (PostChange.objects
+         .filter(post_id__in=claimed)
+         .update(locked_until=current_time + timedelta(seconds=LEASE_TIME)))
+    return claimed
+
+
+def complete(claimed) -> None:
+    """Remove the processed posts, except the ones changed since taken"""
+    unchanged = Q()
+    for pk, sequence in claimed.items():
+        unchanged |= Q(post_id=pk, sequence=sequence)
+    with transaction.atomic():
+        PostChange.objects.filter(unchanged).delete()
+        PostChange.objects.filter(post_id__in=claimed).update(locked_until=None)
+
+
+def run_pending(batch_size=BATCH_SIZE, max_batches=None) -> int:
+    """Process the queued posts, in batches. Return their number."""
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        claimed = claim(batch_size)
+        if not claimed:
+            break
+        posts_changed_deferred.send(sender=Post, post_ids=list(claimed), queued=True)
+        complete(claimed)
+        processed += len(claimed)
+        batches += 1
+    return processed
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='django_blog_tasks')
+        return _executor
+
+
+def _run_in_thread():
+    global _scheduled
+    with _lock:
+        _scheduled = False
+    try:
+        run_pending()
+    except Exception:
+        # The posts are taken again when their lease expires
+        logger.exception("Deferred work on the changed posts failed")
+    finally:
+        connections.close_all()
+
+
+def schedule() -> None:
+    """Have a thread of the pool work on the queue, unless one is about to"""
+    global _scheduled
+    with _lock:
+        if _scheduled:
+            return
+        _scheduled = True
+    get_executor().submit(_run_in_thread)
+
+
+@receiver(posts_changed)
+def posts_changed_defer(sender, post_ids, **kwargs):
+    mode = get_mode()
+    if mode == SYNC:
+        posts_changed_deferred.send(sender=sender, post_ids=post_ids, queued=False)
+        return
+    enqueue(post_ids)
+    if mode == THREAD:
+        transaction.on_commit(schedule)
@@ -1,12 +1,32 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from . models import Post, Tag
 from django.utils.timezone import now
-from django.urls import reverse
+from django.urls import reverse, path, include
 from django.contrib.auth import get_user_model
 from django.contrib.messages.test import MessagesTestMixin
 from django.contrib import messages
 from django.contrib.messages.storage.base import Message
+from . signals import posts_changed
+from . import cache as blog_cache
+from . paginators import BlogPaginator
+from . models import TagPostIndex
+from django.core.management import CommandError, call_command
+from io import StringIO
+import base64
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import tempfile
 import datetime
+from unittest import mock
+import time
+import json
 
 # Create your tests here.
 DATEFORMAT = "%Y-%m-%dT%H:%M"
@@ -318,6 +338,18 @@ class PostChangeDateTest(MessagesTestMixin, PostPopulatedTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'blog/post_change_date.html')
 
+    def test_change_date_view_shared_layout(self):
+        """The layout is shared: the post comes from the context of each request"""
+        self.client.force_login(self.user1)
+        self.draft_post.title = "<b>Draft</b> post"
+        self.draft_post.save()
+        response = self.client.get(reverse('blog:change_date', kwargs={'pk': self.draft_post.pk}))
+        self.assertContains(response, "il post “&lt;b&gt;Draft&lt;/b&gt; post”")
+        self.client.force_login(self.user2)
+        response = self.client.get(reverse('blog:change_date', kwargs={'pk': self.draft_post2.pk}))
+        self.assertContains(response, "il post “Future post user 2”")
+        self.assertContains(response, reverse('blog:detail', kwargs={'pk': self.draft_post2.pk}))
+
     def test_change_date_view_post(self):
         self.client.force_login(self.user1)
         response = self.client.post(
@@ -433,6 +465,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         self.client.force_login(self.user1)
         response = self.client.get(reverse('blog:update', kwargs={'pk': self.pub_post.pk}))
         self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<input type="hidden" name="version" value="0"', html=False)
 
     def test_update_view_template(self):
         self.client.force_login(self.user1)
@@ -445,6 +478,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.pub_post.pk}),
             {
+                'version': self.pub_post.version,
                 'title': self.pub_post.title,
                 'body': str(self.pub_post.body) + " updated"
             }
@@ -456,6 +490,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.pub_post.pk}),
             {
+                'version': self.pub_post.version,
                 'title': self.pub_post.title,
                 'body': str(self.pub_post.body) + " updated"
             }
@@ -469,6 +504,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.pub_post.pk}),
             {
+                'version': self.pub_post.version,
                 'title': self.pub_post.title,
                 'body': updated_body
             }
@@ -482,6 +518,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.pub_post.pk}),
             {
+                'version': self.pub_post.version,
                 'title': self.pub_post.title,
                 'body': str(self.pub_post.body) + " updated"
             }
@@ -496,6 +533,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.draft_post2.pk}),
             {
+                'version': self.draft_post2.version,
                 'title': self.draft_post2.title,
                 'body': updated_body
             }
@@ -511,6 +549,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.draft_post2.pk}),
             {
+                'version': self.draft_post2.version,
                 'title': self.draft_post2.title,
                 'body': str(self.draft_post2.body) + " updated"
             }
@@ -528,6 +567,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.pub_post.pk}),
             {
+                'version': self.pub_post.version,
                 'title': self.pub_post.title,
                 'body': self.pub_post.body,
                 'tags': [tag_name]
@@ -543,6 +583,7 @@ class PostUpdateTest(MessagesTestMixin, PostPopulatedTestCase):
         response = self.client.post(
             reverse('blog:update', kwargs={'pk': self.post_tag.pk}),
             {
+                'version': self.post_tag.version,
                 'title': self.post_tag.title,
                 'body': self.post_tag.body,
                 'tags': [tag_name]
@@ -808,6 +849,9 @@ class PostByTagViewTest(PostPopulatedTestCase):
         self.assertEqual(response.context['tag'], self.tag2)
 
 class FeedRssTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
     def test_rss_view_by_name(self):
         response = self.client.get(reverse('blog:feed_rss'))
         self.assertEqual(response.status_code, 200)
@@ -815,3 +859,2000 @@ class FeedRssTest(TestCase):
     def test_rss_view_by_url(self):
         response = self.client.get('/blog/feed/rss/')
         self.assertEqual(response.status_code, 200)
+
+
+class PostEditingQueryCountTest(PostPopulatedTestCase):
+    """The editing views should fetch the post only once per request"""
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = get_user_model().objects.create(username="test", password="test")
+        self.client.force_login(self.user)
+
+    def test_update_view_get_queries(self):
+        # session, user, post, autosaved changes, all tags, post tags
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('blog:update', kwargs={'pk': self.pub_post.pk}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_view_post_queries(self):
+        # session, user, post, locked version, update and clear tags (in a
+        # savepoint, two more queries)
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                reverse('blog:update', kwargs={'pk': self.pub_post.pk}),
+                {'title': self.pub_post.title, 'body': self.pub_post.body, 'version': 0}
+            )
+        self.assertEqual(response.status_code, 302)
+
+    def test_delete_view_get_queries(self):
+        # session, user, post
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('blog:delete', kwargs={'pk': self.pub_post.pk}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_view_post_queries(self):
+        # session, user, post, delete tags relations, autosaved changes
+        # and post
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('blog:delete', kwargs={'pk': self.pub_post.pk}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_publish_view_queries(self):
+        # session, user, post, update
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('blog:publish', kwargs={'pk': self.draft_post.pk}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_change_date_view_get_queries(self):
+        # session, user, post
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('blog:change_date', kwargs={'pk': self.draft_post.pk}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_date_view_post_queries(self):
+        # session, user, post, update
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                reverse('blog:change_date', kwargs={'pk': self.draft_post.pk}),
+                {'pub_date': (now() + datetime.timedelta(days=7)).strftime(DATEFORMAT)}
+            )
+        self.assertEqual(response.status_code, 302)
+
+    def test_permission_check_does_not_load_author(self):
+        post = Post.objects.create(title="Post", body="Body", author=self.user)
+        post = Post.objects.get(pk=post.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(post.can_be_modified_by(self.user))
+
+
+class PostBulkTest(PostPopulatedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user1 = get_user_model().objects.create(username="test1", password="test1")
+        self.user2 = get_user_model().objects.create(username="test2", password="test2")
+        self.draft_post2 = Post.objects.create(
+            title="Draft post user 2",
+            body="Body of draft post user 2",
+            author=self.user2
+        )
+        self.client.force_login(self.user1)
+
+    def test_posts_changed_sent_after_commit(self):
+        from . bulk import apply_bulk_operation, publish_scheduled_posts
+        from . autosave import autosave
+        # Transactions (savepoints, in tests) still open when the signal is sent
+        depths = []
+
+        def receiver(sender, **kwargs):
+            depths.append(len(connection.savepoint_ids))
+
+        depth = len(connection.savepoint_ids)
+        posts_changed.connect(receiver)
+        self.addCleanup(posts_changed.disconnect, receiver)
+        apply_bulk_operation(self.user1, [self.draft_post.pk], 'publish')
+        Post.objects.filter(pk=self.future_post.pk).update(pub_date=now())
+        publish_scheduled_posts()
+        autosave(self.draft_post2, 0, {'body': "New body"})
+        self.assertEqual(depths, [depth] * 3)
+
+    def bulk(self, operation, posts, **data):
+        return self.client.post(
+            reverse('blog:bulk'),
+            {'operation': operation, 'ids': [post.pk for post in posts], **data}
+        )
+
+    def test_bulk_publish(self):
+        response = self.bulk('publish', [self.draft_post, self.future_post])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'],
+            {str(self.draft_post.pk): 'ok', str(self.future_post.pk): 'ok'}
+        )
+        self.assertEqual(Post.published_objects.count(), 3)
+
+    def test_bulk_report(self):
+        response = self.bulk('publish', [self.pub_post, self.draft_post2, self.draft_post])
+        self.assertEqual(response.json()['results'], {
+            str(self.pub_post.pk): 'skipped',
+            str(self.draft_post2.pk): 'forbidden',
+            str(self.draft_post.pk): 'ok',
+        })
+        self.assertTrue(Post.objects.get(pk=self.draft_post2.pk).is_draft())
+
+    def test_bulk_not_found(self):
+        response = self.client.post(reverse('blog:bulk'), {'operation': 'delete', 'ids': [1000]})
+        self.assertEqual(response.json()['results'], {'1000': 'not_found'})
+
+    def test_bulk_schedule(self):
+        new_pub_date = now() + datetime.timedelta(days=7)
+        response = self.bulk('schedule', [self.draft_post], pub_date=new_pub_date.isoformat())
+        self.assertEqual(response.status_code, 200)
+        post = Post.objects.get(pk=self.draft_post.pk)
+        self.assertEqual(post.pub_date, new_pub_date)
+
+    def test_bulk_schedule_requires_date(self):
+        response = self.bulk('schedule', [self.draft_post])
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_tags(self):
+        Tag.objects.create(name="old")
+        self.bulk('add_tags', [self.pub_post, self.draft_post], tags=['old', 'new'])
+        self.assertEqual(set(self.pub_post.tags.values_list('name', flat=True)), {'old', 'new'})
+        # Adding the same tags twice does not duplicate them
+        self.bulk('add_tags', [self.pub_post], tags=['new'])
+        self.assertEqual(self.pub_post.tags.count(), 2)
+        self.bulk('remove_tags', [self.pub_post], tags=['old'])
+        self.assertEqual(list(self.pub_post.tags.values_list('name', flat=True)), ['new'])
+        self.bulk('set_tags', [self.draft_post], tags=['other'])
+        self.assertEqual(list(self.draft_post.tags.values_list('name', flat=True)), ['other'])
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_bulk_conflicts_with_autosave(self):
+        from . autosave import autosave, CONFLICT
+        version = self.draft_post.version
+        self.bulk('add_tags', [self.draft_post], tags=['new'])
+        status, _ = autosave(Post.objects.get(pk=self.draft_post.pk), version, {'body': "Autosaved"})
+        self.assertEqual(status, CONFLICT)
+        self.bulk('schedule', [self.draft_post], pub_date=(now() + datetime.timedelta(days=1)).isoformat())
+        self.assertEqual(Post.objects.get(pk=self.draft_post.pk).version, version + 2)
+
+    def test_bulk_delete(self):
+        self.pub_post.tags.create(name="tag")
+        response = self.bulk('delete', [self.pub_post, self.draft_post, self.draft_post2])
+        self.assertEqual(response.status_code, 200)
+        self.assertQuerySetEqual(Post.objects.order_by('pk'), [self.future_post, self.draft_post2])
+
+    def test_bulk_invalid_operation(self):
+        response = self.bulk('explode', [self.pub_post])
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_unauth_redirects_to_login(self):
+        self.client.logout()
+        response = self.bulk('delete', [self.pub_post])
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Post.objects.count(), 4)
+
+    def test_bulk_sends_one_signal(self):
+        calls = []
+        def receiver(sender, post_ids, **kwargs):
+            calls.append(post_ids)
+        posts_changed.connect(receiver)
+        self.addCleanup(posts_changed.disconnect, receiver)
+        self.bulk('delete', [self.pub_post, self.draft_post])
+        self.assertEqual(calls, [sorted([self.pub_post.pk, self.draft_post.pk])])
+
+    def test_bulk_queries_do_not_depend_on_number_of_posts(self):
+        posts = [Post.objects.create(title=f"Post {i}", body="Body") for i in range(10)]
+        # session, user, permissions, update (plus savepoint handling),
+        # authors of the posts for their counts
+        with self.assertNumQueries(7):
+            self.bulk('publish', posts[:2])
+        with self.assertNumQueries(7):
+            self.bulk('publish', posts[2:])
+
+
+class ApiTest(PostPopulatedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.pub_post2 = Post.objects.create(
+            title="Published post 2",
+            body="Body of published post 2",
+            pub_date=now() - datetime.timedelta(hours=1)
+        )
+        self.tag = Tag.objects.create(name="tag")
+        self.pub_post.tags.add(self.tag)
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content) if response.streaming else response.content)
+
+    def test_api_list_only_published(self):
+        data = self.get_json(reverse('blog:api_list'))
+        self.assertEqual([post['id'] for post in data['results']], [self.pub_post2.pk, self.pub_post.pk])
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['results'][1]['tags'], ['tag'])
+
+    def test_api_list_sparse_fields(self):
+        data = self.get_json(reverse('blog:api_list'), fields='id,title')
+        self.assertEqual(data['results'][0], {'id': self.pub_post2.pk, 'title': self.pub_post2.title})
+
+    def test_api_list_unknown_field(self):
+        response = self.client.get(reverse('blog:api_list'), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_list_cursor(self):
+        data = self.get_json(reverse('blog:api_list'), limit=1, fields='id')
+        self.assertEqual(data['results'], [{'id': self.pub_post2.pk}])
+        data = self.get_json(data['next'])
+        self.assertEqual(data['results'], [{'id': self.pub_post.pk}])
+        self.assertIsNone(data['next'])
+
+    def test_api_list_invalid_cursor(self):
+        response = self.client.get(reverse('blog:api_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_list_updated_since(self):
+        Post.objects.filter(pk=self.pub_post.pk).update(update_date=now() - datetime.timedelta(days=2))
+        since = (now() - datetime.timedelta(days=1)).isoformat()
+        data = self.get_json(reverse('blog:api_list'), updated_since=since, fields='id')
+        self.assertEqual(data['results'], [{'id': self.pub_post2.pk}])
+
+    def test_api_list_etag(self):
+        response = self.client.get(reverse('blog:api_list'))
+        etag = response['ETag']
+        response = self.client.get(reverse('blog:api_list'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.pub_post.save()
+        response = self.client.get(reverse('blog:api_list'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_list_does_not_depend_on_page_size(self):
+        for i in range(10):
+            Post.objects.create(title=f"Post {i}", body="Body", pub_date=now())
+        # keys, rows, tags
+        with self.assertNumQueries(3):
+            self.get_json(reverse('blog:api_list'), limit=50)
+
+    def test_api_detail(self):
+        data = self.get_json(reverse('blog:api_detail', kwargs={'pk': self.pub_post.pk}), fields='title,tags,url')
+        self.assertEqual(data, {'title': self.pub_post.title, 'tags': ['tag'], 'url': self.pub_post.get_absolute_url()})
+
+    def test_api_detail_unpublished_404(self):
+        response = self.client.get(reverse('blog:api_detail', kwargs={'pk': self.future_post.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_detail_etag(self):
+        url = reverse('blog:api_detail', kwargs={'pk': self.pub_post.pk})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_api_tags(self):
+        Tag.objects.create(name="unused")
+        data = self.get_json(reverse('blog:api_tags'))
+        self.assertEqual([tag['name'] for tag in data['results']], ['tag'])
+
+    def test_api_list_by_tag(self):
+        data = self.get_json(reverse('blog:api_list_by_tag', kwargs={'pk': self.tag.pk}), fields='id')
+        self.assertEqual(data['results'], [{'id': self.pub_post.pk}])
+        response = self.client.get(reverse('blog:api_list_by_tag', kwargs={'pk': 1000}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_search(self):
+        data = self.get_json(reverse('blog:api_search'), q='post 2', fields='id')
+        self.assertEqual(data['results'], [{'id': self.pub_post2.pk}])
+        response = self.client.get(reverse('blog:api_search'))
+        self.assertEqual(response.status_code, 400)
+
+
+class PaginatorCountTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.posts = [
+            Post.objects.create(
+                title=f"Post {i}",
+                body="Body",
+                pub_date=now() - datetime.timedelta(days=i + 1)
+            )
+            for i in range(6)
+        ]
+
+    def test_exact_count(self):
+        paginator = BlogPaginator(Post.objects.order_by('pk'), 4)
+        self.assertEqual(paginator.count, 6)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_cached_count(self):
+        queryset = Post.objects.order_by('pk')
+        self.assertEqual(BlogPaginator(queryset, 4, count_mode='cached', cache_key='test').count, 6)
+        with self.assertNumQueries(0):
+            self.assertEqual(BlogPaginator(queryset, 4, count_mode='cached', cache_key='test').count, 6)
+
+    def test_cached_count_invalidated(self):
+        queryset = Post.objects.order_by('pk')
+        BlogPaginator(queryset, 4, count_mode='cached', cache_key='test').count
+        self.posts[0].delete()
+        self.assertEqual(BlogPaginator(queryset, 4, count_mode='cached', cache_key='test').count, 5)
+
+    def test_no_count(self):
+        paginator = BlogPaginator(Post.objects.order_by('pk'), 4, count_mode='none')
+        with self.assertNumQueries(1):
+            page = paginator.page(1)
+            self.assertTrue(page.has_next())
+            self.assertEqual(len(page), 4)
+        page = paginator.page(2)
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+        self.assertEqual(list(page), self.posts[4:])
+
+    def test_estimated_count_unsupported_backend(self):
+        paginator = BlogPaginator(Post.objects.order_by('pk'), 4, count_mode='estimated')
+        self.assertIsNone(paginator.count)
+        self.assertTrue(paginator.page(1).has_next())
+
+    @override_settings(DJANGO_BLOG_PAGINATE_COUNT='none')
+    def test_list_view_without_count(self):
+        response = self.client.get(reverse('blog:list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_paginated'])
+        self.assertContains(response, "Next page")
+        response = self.client.get(reverse('blog:list'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertQuerySetEqual(response.context['posts'], self.posts[4:])
+        response = self.client.get(reverse('blog:list'), {'page': 3})
+        self.assertEqual(response.status_code, 404)
+
+    def test_last_page(self):
+        for mode, status in (('exact', 200), ('cached', 200), ('estimated', 404), ('none', 404)):
+            with self.subTest(mode=mode), override_settings(DJANGO_BLOG_PAGINATE_COUNT=mode):
+                response = self.client.get(reverse('blog:list'), {'page': 'last'})
+                self.assertEqual(response.status_code, status)
+                if status == 200:
+                    self.assertQuerySetEqual(response.context['posts'], self.posts[4:])
+
+    def test_page_range_without_count(self):
+        paginator = BlogPaginator(Post.objects.order_by('pk'), 4, count_mode='none')
+        self.assertIsNone(paginator.num_pages)
+        self.assertEqual(list(paginator.page_range), [])
+
+    @override_settings(DJANGO_BLOG_PAGINATE_COUNT={'list': 'cached'})
+    def test_list_view_cached_count(self):
+        self.client.get(reverse('blog:list'))
+        response = self.client.get(reverse('blog:list'))
+        self.assertEqual(response.context['paginator'].count, 6)
+        self.posts[0].delete()
+        response = self.client.get(reverse('blog:list'))
+        self.assertEqual(response.context['paginator'].count, 5)
+
+
+class TagModelTest(TestCase):
+    def test_tag_name_is_cleaned(self):
+        tag = Tag.objects.create(name="  my   tag ")
+        self.assertEqual(tag.name, "my tag")
+        self.assertEqual(tag.key, "my tag")
+        self.assertEqual(tag.slug, "my-tag")
+
+    def test_tag_key_is_case_insensitive(self):
+        Tag.objects.create(name="Django")
+        self.assertEqual(Tag.objects.get_by_name("django ").name, "Django")
+
+    def test_tag_key_longer_than_name(self):
+        name = "ß" * 60
+        tag, = Tag.objects.get_or_create_many([name])
+        self.assertEqual(tag.key, "ss" * 60)
+        # The key fits its column
+        tag.full_clean()
+        self.assertEqual(Tag.objects.get_by_name(name.upper()), tag)
+
+    def test_tag_clean_rejects_duplicates(self):
+        Tag.objects.create(name="Django")
+        with self.assertRaises(ValidationError):
+            Tag(name="DJANGO").full_clean()
+
+    def test_tag_unique_slugs(self):
+        tag1 = Tag.objects.create(name="c")
+        tag2 = Tag.objects.create(name="c++")
+        self.assertNotEqual(tag1.slug, tag2.slug)
+
+    def test_tag_numeric_slug(self):
+        tag = Tag.objects.create(name="2024")
+        self.assertEqual(tag.slug, "tag-2024")
+
+    def test_get_or_create_many(self):
+        Tag.objects.create(name="Django")
+        with self.assertNumQueries(1):
+            tags = Tag.objects.get_or_create_many(["django", "DJANGO "])
+        self.assertEqual([tag.name for tag in tags], ["Django"])
+        tags = Tag.objects.get_or_create_many(["Django", "Python", "python", ""])
+        self.assertEqual(sorted(tag.name for tag in tags), ["Django", "Python"])
+        self.assertEqual(Tag.objects.count(), 2)
+
+
+class TagNormalizationViewTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create(username="test", password="test")
+        self.tag = Tag.objects.create(name="Django")
+
+    def test_create_post_reuses_tag_regardless_of_case(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('blog:create'),
+            {'title': 'New post title', 'body': 'New post body', 'tags': ['django ', 'DJANGO']}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Tag.objects.count(), 1)
+        self.assertQuerySetEqual(Post.objects.first().tags.all(), [self.tag])
+
+    def test_list_by_tag_slug(self):
+        post = Post.objects.create(title="Post", body="Body", pub_date=now())
+        post.tags.add(self.tag)
+        response = self.client.get(reverse('blog:list_by_tag_slug', kwargs={'slug': 'django'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['tag'], self.tag)
+        self.assertQuerySetEqual(response.context['posts'], [post])
+        self.assertEqual(self.tag.get_absolute_url(), '/blog/tag/django/')
+
+    def test_list_by_tag_slug_404(self):
+        response = self.client.get(reverse('blog:list_by_tag_slug', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class FeedTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = get_user_model().objects.create(username="author", password="test")
+        self.tag = Tag.objects.create(name="Tag")
+        self.post = Post.objects.create(
+            title="Published post",
+            body="<p>Body of published post</p>",
+            pub_date=now() - datetime.timedelta(days=1),
+            author=self.user
+        )
+        self.post.tags.add(self.tag)
+        self.other_post = Post.objects.create(
+            title="Other post",
+            body="Body of other post",
+            pub_date=now() - datetime.timedelta(days=2)
+        )
+        Post.objects.create(title="Draft post", body="Body of draft post")
+
+    def get_content(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_rss_items(self):
+        content = self.get_content(reverse('blog:feed_rss'))
+        self.assertEqual(content.count('<item>'), 2)
+        self.assertIn('<category>Tag</category>', content)
+        self.assertNotIn('Draft post', content)
+        self.assertTrue(content.endswith('</channel></rss>'))
+
+    def test_atom_items(self):
+        content = self.get_content(reverse('blog:feed_atom'))
+        self.assertEqual(content.count('<entry>'), 2)
+        self.assertTrue(content.endswith('</feed>'))
+
+    def test_json_feed(self):
+        data = json.loads(self.get_content(reverse('blog:feed_json')))
+        self.assertEqual([item['title'] for item in data['items']], ["Published post", "Other post"])
+        self.assertEqual(data['items'][0]['authors'], [{'name': 'author'}])
+
+    def test_tag_feed(self):
+        data = json.loads(self.get_content(reverse('blog:tag_feed_json', kwargs={'slug': self.tag.slug})))
+        self.assertEqual([item['title'] for item in data['items']], ["Published post"])
+
+    def test_author_feed(self):
+        data = json.loads(self.get_content(reverse('blog:author_feed_json', kwargs={'pk': self.user.pk})))
+        self.assertEqual([item['title'] for item in data['items']], ["Published post"])
+
+    def test_feed_items_are_cached(self):
+        self.get_content(reverse('blog:feed_rss'))
+        # The ids of the posts and the items are both cached
+        with self.assertNumQueries(0):
+            self.get_content(reverse('blog:feed_rss'))
+
+    def test_feed_item_updated(self):
+        self.get_content(reverse('blog:feed_rss'))
+        self.post.title = "Updated title"
+        self.post.save()
+        self.assertIn("Updated title", self.get_content(reverse('blog:feed_rss')))
+
+    def test_feed_item_tags_changed(self):
+        from . bulk import apply_bulk_operation, ADD_TAGS
+        self.get_content(reverse('blog:feed_rss'))
+        apply_bulk_operation(self.user, [self.post.pk], ADD_TAGS, tags=["Other tag"])
+        self.assertIn("<category>Other tag</category>", self.get_content(reverse('blog:feed_rss')))
+
+    def test_feed_items_kept_when_other_posts_change(self):
+        self.get_content(reverse('blog:feed_rss'))
+        Post.objects.create(title="Another draft", body="Body")
+        # The ids of the posts only: the items are still cached
+        with self.assertNumQueries(1):
+            self.get_content(reverse('blog:feed_rss'))
+
+    def test_rss_posts_feed_alias(self):
+        from . feeds import RssPostsFeed
+        request = RequestFactory().get(reverse('blog:feed_rss'))
+        response = RssPostsFeed()(request)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('<item>'), 2)
+
+
+class FragmentCacheTest(PostPopulatedTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        super().setUp()
+        self.user = get_user_model().objects.create(username="test", password="test")
+        self.other_user = get_user_model().objects.create(username="other", password="other")
+        self.pub_post.tags.add(Tag.objects.create(name="tag"))
+
+    def test_detail_fragment_shared_with_authenticated_users(self):
+        self.client.get(self.pub_post.get_absolute_url())
+        self.client.force_login(self.user)
+        # session, user, post: tags are read from the cached fragment
+        with self.assertNumQueries(3):
+            response = self.client.get(self.pub_post.get_absolute_url())
+        self.assertContains(response, "Body of published post")
+        self.assertContains(response, "Modifica")
+
+    def test_detail_action_bar_per_user(self):
+        post = Post.objects.create(title="Post", body="Body", pub_date=now(), author=self.other_user)
+        response = self.client.get(post.get_absolute_url())
+        self.assertNotContains(response, "Modifica")
+        self.client.force_login(self.user)
+        response = self.client.get(post.get_absolute_url())
+        self.assertNotContains(response, "Modifica")
+        self.client.force_login(self.other_user)
+        response = self.client.get(post.get_absolute_url())
+        self.assertContains(response, "Modifica")
+
+    def test_detail_fragment_updated(self):
+        self.client.get(self.pub_post.get_absolute_url())
+        self.pub_post.body = "Updated body"
+        self.pub_post.save()
+        response = self.client.get(self.pub_post.get_absolute_url())
+        self.assertContains(response, "Updated body")
+
+    def test_list_fragment_invalidated(self):
+        self.client.get(reverse('blog:list'))
+        Post.objects.create(title="New published post", body="Body", pub_date=now())
+        response = self.client.get(reverse('blog:list'))
+        self.assertContains(response, "New published post")
+
+    def test_list_fragment_separate_for_authenticated_users(self):
+        self.client.get(reverse('blog:list'))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('blog:list'))
+        self.assertContains(response, "Draft post")
+        self.assertContains(response, "Nuovo post")
+
+
+@override_settings(DJANGO_BLOG_TAG_INDEX=True)
+class TagIndexTest(PostPopulatedTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        super().setUp()
+        self.tag = Tag.objects.create(name="tag")
+        self.pub_post.tags.add(self.tag)
+        self.future_post.tags.add(self.tag)
+        self.draft_post.tags.add(self.tag)
+
+    def get_posts(self):
+        response = self.client.get(reverse('blog:list_by_tag', kwargs={'pk': self.tag.pk}))
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['posts'])
+
+    def test_index_contains_posts_with_date(self):
+        self.assertEqual(
+            set(TagPostIndex.objects.values_list('post_id', flat=True)),
+            {self.pub_post.pk, self.future_post.pk}
+        )
+
+    def test_tag_listing_from_index(self):
+        self.assertEqual(self.get_posts(), [self.pub_post])
+
+    def test_tag_listing_without_join(self):
+        self.get_posts()
+        with CaptureQueriesContext(connection) as context:
+            self.get_posts()
+        post_queries = [query['sql'] for query in context.captured_queries if 'blog_post_tags' in query['sql']]
+        self.assertEqual(post_queries, [])
+
+    def test_index_updated_on_publish(self):
+        self.draft_post.publish()
+        self.assertEqual(self.get_posts(), [self.draft_post, self.pub_post])
+
+    def test_index_updated_on_retag(self):
+        self.pub_post.tags.remove(self.tag)
+        self.assertEqual(self.get_posts(), [])
+        self.tag.post_set.add(self.pub_post)
+        self.assertEqual(self.get_posts(), [self.pub_post])
+
+    def test_index_updated_on_delete(self):
+        self.pub_post.delete()
+        self.assertEqual(self.get_posts(), [])
+
+    def test_index_updated_on_bulk_operation(self):
+        self.client.force_login(get_user_model().objects.create(username="test", password="test"))
+        self.client.post(reverse('blog:bulk'), {'operation': 'publish', 'ids': [self.draft_post.pk]})
+        self.assertEqual(self.get_posts(), [self.draft_post, self.pub_post])
+
+    def test_rebuild_command(self):
+        TagPostIndex.objects.all().delete()
+        call_command('rebuild_tag_index', stdout=StringIO())
+        self.assertEqual(TagPostIndex.objects.count(), 2)
+        self.assertEqual(self.get_posts(), [self.pub_post])
+
+
+class PostNavigationTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.tag = Tag.objects.create(name="tag")
+        self.posts = [
+            Post.objects.create(
+                title=f"Post {i}",
+                body="Body",
+                pub_date=now() - datetime.timedelta(days=10 - i)
+            )
+            for i in range(4)
+        ]
+        self.posts[0].tags.add(self.tag)
+        self.posts[2].tags.add(self.tag)
+        self.future_post = Post.objects.create(
+            title="Future post",
+            body="Body",
+            pub_date=now() + datetime.timedelta(days=1)
+        )
+
+    def get_context(self, post, **params):
+        response = self.client.get(post.get_absolute_url(), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_adjacent_published(self):
+        self.assertEqual(self.posts[1].get_adjacent_published(newer=False), self.posts[0])
+        self.assertEqual(self.posts[1].get_adjacent_published(newer=True), self.posts[2])
+        # Scheduled posts are not visible
+        self.assertIsNone(self.posts[3].get_adjacent_published(newer=True))
+
+    def test_adjacent_same_date(self):
+        same_date = Post.objects.create(title="Same date", body="Body", pub_date=self.posts[1].pub_date)
+        self.assertEqual(self.posts[1].get_adjacent_published(newer=True), same_date)
+        self.assertEqual(same_date.get_adjacent_published(newer=False), self.posts[1])
+
+    def test_detail_navigation(self):
+        context = self.get_context(self.posts[1])
+        self.assertEqual(context['previous_post']['title'], "Post 0")
+        self.assertEqual(context['next_post']['title'], "Post 2")
+
+    def test_detail_navigation_by_tag(self):
+        context = self.get_context(self.posts[2], tag=self.tag.slug)
+        self.assertEqual(context['previous_post']['title'], "Post 0")
+        self.assertIsNone(context['next_post'])
+
+    @override_settings(DJANGO_BLOG_TAG_INDEX=True)
+    def test_detail_navigation_by_tag_with_index(self):
+        call_command('rebuild_tag_index', stdout=StringIO())
+        context = self.get_context(self.posts[0], tag=self.tag.slug)
+        self.assertIsNone(context['previous_post'])
+        self.assertEqual(context['next_post']['title'], "Post 2")
+
+    def test_detail_navigation_unknown_tag(self):
+        self.get_context(self.posts[1])
+        # post and tag, post only for values too long for a slug: the
+        # navigation of the post without a tag is used
+        for value, queries in (("no such tag", 2), ("x" * 1000, 1)):
+            with self.subTest(tag=value[:20]):
+                with self.assertNumQueries(queries):
+                    context = self.get_context(self.posts[1], tag=value)
+                self.assertEqual(context['navigation_tag'], '')
+                self.assertEqual(context['next_post']['title'], "Post 2")
+        context = self.get_context(self.posts[2], tag=self.tag.slug)
+        self.assertEqual(context['navigation_tag'], self.tag.slug)
+
+    def test_detail_navigation_is_cached(self):
+        self.get_context(self.posts[1])
+        with self.assertNumQueries(1):
+            self.get_context(self.posts[1])
+
+    def test_detail_navigation_invalidated(self):
+        self.get_context(self.posts[3])
+        self.future_post.publish()
+        context = self.get_context(self.posts[3])
+        self.assertEqual(context['next_post']['title'], "Future post")
+        self.posts[2].delete()
+        context = self.get_context(self.posts[3])
+        self.assertEqual(context['previous_post']['title'], "Post 1")
+
+
+class AutosaveTest(PostPopulatedTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        super().setUp()
+        self.user = get_user_model().objects.create(username="test", password="test")
+        self.client.force_login(self.user)
+        self.tag = Tag.objects.create(name="tag")
+        self.draft_post.tags.add(self.tag)
+        self.url = reverse('blog:autosave', kwargs={'pk': self.draft_post.pk})
+
+    def autosave(self, url=None, **data):
+        return self.client.post(url or self.url, json.dumps(data), content_type='application/json')
+
+    def test_autosave_changed_fields(self):
+        response = self.autosave(version=0, fields={'body': "New body"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'saved')
+        self.assertEqual(response.json()['version'], 1)
+        post = Post.objects.get(pk=self.draft_post.pk)
+        self.assertEqual(post.body, "New body")
+        self.assertEqual(post.title, "Draft post")
+        self.assertEqual(post.version, 1)
+
+    def test_autosave_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            self.autosave(version=0, fields={'title': "Draft post", 'body': "New body"})
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "blog_post"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"body"', updates[0])
+        self.assertNotIn('"title"', updates[0])
+
+    def test_autosave_unchanged(self):
+        response = self.autosave(version=0, fields={'body': "Body of draft post"})
+        self.assertEqual(response.json()['status'], 'unchanged')
+        self.assertEqual(Post.objects.get(pk=self.draft_post.pk).version, 0)
+
+    def test_autosave_skips_repeated_content(self):
+        self.autosave(version=0, fields={'body': "New body"})
+        cache.delete(f"django_blog:autosave_lock:{self.draft_post.pk}")
+        # session, user, post: no write
+        with self.assertNumQueries(3):
+            response = self.autosave(version=1, fields={'body': "New body"})
+        self.assertEqual(response.json()['status'], 'unchanged')
+
+    def test_autosave_collapses_rapid_saves(self):
+        self.autosave(version=0, fields={'body': "New body"})
+        response = self.autosave(version=1, fields={'body': "Newer body"})
+        self.assertEqual(response.json()['status'], 'deferred')
+        self.assertEqual(Post.objects.get(pk=self.draft_post.pk).body, "New body")
+
+    def test_autosave_conflict(self):
+        response = self.autosave(version=0, fields={'body': "New body"})
+        cache.clear()
+        response = self.autosave(version=0, fields={'body': "Other body"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(Post.objects.get(pk=self.draft_post.pk).body, "New body")
+
+    def test_autosave_conflict_with_form_update(self):
+        self.client.post(
+            reverse('blog:update', kwargs={'pk': self.draft_post.pk}),
+            {'title': "Draft post", 'body': "Edited in the form", 'version': 0}
+        )
+        response = self.autosave(version=0, fields={'body': "New body"})
+        self.assertEqual(response.status_code, 409)
+
+    def test_form_update_conflict_with_autosave(self):
+        self.autosave(version=0, fields={'body': "New body"})
+        response = self.client.post(
+            reverse('blog:update', kwargs={'pk': self.draft_post.pk}),
+            {'title': "Draft post", 'body': "Edited in the form", 'version': 0}
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, "modificato da qualcun altro", status_code=409)
+        self.assertEqual(Post.objects.get(pk=self.draft_post.pk).body, "New body")
+        response = self.client.post(
+            reverse('blog:update', kwargs={'pk': self.draft_post.pk}),
+            {'title': "Draft post", 'body': "Edited in the form", 'version': 1}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Post.objects.get(pk=self.draft_post.pk).version, 2)
+
+    def test_autosave_tags_untouched(self):
+        with CaptureQueriesContext(connection) as context:
+            self.autosave(version=0, fields={'body': "New body"})
+        self.assertFalse([query for query in context.captured_queries if 'blog_post_tags' in query['sql']])
+        self.assertQuerySetEqual(self.draft_post.tags.all(), [self.tag])
+
+    def test_autosave_tags_changed(self):
+        self.autosave(version=0, tags=["tag", "other"])
+        self.assertEqual(set(self.draft_post.tags.values_list('name', flat=True)), {"tag", "other"})
+
+    def test_autosave_invalid_field(self):
+        response = self.autosave(version=0, fields={'title': ""})
+        self.assertEqual(response.status_code, 400)
+        response = self.autosave(version=0, fields={'author': 1})
+        self.assertEqual(response.status_code, 400)
+        response = self.autosave(fields={'body': "New body"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_autosave_invalid_tags(self):
+        for tags in (5, "tag", ["tag", 5], {'name': "tag"}):
+            with self.subTest(tags=tags):
+                response = self.autosave(version=0, tags=tags)
+                self.assertEqual(response.status_code, 400)
+                response = self.autosave(reverse('blog:autosave_create'), fields={'title': "New", 'body': "Body"}, tags=tags)
+                self.assertEqual(response.status_code, 400)
+        self.assertQuerySetEqual(self.draft_post.tags.all(), [self.tag])
+
+    def test_autosave_another_users_post(self):
+        post = Post.objects.create(
+            title="Other", body="Body",
+            author=get_user_model().objects.create(username="other", password="other")
+        )
+        response = self.autosave(reverse('blog:autosave', kwargs={'pk': post.pk}), version=0, fields={'body': "New"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Post.objects.get(pk=post.pk).body, "Body")
+
+    def test_autosave_create_then_submit(self):
+        count = Post.objects.count()
+        response = self.autosave(
+            reverse('blog:autosave_create'),
+            fields={'title': "New post", 'body': "Body"},
+            tags=["tag"]
+        )
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()['pk']
+        self.assertTrue(Post.objects.get(pk=pk).is_draft())
+        # Submitting the create form saves the autosaved draft
+        self.client.post(
+            reverse('blog:create'),
+            {'title': "New post", 'body': "Final body", 'submit': 'publish', 'autosaved': pk}
+        )
+        self.assertEqual(Post.objects.count(), count + 1)
+        post = Post.objects.get(pk=pk)
+        self.assertEqual(post.body, "Final body")
+        self.assertTrue(post.is_published())
+
+    def test_autosave_published_post_kept_apart(self):
+        from . models import PostAutosave
+        url = reverse('blog:autosave', kwargs={'pk': self.pub_post.pk})
+        update_date = self.pub_post.update_date
+        response = self.autosave(url, version=0, fields={'body': "Unsaved body"}, tags=["tag"])
+        self.assertEqual(response.json()['status'], 'saved')
+        self.assertEqual(response.json()['version'], 0)
+        post = Post.objects.get(pk=self.pub_post.pk)
+        self.assertEqual(post.body, "Body of published post")
+        self.assertEqual(post.update_date, update_date)
+        self.assertEqual(post.version, 0)
+        self.assertEqual(self.client.get(post.get_absolute_url()).context['post'].body, "Body of published post")
+        # Merged with the next changes
+        cache.delete(f"django_blog:autosave_lock:{post.pk}")
+        self.autosave(url, version=0, fields={'title': "Unsaved title"})
+        pending = PostAutosave.objects.get(post=post)
+        self.assertEqual(pending.fields, {'body': "Unsaved body", 'title': "Unsaved title"})
+        self.assertEqual(pending.tags, ["tag"])
+
+        # The form starts from them, and saving it applies them
+        response = self.client.get(reverse('blog:update', kwargs={'pk': post.pk}))
+        self.assertEqual(response.context['form']['body'].value(), "Unsaved body")
+        self.assertEqual(response.context['post_tags'], [{'name': "tag"}])
+        self.client.post(
+            reverse('blog:update', kwargs={'pk': post.pk}),
+            {'title': "Unsaved title", 'body': "Unsaved body", 'tags': ["tag"], 'version': 0}
+        )
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.body, "Unsaved body")
+        self.assertEqual(post.version, 1)
+        response = self.client.get(reverse('blog:update', kwargs={'pk': post.pk}))
+        self.assertEqual(response.context['form']['body'].value(), "Unsaved body")
+        self.assertFalse(response.context['autosave_pending'])
+
+    def test_autosave_published_post_changed_back(self):
+        from . models import PostAutosave
+        url = reverse('blog:autosave', kwargs={'pk': self.pub_post.pk})
+        self.autosave(url, version=0, fields={'body': "Unsaved body"})
+        cache.delete(f"django_blog:autosave_lock:{self.pub_post.pk}")
+        self.autosave(url, version=0, fields={'body': "Body of published post"})
+        self.assertFalse(PostAutosave.objects.exists())
+
+
+class PostIsLiveTest(PostPopulatedTestCase):
+    def test_is_live_on_save(self):
+        self.assertTrue(self.pub_post.is_live)
+        self.assertFalse(self.future_post.is_live)
+        self.assertFalse(self.draft_post.is_live)
+
+    def test_is_live_on_publish(self):
+        self.draft_post.publish()
+        self.assertTrue(Post.objects.get(pk=self.draft_post.pk).is_live)
+
+    def test_is_live_cleared_on_reschedule(self):
+        self.pub_post.pub_date = now() + datetime.timedelta(days=1)
+        self.pub_post.save(update_fields=['pub_date'])
+        self.assertFalse(Post.objects.get(pk=self.pub_post.pk).is_live)
+        self.assertEqual(Post.published_objects.count(), 0)
+
+    def test_published_objects_fallback_for_passed_schedule(self):
+        Post.objects.filter(pk=self.future_post.pk).update(pub_date=now() - datetime.timedelta(minutes=1))
+        self.assertQuerySetEqual(
+            Post.published_objects.order_by('pk'),
+            [self.pub_post, self.future_post]
+        )
+
+    def test_publish_scheduled_command(self):
+        Post.objects.filter(pk=self.future_post.pk).update(pub_date=now() - datetime.timedelta(minutes=1))
+        out = StringIO()
+        call_command('publish_scheduled', stdout=out)
+        self.assertIn("Published 1 scheduled posts", out.getvalue())
+        self.assertTrue(Post.objects.get(pk=self.future_post.pk).is_live)
+        self.assertFalse(Post.objects.get(pk=self.draft_post.pk).is_live)
+
+    def test_publish_scheduled_invalidates_listings(self):
+        cache.clear()
+        self.client.get(reverse('blog:list'))
+        Post.objects.filter(pk=self.future_post.pk).update(pub_date=now() - datetime.timedelta(minutes=1))
+        call_command('publish_scheduled', stdout=StringIO())
+        response = self.client.get(reverse('blog:list'))
+        self.assertContains(response, "Future post")
+
+    def test_bulk_operations_set_is_live(self):
+        user = get_user_model().objects.create(username="test", password="test")
+        self.client.force_login(user)
+        self.client.post(reverse('blog:bulk'), {'operation': 'publish', 'ids': [self.draft_post.pk]})
+        self.assertTrue(Post.objects.get(pk=self.draft_post.pk).is_live)
+        self.client.post(reverse('blog:bulk'), {'operation': 'unpublish', 'ids': [self.pub_post.pk]})
+        self.assertFalse(Post.objects.get(pk=self.pub_post.pk).is_live)
+
+
+# Pages are exported with the host of DJANGO_BLOG_EXPORT_HOST
+@override_settings(ALLOWED_HOSTS=['localhost'])
+class StaticExportTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        self.user = get_user_model().objects.create(username="author", password="test")
+        self.tag = Tag.objects.create(name="Tag")
+        self.posts = []
+        for i in range(3):
+            post = Post.objects.create(
+                title=f"Post {i}",
+                body="Body",
+                pub_date=now() - datetime.timedelta(days=3 - i),
+                author=self.user
+            )
+            self.posts.append(post)
+        self.posts[0].tags.add(self.tag)
+        self.draft = Post.objects.create(title="Draft post", body="Body")
+
+    def export(self, **options):
+        out = StringIO()
+        call_command('export_static', self.output_dir, workers=1, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def path(self, url, name='index.html'):
+        return os.path.join(self.output_dir, url.lstrip('/'), name)
+
+    def test_full_export(self):
+        self.export()
+        for post in self.posts:
+            self.assertTrue(os.path.exists(self.path(post.get_absolute_url())))
+        self.assertFalse(os.path.exists(self.path(self.draft.get_absolute_url())))
+        self.assertTrue(os.path.exists(self.path(self.tag.get_absolute_url())))
+        self.assertTrue(os.path.exists(self.path(reverse('blog:feed_rss'), 'index.xml')))
+        self.assertTrue(os.path.exists(self.path(reverse('blog:feed_json'), 'index.json')))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, reverse('blog:sitemap').lstrip('/'))))
+
+        path = self.path(self.posts[0].get_absolute_url())
+        with open(path, 'rb') as f, gzip.open(path + '.gz') as compressed:
+            content = f.read()
+            self.assertIn(b"Post 0", content)
+            self.assertEqual(compressed.read(), content)
+
+    def test_list_pages(self):
+        for i in range(3):
+            Post.objects.create(title=f"Other post {i}", body="Body", pub_date=now())
+        self.export()
+        self.assertTrue(os.path.exists(self.path(reverse('blog:list') + 'page/2/')))
+
+    def test_nothing_to_rebuild(self):
+        self.export()
+        self.assertIn("Rendered 0 pages", self.export())
+
+    def test_incremental_export(self):
+        self.export()
+        post = self.posts[0]
+        post.title = "Changed title"
+        post.save()
+
+        out = self.export()
+        self.assertNotIn("Rendered 0 pages", out)
+        with open(self.path(post.get_absolute_url()), 'rb') as f:
+            self.assertIn(b"Changed title", f.read())
+        with open(self.path(self.tag.get_absolute_url()), 'rb') as f:
+            self.assertIn(b"Changed title", f.read())
+
+    def test_unpublished_post_and_unused_tag_are_removed(self):
+        self.export()
+        post = self.posts[0]
+        post.pub_date = None
+        post.save()
+        self.export()
+        self.assertFalse(os.path.exists(self.path(post.get_absolute_url())))
+        self.assertFalse(os.path.exists(self.path(self.tag.get_absolute_url())))
+
+    def test_author_pages(self):
+        self.export()
+        with open(self.path(self.posts[0].get_absolute_url())) as f:
+            link = re.search(r'Author: <a href="([^"]+)"', f.read()).group(1)
+        self.assertEqual(link, reverse('blog:list_by_author', args=[self.user.pk]))
+        with open(self.path(link)) as f:
+            self.assertIn("Post 2", f.read())
+        with open(self.path(reverse('blog:author_list'))) as f:
+            self.assertIn(link, f.read())
+
+        # Removed with the last published post of the author
+        Post.objects.filter(author=self.user).update(pub_date=None, is_live=False)
+        self.export()
+        self.assertFalse(os.path.exists(self.path(link)))
+
+    def test_failed_pages(self):
+        from . public_views import PostDetailView
+        failing = self.posts[1].get_absolute_url()
+        get_object = PostDetailView.get_object
+
+        def get_object_or_fail(view, *args, **kwargs):
+            if view.request.path == failing:
+                raise RuntimeError("Broken page")
+            return get_object(view, *args, **kwargs)
+
+        with mock.patch.object(PostDetailView, 'get_object', get_object_or_fail), \
+                self.assertLogs('django.request', 'ERROR'), \
+                self.assertRaisesMessage(CommandError, "1 pages could not be rendered"):
+            self.export()
+        # The other pages are exported, the failed one is retried next time
+        self.assertFalse(os.path.exists(self.path(failing)))
+        self.assertTrue(os.path.exists(self.path(self.posts[2].get_absolute_url())))
+        self.assertTrue(os.path.exists(self.path(reverse('blog:feed_rss'), 'index.xml')))
+        self.export()
+        self.assertTrue(os.path.exists(self.path(failing)))
+
+    def test_tag_membership_change(self):
+        self.export()
+        # Tags are changed without touching the update date of the post
+        self.posts[1].tags.add(self.tag)
+        self.export()
+        with open(self.path(self.tag.get_absolute_url()), 'rb') as f:
+            self.assertIn(b"Post 1", f.read())
+
+
+class ReadOnlyUrls:
+    urlpatterns = [path('blog/', include('django_blog.urls_public'))]
+
+
+@override_settings(ROOT_URLCONF=ReadOnlyUrls)
+class ReadOnlyModeTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = get_user_model().objects.create(username="author", password="test")
+        self.post = Post.objects.create(title="Post", body="Body", pub_date=now(), author=self.user)
+
+    def test_public_pages(self):
+        self.assertContains(self.client.get(reverse('blog:list')), "Post")
+        self.assertContains(self.client.get(self.post.get_absolute_url()), "Post")
+        self.assertEqual(self.client.get(reverse('blog:feed_rss')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('blog:sitemap')).status_code, 200)
+
+    def test_editing_links_hidden_for_authors(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('blog:list'))
+        self.assertNotContains(response, "Nuovo post")
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertNotContains(response, "Modifica")
+
+    def test_editing_routes_missing(self):
+        self.assertEqual(self.client.get(f"/blog/post/{self.post.pk}/update/").status_code, 404)
+
+
+class WarmCacheTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.tag = Tag.objects.create(name="Popular")
+        other_tag = Tag.objects.create(name="Other")
+        self.posts = [
+            Post.objects.create(title=f"Post {i}", body="Body", pub_date=now() - datetime.timedelta(days=i))
+            for i in range(3)
+        ]
+        for post in self.posts:
+            post.tags.add(self.tag)
+        self.posts[0].tags.add(other_tag)
+        Post.objects.create(title="Draft post", body="Body")
+
+    def test_urls(self):
+        from . warmup import get_urls
+        urls = get_urls(list_pages=3, tags=1, posts=2)
+        self.assertEqual(urls[0], reverse('blog:list'))
+        self.assertIn(reverse('blog:feed_rss'), urls)
+        self.assertIn(self.tag.get_absolute_url(), urls)
+        self.assertEqual(
+            urls[-2:],
+            [self.posts[0].get_absolute_url(), self.posts[1].get_absolute_url()]
+        )
+        self.assertEqual(len(urls), 1 + 3 + 1 + 2)
+
+    @override_settings(ALLOWED_HOSTS=['localhost', 'testserver'])
+    def test_command_fills_caches(self):
+        out = StringIO()
+        call_command('warm_cache', workers=1, stdout=out)
+        self.assertIn("Warmed", out.getvalue())
+        self.assertIn("0 failed", out.getvalue())
+        # Only the exact count of the paginator, which is not cached by default
+        with self.assertNumQueries(1):
+            self.client.get(reverse('blog:list'))
+
+    def test_budget(self):
+        out = StringIO()
+        call_command('warm_cache', workers=1, budget=0, stdout=out)
+        self.assertIn("Warmed 0 pages", out.getvalue())
+
+
+class StampedeProtectionTest(TestCase):
+    key = 'django_blog:test'
+
+    def setUp(self) -> None:
+        cache.clear()
+        blog_cache.reset_metrics()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def get(self, **kwargs):
+        kwargs.setdefault('timeout', 60)
+        return blog_cache.get_or_compute(self.key, self.compute, name='test', **kwargs)
+
+    def test_computed_once(self):
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 1)
+        metrics = blog_cache.get_metrics()['test']
+        self.assertEqual((metrics['miss'], metrics['hit'], metrics['compute']), (1, 1, 1))
+
+    def test_version_change(self):
+        self.get(version=1)
+        self.assertEqual(self.get(version=2), 2)
+
+    def test_early_refresh(self):
+        # A value that took long to compute is refreshed well before it expires
+        blog_cache.get_cache().set(self.key, ('old', None, 1000.0, time.time() + 10), 60)
+        # The draw is random: a draw near 0 would keep the value
+        with mock.patch('django_blog.cache.random.random', return_value=0.5):
+            self.assertEqual(self.get(), 1)
+        self.assertEqual(blog_cache.get_metrics()['test']['early'], 1)
+
+    def test_stale_value_served_during_recompute(self):
+        self.get(timeout=-1)
+        # Another worker is recomputing the value
+        blog_cache.get_cache().add(f"{self.key}:lock", 1)
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(blog_cache.get_metrics()['test']['stale'], 1)
+
+    def test_expired_value_recomputed(self):
+        self.get(timeout=-1)
+        self.assertEqual(self.get(), 2)
+        self.assertFalse(blog_cache.get_cache().get(f"{self.key}:lock"))
+
+    def test_file_based_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'file': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }
+        with self.settings(CACHES=caches_setting, DJANGO_BLOG_CACHE='file'):
+            self.assertEqual(self.get(version=1), 1)
+            self.assertEqual(self.get(version=1), 1)
+            self.assertEqual(self.get(version=2), 2)
+
+    def test_sidebar_tags_cached(self):
+        tag = Tag.objects.create(name="Tag")
+        post = Post.objects.create(title="Post", body="Body", pub_date=now())
+        post.tags.add(tag)
+        response = self.client.get(reverse('blog:list'))
+        self.assertEqual(list(response.context['tags']), [tag])
+        self.assertEqual(blog_cache.get_metrics()['sidebar_tags']['compute'], 1)
+
+
+@override_settings(MIDDLEWARE=[
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django_blog.profiling.ProfilingMiddleware',
+])
+class ProfilingTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.staff = get_user_model().objects.create(username="staff", is_staff=True)
+        self.user = get_user_model().objects.create(username="user")
+        self.post = Post.objects.create(title="Post", body="Body", pub_date=now())
+
+    def get_reports(self):
+        from . profiling import get_storage
+        return get_storage().list()
+
+    def test_not_profiled_by_default(self):
+        response = self.client.get(reverse('blog:list'))
+        self.assertNotIn('X-Blog-Profile-Id', response)
+        self.assertEqual(self.get_reports(), [])
+
+    def test_profiled_with_token(self):
+        from . profiling import make_token
+        self.client.force_login(self.staff)
+        response = self.client.get(self.post.get_absolute_url(), {'_profile': make_token(self.staff)})
+        self.assertEqual(response.status_code, 200)
+        [report] = self.get_reports()
+        self.assertEqual(report['id'], response['X-Blog-Profile-Id'])
+        self.assertEqual(report['view'], 'blog:detail')
+        self.assertTrue(any('blog_post' in query['sql'] for query in report['queries']))
+        self.assertEqual(report['templates'][0]['name'], 'blog/post_detail.html')
+        self.assertIn('function calls', report['profile'])
+
+    def test_token_of_non_staff_user_ignored(self):
+        from . profiling import make_token
+        self.client.force_login(self.user)
+        self.client.get(reverse('blog:list'), HTTP_X_BLOG_PROFILE=make_token(self.user))
+        self.client.get(reverse('blog:list'), HTTP_X_BLOG_PROFILE="invalid")
+        self.assertEqual(self.get_reports(), [])
+
+    def test_streamed_feed_profiled(self):
+        from . import profiling
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1):
+            response = self.client.get(reverse('blog:feed_rss'))
+            self.assertEqual(self.get_reports(), [])
+            b''.join(response.streaming_content)
+        [report] = self.get_reports()
+        self.assertEqual(report['view'], 'blog:feed_rss')
+        self.assertTrue(report['queries'])
+
+    def test_another_profiler_active(self):
+        import cProfile
+        from django.db import connection
+        from . import profiling
+
+        class BusyProfile(cProfile.Profile):
+            # As on Python 3.12+ while another request is profiled
+            enabled = 0
+
+            def enable(self, *args, **kwargs):
+                BusyProfile.enabled += 1
+                if BusyProfile.enabled > self.available:
+                    raise ValueError("Another profiling tool is already active")
+                super().enable(*args, **kwargs)
+
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1), mock.patch.object(cProfile, 'Profile', BusyProfile):
+            BusyProfile.available = 0
+            response = self.client.get(reverse('blog:list'))
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Blog-Profile-Id', response)
+            self.assertEqual(connection.execute_wrappers, [])
+            self.assertIsNone(profiling._session.get())
+            # Busy only after the view
+            BusyProfile.enabled = 0
+            BusyProfile.available = 1
+            response = self.client.get(reverse('blog:feed_rss'))
+            self.assertIn(self.post.title, b''.join(response.streaming_content).decode())
+        [report] = self.get_reports()
+        self.assertEqual(report['view'], 'blog:feed_rss')
+
+    def test_file_storage(self):
+        from . import profiling
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1), mock.patch.object(profiling, 'PROFILE_DIR', directory):
+            response = self.client.get(reverse('blog:list'))
+            self.assertEqual(profiling.get_storage().get(response['X-Blog-Profile-Id'])['status'], 200)
+
+    def test_reports_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('blog:profile_list')).status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('blog:profile_list'))
+        self.assertContains(response, "_profile=")
+
+
+@override_settings(MIDDLEWARE=[
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django_blog.slowqueries.SlowQueryMiddleware',
+])
+class SlowQueryLogTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        tag = Tag.objects.create(name="Tag")
+        for i in range(3):
+            Post.objects.create(title=f"Post {i}", body="Body", pub_date=now()).tags.add(tag)
+
+    def test_normalize_sql(self):
+        from . slowqueries import normalize_sql
+        self.assertEqual(
+            normalize_sql("SELECT *  FROM t\nWHERE id IN (%s, %s, %s) AND n = 'a' LIMIT 10"),
+            "SELECT * FROM t WHERE id IN (%s, ...) AND n = ? LIMIT ?"
+        )
+
+    def test_queries_over_threshold_grouped(self):
+        from . import slowqueries
+        first, second = Post.objects.all()[:2]
+        with mock.patch.object(slowqueries, 'THRESHOLD', 0), self.assertLogs('django_blog.slowqueries'):
+            self.client.get(first.get_absolute_url())
+            self.client.get(second.get_absolute_url())
+        groups = slowqueries.get_groups()
+        self.assertEqual({group['view'] for group in groups}, {'blog:detail'})
+        # The same query for two different posts
+        self.assertTrue(any(group['count'] == 2 for group in groups))
+        # EXPLAIN QUERY PLAN on SQLite
+        self.assertTrue(any(group['plan'] for group in groups))
+
+        out = StringIO()
+        call_command('slow_queries', stdout=out)
+        self.assertIn('blog:detail', out.getvalue())
+
+    def test_fast_queries_not_logged(self):
+        from . import slowqueries
+        self.client.get(reverse('blog:list'))
+        self.assertEqual(slowqueries.get_groups(), [])
+
+    def test_streamed_feed(self):
+        from . import slowqueries
+        with mock.patch.object(slowqueries, 'THRESHOLD', 0), self.assertLogs('django_blog.slowqueries'):
+            response = self.client.get(reverse('blog:feed_rss'))
+            b''.join(response.streaming_content)
+        self.assertEqual({group['view'] for group in slowqueries.get_groups()}, {'blog:feed_rss'})
+
+
+class LoadTestTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        tag = Tag.objects.create(name="Tag")
+        Post.objects.create(title="Post", body="Body", pub_date=now()).tags.add(tag)
+
+    @override_settings(ALLOWED_HOSTS=['localhost', 'testserver'])
+    def test_workers(self):
+        from . loadtest import LoadTest, PREFIX
+        test = LoadTest(readers=1, writers=1, seed=1)
+        test.setup()
+        test.run_worker(0, requests=20)
+        test.run_worker(1, requests=20)
+        report = test.report()
+        self.assertIn('create', report)
+        self.assertEqual(sum(summary['requests'] for summary in report.values()), 40)
+        self.assertEqual(sum(summary['errors'] for summary in report.values()), 0)
+        self.assertTrue(Post.objects.filter(title__startswith=PREFIX).exists())
+
+        test.cleanup()
+        self.assertFalse(Post.objects.filter(title__startswith=PREFIX).exists())
+        self.assertFalse(Tag.objects.filter(name__startswith=PREFIX).exists())
+
+    @override_settings(ALLOWED_HOSTS=['localhost', 'testserver'])
+    def test_cleanup_keeps_existing_data(self):
+        from . loadtest import LoadTest, PREFIX
+        user = get_user_model().objects.create(username=f"{PREFIX}0")
+        tag = Tag.objects.create(name=f"{PREFIX}unused")
+        post = Post.objects.create(title=f"{PREFIX}post", body="Body", author=user)
+        post.tags.add(Tag.objects.create(name=f"{PREFIX}0"))
+        test = LoadTest(readers=0, writers=2, seed=1)
+        test.setup()
+        test.run_worker(0, requests=10)
+        test.run_worker(1, requests=10)
+        self.assertTrue(test.created_posts)
+
+        test.cleanup()
+        self.assertEqual(list(Post.objects.filter(title__startswith=PREFIX)), [post])
+        self.assertEqual(set(Tag.objects.filter(name__startswith=PREFIX)), {tag, *post.tags.all()})
+        self.assertEqual(list(get_user_model().objects.filter(username__startswith=PREFIX)), [user])
+
+    def test_percentile(self):
+        from . loadtest import percentile
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.99), 0)
+
+
+class TagMergeTest(TestCase):
+    def setUp(self) -> None:
+        self.python = Tag.objects.create(name="Python")
+        self.py = Tag.objects.create(name="py")
+        self.django = Tag.objects.create(name="django")
+        self.both = Post.objects.create(title="Both", body="Body", pub_date=now())
+        self.both.tags.add(self.python, self.py)
+        self.only_py = Post.objects.create(title="Only py", body="Body", pub_date=now())
+        self.only_py.tags.add(self.py)
+        self.other = Post.objects.create(title="Other", body="Body", pub_date=now())
+        self.other.tags.add(self.django)
+
+    def test_merge(self):
+        from . tagmerge import apply_mapping
+        report = apply_mapping([("py", "python")])
+        self.assertEqual(report, {'renamed': 0, 'merged': 1, 'posts': 2})
+        self.assertFalse(Tag.objects.filter(pk=self.py.pk).exists())
+        # No duplicated pairs for the post that had both tags
+        self.assertEqual(list(self.both.tags.all()), [self.python])
+        self.assertEqual(list(self.only_py.tags.all()), [self.python])
+        self.assertEqual(Post.tags.through.objects.filter(tag=self.python).count(), 2)
+
+    def test_rename(self):
+        from . tagmerge import apply_mapping
+        report = apply_mapping([("django", "Django Framework")])
+        self.assertEqual(report['renamed'], 1)
+        self.django.refresh_from_db()
+        self.assertEqual(self.django.name, "Django Framework")
+        self.assertEqual(self.django.slug, "django-framework")
+        self.assertEqual(list(self.other.tags.all()), [self.django])
+
+    def test_chain_and_cycle(self):
+        from . tagmerge import apply_mapping, TagMappingError
+        with self.assertRaises(TagMappingError):
+            apply_mapping([("py", "django"), ("django", "py")])
+        apply_mapping([("py", "django"), ("django", "python")])
+        self.assertEqual(list(Tag.objects.values_list('name', flat=True)), ["Python"])
+        self.assertEqual(list(self.other.tags.all()), [self.python])
+
+    def test_dry_run(self):
+        from . tagmerge import apply_mapping
+        report = apply_mapping([("py", "python")], dry_run=True)
+        self.assertEqual(report['posts'], 2)
+        self.assertTrue(Tag.objects.filter(pk=self.py.pk).exists())
+        self.assertEqual(self.only_py.tags.get(), self.py)
+
+    @override_settings(DJANGO_BLOG_TAG_INDEX=True)
+    def test_refresh(self):
+        from . tagmerge import apply_mapping
+        before = Post.objects.get(pk=self.only_py.pk).update_date
+        received = []
+
+        def receiver(sender, post_ids, **kwargs):
+            received.append(set(post_ids))
+        posts_changed.connect(receiver)
+        self.addCleanup(posts_changed.disconnect, receiver)
+        apply_mapping([("py", "python")], batch_size=1)
+        # Once per batch of posts
+        self.assertEqual(received, [{self.both.pk}, {self.only_py.pk}])
+        self.assertGreater(Post.objects.get(pk=self.only_py.pk).update_date, before)
+        self.assertEqual(
+            list(TagPostIndex.objects.filter(post=self.only_py).values_list('tag_id', flat=True)),
+            [self.python.pk]
+        )
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "tags.csv")
+        with open(path, 'w') as f:
+            f.write("source,target\npy,Python\ndjango,Django\n")
+        out = StringIO()
+        call_command('merge_tags', path, stdout=out)
+        self.assertIn("1 tags merged, 1 renamed", out.getvalue())
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ["Django", "Python"])
+
+    def test_admin_action(self):
+        user = get_user_model().objects.create_superuser(username="admin", password="password")
+        self.client.force_login(user)
+        url = reverse('admin:blog_tag_changelist')
+        data = {'action': 'merge_tags', '_selected_action': [self.python.pk, self.py.pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'value="py"')
+
+        response = self.client.post(url, {**data, 'apply': 'Unisci', 'target': "Python 3"})
+        self.assertRedirects(response, url)
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ["Python 3", "django"])
+        self.assertEqual(self.only_py.tags.get().name, "Python 3")
+
+
+class TagPruneTest(TestCase):
+    def setUp(self) -> None:
+        old = now() - datetime.timedelta(days=2)
+        self.used = Tag.objects.create(name="Used", created=old)
+        self.orphan = Tag.objects.create(name="Orphan", created=old)
+        self.draft_only = Tag.objects.create(name="Draft only", created=old)
+        self.recent = Tag.objects.create(name="Recent")
+        Post.objects.create(title="Post", body="Body", pub_date=now()).tags.add(self.used)
+        self.draft = Post.objects.create(title="Draft", body="Body")
+        self.draft.tags.add(self.draft_only)
+
+    def test_prune(self):
+        from . tagprune import prune
+        report = prune(include_drafts=False)
+        self.assertEqual(report, {'tags': ["Orphan"], 'posts': 0})
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ["Draft only", "Recent", "Used"])
+
+    def test_prune_drafts(self):
+        from . tagprune import prune
+        report = prune(include_drafts=True, batch_size=1)
+        self.assertEqual(sorted(report['tags']), ["Draft only", "Orphan"])
+        self.assertEqual(report['posts'], 1)
+        self.assertFalse(self.draft.tags.exists())
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ["Recent", "Used"])
+
+    def test_grace_period(self):
+        from . tagprune import prune
+        report = prune(include_drafts=False, grace_period=0)
+        self.assertEqual(sorted(report['tags']), ["Orphan", "Recent"])
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('prune_tags', '--dry-run', '--include-drafts', verbosity=2, stdout=out)
+        self.assertIn("Would delete 2 tags, used by 1 drafts", out.getvalue())
+        self.assertIn("Orphan", out.getvalue())
+        self.assertEqual(Tag.objects.count(), 4)
+
+    def test_used_again(self):
+        from . import tagprune
+        # A tag added to a post after the orphans were found is kept
+        get_orphans = tagprune.get_orphans
+        calls = []
+
+        def get_orphans_and_use(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                Post.objects.get(title="Post").tags.add(self.orphan)
+            return get_orphans(*args)
+
+        with mock.patch.object(tagprune, 'get_orphans', get_orphans_and_use):
+            report = tagprune.prune(include_drafts=False)
+        self.assertEqual(report['tags'], [])
+        self.assertTrue(Tag.objects.filter(pk=self.orphan.pk).exists())
+
+
+    def test_tags_locked_when_used(self):
+        from django.db.models import QuerySet
+        # Pruning waits for the tags being added to posts
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True,
+                               side_effect=select_for_update) as locked:
+            tags = Tag.objects.get_or_create_many(["Orphan", "New"])
+        self.assertEqual(sorted(tag.name for tag in tags), ["New", "Orphan"])
+        self.assertEqual(locked.call_count, 2)
+
+    def test_exclude_drafts_option(self):
+        from . import tagprune
+        out = StringIO()
+        with mock.patch.object(tagprune, 'PRUNE_DRAFT_TAGS', True):
+            call_command('prune_tags', '--dry-run', '--no-include-drafts', stdout=out)
+        self.assertIn("Would delete 1 tags", out.getvalue())
+
+class StaticAssetsTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create(username="test", password="test")
+
+    def test_no_third_party_origin(self):
+        response = self.client.get(reverse('blog:list'))
+        self.assertNotContains(response, "cdn.jsdelivr.net")
+        self.assertContains(response, '/static/blog/vendor/bootstrap/css/bootstrap.min.css')
+        self.assertContains(response, 'rel="preload"')
+        # Editor scripts only on editor pages
+        self.assertNotContains(response, "addtags.js")
+
+    def test_pages_with_manifest_storage(self):
+        from . assets import ASSETS
+        source = tempfile.mkdtemp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, root)
+        # The manifest needs the vendored files
+        for asset in ASSETS:
+            path = os.path.join(source, 'blog', 'vendor', *asset.path.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write("\n")
+        with override_settings(
+            DEBUG=False,
+            STATIC_ROOT=root,
+            STATICFILES_DIRS=[source],
+            STORAGES={'staticfiles': {'BACKEND': 'django_blog.storage.CompressedManifestStaticFilesStorage'}},
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            response = self.client.get(reverse('blog:list'))
+            self.assertEqual(response.status_code, 200)
+            self.client.force_login(self.user)
+            response = self.client.get(reverse('blog:create'))
+            self.assertEqual(response.status_code, 200)
+            self.assertRegex(response.content.decode(), r'/static/blog/js/addtags\.[0-9a-f]{12}\.js')
+
+    def test_editor_scripts(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('blog:create'))
+        self.assertContains(response, '<script src="/static/blog/js/addtags.js"></script>')
+        self.assertNotContains(response, '<script src="static">')
+
+    def test_asset_integrity(self):
+        from . assets import Asset
+        asset = Asset('style.css', 'sha384-' + base64.b64encode(hashlib.sha384(b"body").digest()).decode())
+        self.assertTrue(asset.check(b"body"))
+        self.assertFalse(asset.check(b"other"))
+
+    def test_vendored_assets_check(self):
+        from . assets import Asset
+        from . checks import check_vendored_assets
+        vendor = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, vendor)
+        assets = [
+            Asset('style.css', 'sha384-' + base64.b64encode(hashlib.sha384(b"body").digest()).decode()),
+            Asset('style.css.map'),
+        ]
+        with mock.patch('django_blog.assets.VENDOR_DIR', vendor), \
+                mock.patch('django_blog.assets.ASSETS', assets):
+            self.assertEqual([error.id for error in check_vendored_assets(None)],
+                             ['django_blog.E001', 'django_blog.E001'])
+            with open(os.path.join(vendor, 'style.css'), 'wb') as f:
+                f.write(b"other")
+            with open(os.path.join(vendor, 'style.css.map'), 'wb') as f:
+                f.write(b"{}")
+            self.assertEqual([error.id for error in check_vendored_assets(None)], ['django_blog.E002'])
+            with open(os.path.join(vendor, 'style.css'), 'wb') as f:
+                f.write(b"body")
+            self.assertEqual(check_vendored_assets(None), [])
+
+    def test_compressed_storage(self):
+        source = tempfile.mkdtemp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, root)
+        os.makedirs(os.path.join(source, 'site'))
+        with open(os.path.join(source, 'site', 'style.css'), 'w') as f:
+            f.write("body { margin: 0; }\n" * 100)
+        with open(os.path.join(source, 'site', 'small.css'), 'w') as f:
+            f.write("p { margin: 0; }\n")
+
+        with override_settings(
+            STATIC_ROOT=root,
+            STATICFILES_DIRS=[source],
+            STORAGES={'staticfiles': {'BACKEND': 'django_blog.storage.CompressedManifestStaticFilesStorage'}},
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            name = staticfiles_storage.stored_name('site/style.css')
+            self.assertRegex(name, r'^site/style\.[0-9a-f]{12}\.css$')
+            with gzip.open(os.path.join(root, name + '.gz')) as f:
+                self.assertEqual(f.read().decode(), "body { margin: 0; }\n" * 100)
+            small = staticfiles_storage.stored_name('site/small.css')
+            self.assertFalse(os.path.exists(os.path.join(root, small + '.gz')))
+
+
+@override_settings(DJANGO_BLOG_REVISIONS=True)
+class RevisionTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create(username="test", password="test")
+        self.body = "\n".join(f"<p>Paragraph {index} of the body</p>" for index in range(200))
+        self.post = Post.objects.create(title="Post", body=self.body, author=self.user)
+
+    def edit(self, **fields):
+        for name, value in fields.items():
+            setattr(self.post, name, value)
+        self.post.save()
+
+    def test_diff(self):
+        from . revisions import diff_body, patch_body
+        new = self.body.replace("Paragraph 10 ", "Changed paragraph ") + "<p>End</p>"
+        ops = diff_body(self.body, new)
+        self.assertEqual(patch_body(self.body, ops), new)
+        self.assertLess(len(json.dumps(ops)), len(new) // 10)
+        self.assertEqual(patch_body(self.body, diff_body(self.body, "")), "")
+
+    def test_record(self):
+        from . revisions import get_state
+        self.edit(title="New title")
+        # Saving with no changes records nothing
+        self.edit()
+        self.post.tags.add(Tag.objects.create(name="Tag"))
+        revisions = list(self.post.revisions.order_by('number').select_related('snapshot'))
+        self.assertEqual([revision.number for revision in revisions], [1, 2, 3])
+        self.assertTrue(revisions[0].is_snapshot())
+        self.assertEqual(revisions[1].snapshot, revisions[0])
+        # Deltas store the change, not the body
+        self.assertLess(len(revisions[1].data), len(revisions[0].data) // 4)
+        self.assertEqual(get_state(revisions[0])['title'], "Post")
+        self.assertEqual(get_state(revisions[1])['title'], "New title")
+        self.assertEqual(get_state(revisions[2])['tags'], ["Tag"])
+        self.assertEqual(get_state(revisions[2])['body'], self.body)
+
+    def test_record_concurrent(self):
+        from . import revisions
+        from . models import PostRevision
+        self.edit(title="New title")
+        # Changed without signals, while a concurrent save records number 3
+        Post.objects.filter(pk=self.post.pk).update(title="Later title")
+        state = {**revisions.get_states([self.post.pk])[self.post.pk], 'title': "Concurrent title"}
+        bulk_create = PostRevision.objects.bulk_create
+
+        def bulk_create_after_concurrent(objs, **kwargs):
+            if not PostRevision.objects.filter(number=3).exists():
+                bulk_create([PostRevision(post=self.post, number=3, digest=revisions.get_digest(state),
+                                          data=revisions.encode(state))])
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(PostRevision.objects, 'bulk_create', bulk_create_after_concurrent):
+            self.assertEqual(revisions.record([self.post.pk]), 1)
+        titles = [revisions.get_state(revision)['title']
+                  for revision in self.post.revisions.order_by('number').select_related('snapshot')]
+        self.assertEqual(titles, ["Post", "New title", "Concurrent title", "Later title"])
+
+    def test_reconstruct(self):
+        from . revisions import get_state, SNAPSHOT_INTERVAL
+        bodies = [self.body]
+        for index in range(SNAPSHOT_INTERVAL + 5):
+            body = bodies[-1].replace(f"Paragraph {index} ", f"Edited {index} ")
+            bodies.append(body)
+            self.edit(body=body)
+        revisions = list(self.post.revisions.order_by('number').select_related('snapshot'))
+        self.assertEqual([get_state(revision)['body'] for revision in revisions], bodies)
+        snapshots = [revision.number for revision in revisions if revision.is_snapshot()]
+        self.assertEqual(snapshots, [1, SNAPSHOT_INTERVAL + 1])
+
+    def test_update_view(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('blog:update', kwargs={'pk': self.post.pk}), {
+            'title': "Updated", 'body': self.body, 'tags': ["a", "b"], 'version': self.post.version,
+        })
+        # The post and its tags in one revision
+        self.assertEqual(self.post.revisions.count(), 2)
+
+    def test_restore_view(self):
+        self.edit(title="Bad edit", body="<p>Vandalized</p>")
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('blog:revisions', kwargs={'pk': self.post.pk}))
+        self.assertContains(response, reverse('blog:restore_revision', args=[self.post.pk, 1]))
+        response = self.client.post(reverse('blog:restore_revision', args=[self.post.pk, 1]))
+        self.assertRedirects(response, self.post.get_absolute_url(), fetch_redirect_response=False)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.title, self.post.body), ("Post", self.body))
+        self.assertEqual(self.post.revisions.count(), 3)
+
+    def test_restore_permission(self):
+        other = get_user_model().objects.create(username="other", password="other")
+        self.edit(title="Edit")
+        self.client.force_login(other)
+        self.client.post(reverse('blog:restore_revision', args=[self.post.pk, 1]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, "Edit")
+
+    def test_prune(self):
+        from . models import PostRevision
+        from . revisions import prune, get_state
+        for index in range(25):
+            self.edit(title=f"Title {index}")
+        PostRevision.objects.update(created=now() - datetime.timedelta(days=100))
+        self.assertEqual(prune(keep=3, days=90, dry_run=True), 22)
+        # The snapshot of the kept revisions is kept
+        self.assertEqual(prune(keep=3, days=90, batch_size=4), 22)
+        revisions = list(self.post.revisions.order_by('number').select_related('snapshot'))
+        self.assertEqual([revision.number for revision in revisions], [21, 24, 25, 26])
+        self.assertEqual(get_state(revisions[-1])['title'], "Title 24")
+        # Recent revisions are kept
+        self.edit(title="Recent")
+        self.assertEqual(prune(keep=0, days=90), 3)
+        revisions = list(self.post.revisions.order_by('number').select_related('snapshot'))
+        self.assertEqual([revision.number for revision in revisions], [21, 27])
+        self.assertEqual(get_state(revisions[-1])['title'], "Recent")
+
+    def test_prune_command(self):
+        out = StringIO()
+        call_command('prune_revisions', '--dry-run', stdout=out)
+        self.assertIn("Would delete 0 revisions", out.getvalue())
+        self.assertIn("History:", out.getvalue())
+
+    def test_delete_post(self):
+        from . models import PostRevision
+        self.edit(title="Edit")
+        self.post.delete()
+        self.assertFalse(PostRevision.objects.exists())
+
+
+class AuthorStatsTest(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create(username="test", password="test")
+        self.user2 = get_user_model().objects.create(username="test2", password="test")
+        self.posts = [
+            Post.objects.create(title=f"Post {index}", body="Body", author=self.user,
+                                pub_date=now() - datetime.timedelta(days=index + 1))
+            for index in range(3)
+        ]
+
+    def get_stats(self, user):
+        from . models import AuthorStats
+        return AuthorStats.objects.filter(author=user).values_list('post_count', 'last_pub_date').first()
+
+    def test_publish(self):
+        self.assertEqual(self.get_stats(self.user), (3, self.posts[0].pub_date))
+        draft = Post.objects.create(title="Draft", body="Body", author=self.user)
+        self.assertEqual(self.get_stats(self.user)[0], 3)
+        draft.pub_date = now() - datetime.timedelta(minutes=1)
+        draft.save()
+        self.assertEqual(self.get_stats(self.user), (4, draft.pub_date))
+        # Scheduled posts are not counted
+        draft.pub_date = now() + datetime.timedelta(days=1)
+        draft.save()
+        self.assertEqual(self.get_stats(self.user), (3, self.posts[0].pub_date))
+
+    def test_reassign_and_delete(self):
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.author = self.user2
+        post.save()
+        self.assertEqual(self.get_stats(self.user), (2, self.posts[1].pub_date))
+        self.assertEqual(self.get_stats(self.user2), (1, self.posts[0].pub_date))
+        post.delete()
+        self.assertIsNone(self.get_stats(self.user2))
+        self.assertEqual(self.get_stats(self.user)[0], 2)
+
+    def test_update_locks_rows(self):
+        from . authorstats import update_authors
+        from . models import AuthorStats
+        Post.objects.create(title="Draft", body="Body", author=self.user2)
+        with CaptureQueriesContext(connection) as context:
+            update_authors([self.user2.pk, self.user.pk])
+        # The row created to be locked is not kept for an author with no posts
+        self.assertEqual(list(AuthorStats.objects.values_list('author_id', flat=True)), [self.user.pk])
+        self.assertEqual(self.get_stats(self.user), (3, self.posts[0].pub_date))
+        if connection.features.has_select_for_update:
+            self.assertTrue(any('FOR UPDATE' in query['sql'] for query in context.captured_queries))
+
+    def test_bulk_update(self):
+        from . signals import batch_changes, notify_posts_changed
+        ids = [post.pk for post in self.posts[:2]]
+        Post.objects.filter(pk__in=ids).update(pub_date=None, is_live=False)
+        notify_posts_changed(ids)
+        # A new post changed in bulk in the same batch
+        with batch_changes():
+            post = Post.objects.create(title="New", body="Body", author=self.user2)
+            Post.objects.filter(pk=post.pk).update(pub_date=now(), is_live=True)
+            notify_posts_changed([post.pk])
+        self.assertEqual(self.get_stats(self.user2)[0], 1)
+        self.assertEqual(self.get_stats(self.user), (1, self.posts[2].pub_date))
+
+    def test_rebuild(self):
+        from . models import AuthorStats
+        AuthorStats.objects.all().delete()
+        AuthorStats.objects.create(author=self.user2, post_count=5, last_pub_date=now())
+        out = StringIO()
+        call_command('rebuild_author_stats', stdout=out)
+        self.assertIn("Updated the counts of 1 authors", out.getvalue())
+        self.assertEqual(self.get_stats(self.user), (3, self.posts[0].pub_date))
+        self.assertIsNone(self.get_stats(self.user2))
+
+    def test_author_list(self):
+        Post.objects.create(title="Other", body="Body", author=self.user2, pub_date=now())
+        # Session-less page: the stats with their authors
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('blog:author_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([stats.author for stats in response.context['authors']], [self.user2, self.user])
+        self.assertContains(response, reverse('blog:list_by_author', kwargs={'pk': self.user.pk}))
+
+    def test_list_by_author(self):
+        Post.objects.create(title="Other", body="Body", author=self.user2, pub_date=now())
+        response = self.client.get(reverse('blog:list_by_author', kwargs={'pk': self.user.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['author'], self.user)
+        self.assertEqual([post.title for post in response.context['posts']], ["Post 0", "Post 1", "Post 2"])
+        response = self.client.get(reverse('blog:list_by_author', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_detail_links_author(self):
+        response = self.client.get(self.posts[0].get_absolute_url())
+        self.assertContains(response, reverse('blog:list_by_author', kwargs={'pk': self.user.pk}))
+
+
+@override_settings(DJANGO_BLOG_TASKS='worker', DJANGO_BLOG_REVISIONS=True, DJANGO_BLOG_TAG_INDEX=True)
+class TaskQueueTest(TestCase):
+    def setUp(self) -> None:
+        self.post = Post.objects.create(title="Post", body="Body", pub_date=now())
+        self.post.tags.add(Tag.objects.create(name="Tag"))
+
+    def test_changes_queued(self):
+        from . models import PostChange, PostRevision
+        self.post.title = "New title"
+        self.post.save()
+        # Merged into one row per post, nothing derived yet
+        self.assertEqual(list(PostChange.objects.values_list('post_id', flat=True)), [self.post.pk])
+        self.assertFalse(PostRevision.objects.exists())
+        self.assertFalse(TagPostIndex.objects.exists())
+
+    def test_run_pending(self):
+        from . models import PostChange
+        from . import tasks
+        self.post.title = "New title"
+        self.post.save()
+        other = Post.objects.create(title="Other", body="Body")
+        self.assertEqual(tasks.run_pending(batch_size=1), 2)
+        self.assertFalse(PostChange.objects.exists())
+        # The changes of the post make one revision
+        self.assertEqual(self.post.revisions.count(), 1)
+        self.assertEqual(other.revisions.count(), 1)
+        self.assertTrue(TagPostIndex.objects.filter(post=self.post).exists())
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_changed_while_taken(self):
+        from . models import PostChange
+        from . import tasks
+        claimed = tasks.claim()
+        self.assertEqual(list(claimed), [self.post.pk])
+        # Taken by another worker
+        self.assertEqual(tasks.claim(), {})
+        self.post.save()
+        tasks.complete(claimed)
+        change = PostChange.objects.get()
+        self.assertIsNone(change.locked_until)
+        self.assertEqual(list(tasks.claim()), [self.post.pk])
+
+    def test_changed_while_taken_clock_behind(self):
+        from . models import PostChange
+        from . import tasks
+        claimed = tasks.claim()
+        # Queued by a web process whose clock is behind the worker's
+        with mock.patch.object(tasks, 'now', return_value=now() - datetime.timedelta(minutes=5)):
+            self.post.save()
+        tasks.complete(claimed)
+        self.assertTrue(PostChange.objects.exists())
+
+    def test_expired_lease(self):
+        from . models import PostChange
+        from . import tasks
+        tasks.claim()
+        PostChange.objects.update(locked_until=now() - datetime.timedelta(seconds=1))
+        self.assertEqual(list(tasks.claim()), [self.post.pk])
+
+    def test_rolled_back_change_not_queued(self):
+        from . models import PostChange
+        from django.db import transaction
+        PostChange.objects.all().delete()
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.post.save()
+            raise ValueError
+        self.assertFalse(PostChange.objects.exists())
+
+    def test_deleted_post(self):
+        from . models import PostRevision
+        from . import tasks
+        tasks.run_pending()
+        self.post.delete()
+        tasks.run_pending()
+        self.assertFalse(PostRevision.objects.exists())
+        self.assertFalse(TagPostIndex.objects.exists())
+
+    def test_listings_invalidated_after_work(self):
+        from . import tasks
+        version = blog_cache.get_listings_version()
+        tasks.run_pending()
+        self.assertNotEqual(blog_cache.get_listings_version(), version)
+
+    @override_settings(DJANGO_BLOG_TASKS='thread')
+    def test_thread_mode_scheduled_on_commit(self):
+        from . import tasks
+        with mock.patch.object(tasks, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.post.save()
+            self.assertEqual(len(callbacks), 1)
+            schedule.assert_called_once()
+
+    def test_schedule_once(self):
+        from . import tasks
+        executor = mock.Mock()
+        with mock.patch.object(tasks, 'get_executor', return_value=executor):
+            tasks.schedule()
+            tasks.schedule()
+            self.assertEqual(executor.submit.call_count, 1)
+            with mock.patch.object(tasks, 'run_pending'), mock.patch.object(tasks.connections, 'close_all'):
+                executor.submit.call_args[0][0]()
+            tasks.schedule()
+            self.assertEqual(executor.submit.call_count, 2)
+        with tasks._lock:
+            tasks._scheduled = False
+
+    def test_run_tasks_command(self):
+        from . models import PostChange
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn("Processed 1 posts", out.getvalue())
+        self.assertFalse(PostChange.objects.exists())
+
+    @override_settings(DJANGO_BLOG_TASKS='sync')
+    def test_sync_mode(self):
+        from . models import PostChange
+        PostChange.objects.all().delete()
+        self.post.title = "New title"
+        self.post.save()
+        self.assertFalse(PostChange.objects.exists())
+        self.assertEqual(self.post.revisions.count(), 1)
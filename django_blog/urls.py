@@ -1,16 +1,28 @@
+from django.conf import settings
 from django.urls import path
-from . views import PostListView, PostDetailView, PostUpdateView, PostCreateView, PostDeleteView, PostPublishView, PostChangeDateView, PostListByTagView
-from . feeds import RssPostsFeed
+from . import urls_public
+
+try:
+    READ_ONLY = settings.DJANGO_BLOG_READ_ONLY
+except AttributeError:
+    READ_ONLY = False
 
 app_name = 'blog'
-urlpatterns = [
-    path('', PostListView.as_view(), name='list'),
-    path('tag/<int:pk>/', PostListByTagView.as_view(), name='list_by_tag'),
-    path('post/<int:pk>/', PostDetailView.as_view(), name='detail'),
-    path('post/<int:pk>/update/', PostUpdateView.as_view(), name='update'),
-    path('post/create/', PostCreateView.as_view(), name="create"),
-    path('post/<int:pk>/delete/', PostDeleteView.as_view(), name="delete"),
-    path('post/<int:pk>/publish/', PostPublishView.as_view(), name="publish"),
-    path('post/<int:pk>/change_date/', PostChangeDateView.as_view(), name="change_date"),
-    path('feed/rss/', RssPostsFeed(), name="feed_rss")
-]
\ No newline at end of file
+urlpatterns = list(urls_public.urlpatterns)
+
+if not READ_ONLY:
+    # The editing views import the forms, crispy forms and TinyMCE
+    from . views import PostUpdateView, PostCreateView, PostDeleteView, PostPublishView, PostChangeDateView, PostBulkView, PostAutosaveView, PostAutosaveCreateView, PostRevisionsView, PostRevisionRestoreView
+
+    urlpatterns += [
+        path('post/<int:pk>/update/', PostUpdateView.as_view(), name='update'),
+        path('post/create/', PostCreateView.as_view(), name="create"),
+        path('post/<int:pk>/delete/', PostDeleteView.as_view(), name="delete"),
+        path('post/<int:pk>/publish/', PostPublishView.as_view(), name="publish"),
+        path('post/<int:pk>/change_date/', PostChangeDateView.as_view(), name="change_date"),
+        path('post/bulk/', PostBulkView.as_view(), name="bulk"),
+        path('post/autosave/', PostAutosaveCreateView.as_view(), name="autosave_create"),
+        path('post/<int:pk>/autosave/', PostAutosaveView.as_view(), name="autosave"),
+        path('post/<int:pk>/revisions/', PostRevisionsView.as_view(), name="revisions"),
+        path('post/<int:pk>/revisions/<int:number>/restore/', PostRevisionRestoreView.as_view(), name="restore_revision"),
+    ]
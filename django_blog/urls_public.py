@@ -0,0 +1,41 @@
+"""
+Public routes of the blog: listings, post detail, authors, feeds, sitemap and the
+read-only JSON API.
+
+Include this module instead of ``django_blog.urls`` on nodes that never
+serve the editing views: the forms and the editor are then never imported.
+"""
+from django.urls import path
+from django.contrib.sitemaps.views import sitemap
+from . public_views import PostListView, PostDetailView, PostListByTagView, PostListByAuthorView, AuthorListView
+from . feeds import PostsFeed, TagPostsFeed, AuthorPostsFeed, RssFeedFormat, AtomFeedFormat, JsonFeedFormat
+from . sitemaps import SITEMAPS
+from . profiling import ProfileListView, ProfileDetailView
+from . api import ApiPostListView, ApiPostDetailView, ApiPostListByTagView, ApiSearchView, ApiTagListView
+
+app_name = 'blog'
+urlpatterns = [
+    path('', PostListView.as_view(), name='list'),
+    path('tag/<int:pk>/', PostListByTagView.as_view(), name='list_by_tag'),
+    path('tag/<slug:slug>/', PostListByTagView.as_view(), name='list_by_tag_slug'),
+    path('post/<int:pk>/', PostDetailView.as_view(), name='detail'),
+    path('authors/', AuthorListView.as_view(), name='author_list'),
+    path('author/<int:pk>/', PostListByAuthorView.as_view(), name='list_by_author'),
+    path('feed/rss/', PostsFeed.as_view(feed_format=RssFeedFormat), name="feed_rss"),
+    path('feed/atom/', PostsFeed.as_view(feed_format=AtomFeedFormat), name="feed_atom"),
+    path('feed/json/', PostsFeed.as_view(feed_format=JsonFeedFormat), name="feed_json"),
+    path('tag/<slug:slug>/feed/rss/', TagPostsFeed.as_view(feed_format=RssFeedFormat), name="tag_feed_rss"),
+    path('tag/<slug:slug>/feed/atom/', TagPostsFeed.as_view(feed_format=AtomFeedFormat), name="tag_feed_atom"),
+    path('tag/<slug:slug>/feed/json/', TagPostsFeed.as_view(feed_format=JsonFeedFormat), name="tag_feed_json"),
+    path('author/<int:pk>/feed/rss/', AuthorPostsFeed.as_view(feed_format=RssFeedFormat), name="author_feed_rss"),
+    path('author/<int:pk>/feed/atom/', AuthorPostsFeed.as_view(feed_format=AtomFeedFormat), name="author_feed_atom"),
+    path('author/<int:pk>/feed/json/', AuthorPostsFeed.as_view(feed_format=JsonFeedFormat), name="author_feed_json"),
+    path('sitemap.xml', sitemap, {'sitemaps': SITEMAPS, 'template_name': 'blog/sitemap.xml'}, name="sitemap"),
+    path('profiles/', ProfileListView.as_view(), name="profile_list"),
+    path('profiles/<str:pk>/', ProfileDetailView.as_view(), name="profile_detail"),
+    path('api/posts/', ApiPostListView.as_view(), name="api_list"),
+    path('api/posts/<int:pk>/', ApiPostDetailView.as_view(), name="api_detail"),
+    path('api/tags/', ApiTagListView.as_view(), name="api_tags"),
+    path('api/tags/<int:pk>/posts/', ApiPostListByTagView.as_view(), name="api_list_by_tag"),
+    path('api/search/', ApiSearchView.as_view(), name="api_search"),
+]
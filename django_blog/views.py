@@ -1,17 +1,21 @@
+import json
 from typing import Any
-from django.db.models import F
-from django.db.models.query import QuerySet
-from django.db.utils import IntegrityError
-from django.shortcuts import render
-from django.views.generic import ListView, DetailView, UpdateView, CreateView, DeleteView, View
+from django.views.generic import UpdateView, CreateView, DeleteView, DetailView, View
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
 from django.utils.timezone import now
 from django.urls import reverse_lazy, reverse
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, Http404
-from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
+from django import forms
+from django.db import transaction
 from . models import Post, Tag
+from . signals import batch_changes
+from . import revisions
+from . bulk import apply_bulk_operation, OPERATIONS, SCHEDULE
+from . autosave import autosave, clean_fields, get_pending, AUTOSAVE_INTERVAL, CONFLICT
+from . public_views import FragmentCacheMixin, BlogPaginationMixin, PostListView, PostDetailView, PostListByTagView  # noqa: F401
 from . forms import PostUpdateForm, PostCreateForm, PostChangeDateForm
 
 
@@ -23,9 +27,25 @@ class CustomLoginRequiredMixin(LoginRequiredMixin):
 
 # Create your views here.
 class UserCanChangePostMixin(UserPassesTestMixin):
+    """
+    Check that the current user can modify the post.
+
+    The post (with its author) is fetched only once per request and shared
+    with the view through ``self.object``, so that the permission check and
+    the generic editing views do not query the same row again.
+    """
+    object = None
+
+    def get_object(self, queryset=None) -> Post:
+        if self.object is None:
+            self.object = get_object_or_404(
+                Post.objects.select_related('author'),
+                pk=self.kwargs['pk']
+            )
+        return self.object
+
     def test_func(self) -> bool | None:
-        self.object = get_object_or_404(Post, pk=self.kwargs['pk'])
-        return self.object.can_be_modified_by(self.request.user)
+        return self.get_object().can_be_modified_by(self.request.user)
 
     def handle_no_permission(self) -> HttpResponseRedirect:
         try:
@@ -45,53 +65,6 @@ class PostPermissionMixin(UserCanChangePostMixin, CustomLoginRequiredMixin):
         return CustomLoginRequiredMixin.handle_no_permission(self)
 
 
-class PostListView(ListView):
-    model = Post
-    template_name = "blog/post_list.html"
-    context_object_name = "posts"
-    paginate_by = 4
-    try:
-        paginate_by = settings.DJANGO_BLOG_PAGINATE_BY
-    except AttributeError:
-        pass
-
-    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
-        context = super().get_context_data(**kwargs)
-        context['title'] = "Blog"
-        # Display only tags used in at least one published post
-        context['tags'] = Tag.objects.filter(post__pub_date__lte=now()).distinct().order_by('name');
-        return context
-
-    def get_queryset(self) -> QuerySet[Any]:
-        # Solo gli utenti autenticati possono vedere post
-        # non pubblicati
-        if self.request.user.is_authenticated:
-            queryset = super().get_queryset()
-        else:
-            queryset = self.model.published_objects.all()
-
-        # Posts are orderd by descendig publication date with drafts first
-        return queryset.order_by(F('pub_date').desc(nulls_first=True))
-
-
-class PostDetailView(DetailView):
-    model = Post
-    template_name = "blog/post_detail.html"
-
-    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
-        context = super().get_context_data(**kwargs)
-        context['title'] = self.object.title
-        return context
-
-    def get_queryset(self) -> QuerySet[Any]:
-        # Solo gli utenti autenticati possono vedere i post
-        # non pubblicati
-        if self.request.user.is_authenticated:
-            return super().get_queryset()
-        else:
-            return self.model.published_objects.all()
-
-
 class PostUpdateView(PostPermissionMixin, UpdateView):
     model = Post
     template_name = 'blog/post_update.html'
@@ -102,28 +75,63 @@ class PostUpdateView(PostPermissionMixin, UpdateView):
         super().__init__(**kwargs)
 
 
+    def get_pending_autosave(self):
+        """Autosaved changes of a published post, from which the form starts"""
+        if not hasattr(self, 'pending_autosave'):
+            self.pending_autosave = None if self.object.is_draft() else get_pending(self.object)
+        return self.pending_autosave
+
+    def get_initial(self):
+        initial = super().get_initial()
+        initial['version'] = self.object.version
+        # Submitted forms are bound: the initial values are not used
+        pending = self.get_pending_autosave() if self.request.method == 'GET' else None
+        if pending is not None:
+            initial.update(pending.fields)
+        return initial
+
     def get_context_data(self, **kwargs):
         """
         Pass all tags to context in order to render the tag form
         """
         context = super().get_context_data(**kwargs)
         context['tags'] = list(Tag.objects.values())
-        context['post_tags'] = list(self.object.tags.values())
+        pending = self.get_pending_autosave()
+        if pending is not None and pending.tags is not None:
+            context['post_tags'] = [{'name': name} for name in pending.tags]
+        else:
+            context['post_tags'] = list(self.object.tags.values())
+        context['autosave_pending'] = pending is not None
+        context['autosave'] = {
+            'url': reverse('blog:autosave', kwargs={'pk': self.object.pk}),
+            'version': self.object.version,
+            'interval': AUTOSAVE_INTERVAL,
+        }
         return context
 
     def form_valid(self, form):
-        # Save post
-        self.object = form.save()
-        # Remove all tags from post
-        self.object.tags.clear()
-        # Add selected tags
-        for name in self.request.POST.getlist('tags'):
-            try:
-                self.object.tags.create(name=name)
-                # Handle existing tags
-            except IntegrityError:
-                tag = Tag.objects.get(name=name)
-                self.object.tags.add(tag)
+        # One change for the post and its tags
+        with batch_changes(), transaction.atomic():
+            version = (Post.objects
+                       .select_for_update()
+                       .values_list('version', flat=True)
+                       .get(pk=self.object.pk))
+            if version != form.cleaned_data['version']:
+                # Changed by someone else since the form was loaded
+                form.add_error(None, "Il post è stato modificato da qualcun altro mentre lo stavi modificando: "
+                                     "ricarica la pagina per vedere le modifiche")
+                return self.render_to_response(self.get_context_data(form=form), status=409)
+            # Editing the content makes pending autosaves of other editors
+            # conflict, and the autosaved changes, carried by the form, stale
+            form.instance.version = version + 1
+            # Save post
+            self.object = form.save()
+            # Remove all tags from post
+            self.object.tags.clear()
+            # Add selected tags, creating the new ones
+            tags = Tag.objects.get_or_create_many(self.request.POST.getlist('tags'))
+            if tags:
+                self.object.tags.add(*tags)
 
         messages.add_message(self.request, messages.SUCCESS, f"Hai modificato con successo il post “{form.instance}”")
         return HttpResponseRedirect(self.get_success_url())
@@ -141,8 +149,32 @@ class PostCreateView(CustomLoginRequiredMixin, CreateView):
         context = super().get_context_data(**kwargs)
         context['tags'] = list(Tag.objects.values())
         context['post_tags'] = []
+        # The first autosave creates a draft, which is then autosaved
+        # and finally saved by the form
+        context['autosave'] = {
+            'create_url': reverse('blog:autosave_create'),
+            'interval': AUTOSAVE_INTERVAL,
+        }
         return context
 
+    def get_form_kwargs(self) -> dict[str, Any]:
+        kwargs = super().get_form_kwargs()
+        draft = self.get_autosaved_draft()
+        if draft is not None:
+            kwargs['instance'] = draft
+        return kwargs
+
+    def get_autosaved_draft(self) -> Post | None:
+        """Return the draft created by autosave for this form, if any"""
+        try:
+            pk = int(self.request.POST.get('autosaved', ''))
+        except ValueError:
+            return None
+        draft = Post.objects.filter(pk=pk, pub_date__isnull=True).first()
+        if draft is not None and draft.can_be_modified_by(self.request.user):
+            return draft
+        return None
+
     def form_valid(self, form):
         # Set current user to author, if so desired
         if self.request.POST.get("author"):
@@ -169,19 +201,17 @@ class PostCreateView(CustomLoginRequiredMixin, CreateView):
             message = f"Hai salvato in bozze il post “{form.instance}”"
             message_level = messages.SUCCESS
 
-        # Save post
-        self.object = form.save()
+        # One change for the post and its tags
+        with batch_changes(), transaction.atomic():
+            # Save post
+            self.object = form.save()
 
-        # Remove all tags
-        self.object.tags.clear()
-        # Add selected tags
-        for name in self.request.POST.getlist('tags'):
-            try:
-                self.object.tags.create(name=name)
-            # Handle existing tags
-            except IntegrityError:
-                tag = Tag.objects.get(name=name)
-                self.object.tags.add(tag)
+            # Remove all tags
+            self.object.tags.clear()
+            # Add selected tags, creating the new ones
+            tags = Tag.objects.get_or_create_many(self.request.POST.getlist('tags'))
+            if tags:
+                self.object.tags.add(*tags)
 
         # Redirect to the correct page with correct message
         messages.add_message(self.request, message_level, message)
@@ -210,7 +240,7 @@ class PostPublishView(PostPermissionMixin, UserPassesTestMixin, View):
         super().__init__(**kwargs)
 
     def post(self, request, pk, *args, **kwargs):
-        post = get_object_or_404(Post, pk=pk)
+        post = self.get_object()
         post.publish()
         messages.add_message(request, messages.SUCCESS, f"Hai pubblicato il post “{post}”")
         return HttpResponseRedirect(post.get_absolute_url())
@@ -228,7 +258,7 @@ class PostChangeDateView(PostPermissionMixin, UserPassesTestMixin, UpdateView):
 
     def form_valid(self, form) -> HttpResponse:
         response =  super().form_valid(form)
-        messages.add_message(self.request, messages.SUCCESS, f"Hai programmato la pubblicazione del post “{self.get_object()}”")
+        messages.add_message(self.request, messages.SUCCESS, f"Hai programmato la pubblicazione del post “{self.object}”")
         return response
 
     def test_func(self) -> bool | None:
@@ -237,23 +267,146 @@ class PostChangeDateView(PostPermissionMixin, UserPassesTestMixin, UpdateView):
             return not self.object.is_published()
 
 
-class PostListByTagView(ListView):
+class PostRevisionsView(PostPermissionMixin, DetailView):
     model = Post
-    template_name = "blog/post_list_by_tag.html"
-    context_object_name = "posts"
-    paginate_by = 4
-    try:
-        paginate_by = settings.DJANGO_BLOG_PAGINATE_BY
-    except AttributeError:
-        pass
+    template_name = "blog/post_revisions.html"
 
-    def get_queryset(self, **kwargs):
-        return self.model.published_objects.filter(tags__pk=self.kwargs['pk']).order_by('-pub_date')
+    def __init__(self, **kwargs: Any) -> None:
+        self.verb = "vedere le revisioni di"
+        super().__init__(**kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # The data is needed only to restore a revision
+        context['revisions'] = self.object.revisions.defer('data').order_by('-number')
+        context['revisions_enabled'] = revisions.is_enabled()
+        return context
+
+
+class PostRevisionRestoreView(PostPermissionMixin, View):
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.verb = "ripristinare"
+        super().__init__(**kwargs)
+
+    def post(self, request, pk, number, *args, **kwargs):
+        post = self.get_object()
+        revision = get_object_or_404(post.revisions.select_related('snapshot'), number=number)
+        revisions.restore(post, revision)
+        messages.add_message(request, messages.SUCCESS, f"Hai ripristinato la revisione {number} del post “{post}”")
+        return HttpResponseRedirect(post.get_absolute_url())
+
+
+class PostBulkView(CustomLoginRequiredMixin, View):
+    """
+    Apply an editorial operation to many posts at once.
+
+    Expects the ``operation`` name, the post ``ids`` and, depending on the
+    operation, a ``pub_date`` or a list of ``tags``.
+    Returns the outcome for every post as JSON.
+    """
+
+    def post(self, request, *args, **kwargs):
+        operation = request.POST.get('operation')
+        if operation not in OPERATIONS:
+            return JsonResponse({'error': f"Operazione non valida: {operation}"}, status=400)
+
+        try:
+            post_ids = [int(pk) for pk in request.POST.getlist('ids')]
+        except ValueError:
+            return JsonResponse({'error': "Identificativi dei post non validi"}, status=400)
+
+        pub_date = None
+        if operation == SCHEDULE:
+            try:
+                pub_date = forms.DateTimeField().clean(request.POST.get('pub_date'))
+            except forms.ValidationError:
+                return JsonResponse({'error': "Data di pubblicazione non valida"}, status=400)
+
+        report = apply_bulk_operation(
+            request.user,
+            post_ids,
+            operation,
+            pub_date=pub_date,
+            tags=request.POST.getlist('tags')
+        )
+        return JsonResponse({
+            'operation': operation,
+            'results': {str(pk): outcome for pk, outcome in report.items()},
+        })
+
+
+class AutosaveRequestMixin:
+    """Parse the JSON body of autosave requests"""
+
+    def parse_autosave_request(self) -> dict:
+        """Return the submitted data, raise ``ValueError`` if invalid"""
+        data = json.loads(self.request.body)
+        if not isinstance(data, dict) or not isinstance(data.get('fields', {}), dict):
+            raise ValueError
+        tags = data.get('tags')
+        if tags is not None and not (isinstance(tags, list) and all(isinstance(tag, str) for tag in tags)):
+            raise ValueError
+        return data
+
+
+class PostAutosaveView(AutosaveRequestMixin, PostPermissionMixin, View):
+    """
+    Save a subset of the fields of a post while it is being edited.
+
+    Expects a JSON body with the ``version`` of the post being edited, the
+    changed ``fields`` and, only if they changed, the ``tags``.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.verb = "modificare"
+        super().__init__(**kwargs)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = self.parse_autosave_request()
+            version = int(data['version'])
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': "Richiesta non valida"}, status=400)
+
+        try:
+            status, version = autosave(self.get_object(), version, data.get('fields', {}), data.get('tags'))
+        except ValidationError as error:
+            return JsonResponse({'error': error.messages}, status=400)
+
+        response = {'status': status, 'version': version, 'retry_after': AUTOSAVE_INTERVAL}
+        return JsonResponse(response, status=409 if status == CONFLICT else 200)
+
+
+class PostAutosaveCreateView(AutosaveRequestMixin, CustomLoginRequiredMixin, View):
+    """Create the draft of a new post at its first autosave"""
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = self.parse_autosave_request()
+        except ValueError:
+            return JsonResponse({'error': "Richiesta non valida"}, status=400)
+
+        post = Post()
         try:
-            context['tag'] = Tag.objects.get(pk=self.kwargs['pk'])
-        except Tag.DoesNotExist:
-            raise Http404
-        return context
\ No newline at end of file
+            fields = clean_fields(post, data.get('fields', {}))
+            for name, value in fields.items():
+                setattr(post, name, value)
+            post.full_clean(exclude=['author', 'tags'])
+        except ValidationError as error:
+            return JsonResponse({'error': error.messages}, status=400)
+
+        if data.get('author'):
+            post.author = request.user
+        with transaction.atomic():
+            post.save()
+            tags = Tag.objects.get_or_create_many(data.get('tags') or [])
+            if tags:
+                post.tags.add(*tags)
+
+        return JsonResponse({
+            'status': 'created',
+            'pk': post.pk,
+            'version': post.version,
+            'url': reverse('blog:autosave', kwargs={'pk': post.pk}),
+        }, status=201)
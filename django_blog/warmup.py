@@ -0,0 +1,80 @@
+"""
+Warm the caches of the blog after a deploy or a cache flush.
+
+The most requested pages (the first list pages, the pages of the tags
+with more posts, the feeds and the latest posts) are rendered as an
+anonymous user, which fills the fragment, count, navigation and feed item
+caches. Pages are rendered by a pool of threads sharing the process
+caches, in order of priority, until the time budget runs out.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from . export import EXPORT_HOST, FEED_FORMATS, listing_urls
+from . models import Post, Tag
+from . public_views import PostListView
+
+
+# Status of the pages not rendered within the time budget
+SKIPPED = None
+
+
+def get_urls(list_pages=3, tags=10, posts=20) -> list:
+    """URLs of the pages to warm, the most requested first"""
+    published = Post.published_objects.all()
+    count = published.count()
+    urls = listing_urls(reverse('blog:list'), count, PostListView.paginate_by)[:list_pages]
+    urls += [reverse(f'blog:feed_{fmt}') for fmt in FEED_FORMATS]
+
+    top_tags = (Tag.objects
+                .filter(post__in=published)
+                .annotate(num_posts=Count('post'))
+                .order_by('-num_posts', 'name')
+                .values_list('slug', flat=True)[:tags])
+    for slug in top_tags:
+        urls.append(reverse('blog:list_by_tag_slug', args=[slug]))
+
+    latest = published.order_by('-pub_date', '-pk').values_list('pk', flat=True)[:posts]
+    urls += [reverse('blog:detail', args=[pk]) for pk in latest]
+    return urls
+
+
+def warm(urls, host=EXPORT_HOST, secure=False, workers=4, budget=None) -> list:
+    """
+    Render the pages and return a (url, status, seconds) tuple for each.
+    Pages not started before the end of the budget (in seconds) have
+    status ``SKIPPED``.
+    """
+    deadline = time.monotonic() + budget if budget is not None else None
+
+    def warm_page(url):
+        if deadline is not None and time.monotonic() >= deadline:
+            return url, SKIPPED, 0
+        start = time.perf_counter()
+        response = Client(HTTP_HOST=host).get(url, secure=secure)
+        if response.streaming:
+            # Feed items are rendered and cached while streaming
+            b''.join(response.streaming_content)
+        return url, response.status_code, time.perf_counter() - start
+
+    if workers == 1:
+        return [warm_page(url) for url in urls]
+
+    def warm_pages(urls):
+        try:
+            return [warm_page(url) for url in urls]
+        finally:
+            # Every thread opens its own connections
+            connections.close_all()
+
+    # Interleave the pages, so that the first ones are rendered first
+    chunks = [urls[index::workers] for index in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = [result for chunk in executor.map(warm_pages, chunks) for result in chunk]
+    order = {url: index for index, url in enumerate(urls)}
+    return sorted(results, key=lambda result: order[result[0]])